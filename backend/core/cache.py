@@ -0,0 +1,113 @@
+"""
+cache.py
+
+Small in-process caches shared by the backend. All caches are thread-safe and keep hit/miss
+counters so their effectiveness can be reported.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache.
+
+    Attributes:
+        max_items (int): Maximum number of entries kept before the least recently used is evicted.
+        hits (int): Number of lookups that found an entry.
+        misses (int): Number of lookups that did not.
+    """
+
+    def __init__(self, max_items: int = 1024):
+        self.max_items = max(1, max_items)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+        }
+
+
+class TTLCache(LRUCache):
+    """
+    LRU cache whose entries also expire after a time-to-live.
+
+    Attributes:
+        ttl (float): Default lifetime of an entry in seconds.
+    """
+
+    def __init__(self, max_items: int = 1024, ttl: float = 60.0, clock=time.monotonic):
+        super().__init__(max_items)
+        self.ttl = ttl
+        self._clock = clock
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = super().get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        value, expires_at = entry
+        if self._clock() >= expires_at:
+            # Count an expired entry as a miss, not a hit
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+                if self._data.get(key) is entry:
+                    del self._data[key]
+            return default
+        return value
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Stores value for ttl seconds (the cache default if not given).
+        """
+        super().put(key, (value, self._clock() + (self.ttl if ttl is None else ttl)))
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = super().pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
@@ -1,6 +1,9 @@
+import os
 import re
 import fitz
-from typing import BinaryIO
+from typing import BinaryIO, Iterable, Iterator, Union
+
+_WHITESPACE = re.compile(r'\s+')
 
 class Chunker:
     """
@@ -9,72 +12,107 @@ class Chunker:
     Attributes:
         max_chars (int): Maximum allowed characters in a single chunk.
         min_chars (int): Minimum required characters in a valid chunk.
+        verbose (bool): Print paragraph and chunk counts while chunking.
+        stats (dict): Paragraph, character and chunk counts from the last chunking run.
     """
 
-    def __init__(self, max_chars=1000, min_chars=100):
+    def __init__(self, max_chars=1000, min_chars=100, verbose=False):
         """
         Initialize the Chunker with maximum and minimum chunk sizes.
         max_chars: Maximum number of characters per chunk.
         min_chars: Minimum number of characters per chunk.
+        verbose: Print paragraph and chunk counts while chunking.
         """
         self.max_chars = max_chars
         self.min_chars = min_chars
+        self.verbose = verbose
+        self.stats = {"paragraphs": 0, "chars": 0, "chunks": 0}
+
+    def _open(self, pdf_source: Union[str, BinaryIO]):
+        """
+        Open a PDF from a file path or a binary stream. Paths are opened directly so PyMuPDF
+        can read pages on demand instead of loading the whole file up front.
+        """
+        if isinstance(pdf_source, (str, os.PathLike)):
+            return fitz.open(pdf_source)
+        return fitz.open(stream=pdf_source.read(), filetype="pdf")
+
+    def iter_paragraphs(self, pdf_source: Union[str, BinaryIO]) -> Iterator[str]:
+        """
+        Yield normalized paragraphs from a PDF one page at a time, treating each block as a paragraph.
+        Internal newlines and runs of whitespace within a block are collapsed to single spaces.
+        """
+        doc = self._open(pdf_source)
+        try:
+            for page in doc:
+                blocks = page.get_text("blocks")
+                # Sort blocks top-to-bottom, then left-to-right
+                blocks = sorted(blocks, key=lambda b: (b[1], b[0]))
+                for block in blocks:
+                    text = block[4].strip()
+                    if not text:
+                        continue
+                    yield _WHITESPACE.sub(' ', text)
+        finally:
+            doc.close()
 
-    def extract_text(self, pdf_stream: BinaryIO) -> str:
+    def extract_text(self, pdf_source: Union[str, BinaryIO]) -> str:
         """
-        Extract text from a PDF file stream, treating each block as a paragraph.
+        Extract text from a PDF file path or stream, treating each block as a paragraph.
         Internal newlines within a block are replaced with spaces.
         Blocks are joined with double newlines to mark paragraph boundaries.
         """
-        doc = fitz.open(stream=pdf_stream.read(), filetype="pdf")
-        paragraphs = []
-        for page in doc:
-            blocks = page.get_text("blocks")
-            # Sort blocks top-to-bottom, then left-to-right
-            blocks = sorted(blocks, key=lambda b: (b[1], b[0]))
-            for block in blocks:
-                text = block[4].strip()
-                if not text:
-                    continue
-                # Replace newlines within a block with spaces
-                temp_text = text.replace('\n', ' ')
-                text = re.sub(r'\s+', ' ', temp_text)
-                paragraphs.append(text)
-        # Join all blocks with double newlines
-        result = ""
-        for i, para in enumerate(paragraphs):
-            result += para
-            if i != len(paragraphs) - 1:
-                result += "\n\n"
-        return result
+        return "\n\n".join(self.iter_paragraphs(pdf_source))
+
+    def iter_chunks(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        """
+        Incrementally chunk a stream of paragraphs, yielding each merged chunk as soon as it is complete.
+        Produces the same chunks as chunk_merged_paragraphs on the paragraphs joined by double newlines.
+        Counts are recorded in self.stats as the stream is consumed.
+        """
+        stats = self.stats = {"paragraphs": 0, "chars": 0, "chunks": 0}
+        # Pieces of the chunk being built and its length once joined with single spaces
+        current = []
+        length = 0
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if len(paragraph) < self.min_chars:
+                continue
+            stats["paragraphs"] += 1
+            stats["chars"] += len(paragraph)
+            for chunk in self._split_paragraph(paragraph):
+                if length == 0:
+                    current = [chunk]
+                    length = len(chunk)
+                elif length + 1 + len(chunk) <= self.max_chars:
+                    current.append(chunk)
+                    length += 1 + len(chunk)
+                else:
+                    stats["chunks"] += 1
+                    yield " ".join(current).strip()
+                    current = [chunk]
+                    length = len(chunk)
+        if length:
+            stats["chunks"] += 1
+            yield " ".join(current).strip()
 
     def _split_paragraph(self, paragraph):
         """
         Split a long paragraph into smaller chunks, avoiding word breaks when possible.
+        Each window is searched once from its end for the last space or newline, so the
+        whole paragraph is split in a single pass.
         """
-        if len(paragraph) <= self.max_chars:
+        n = len(paragraph)
+        if n <= self.max_chars:
             return [paragraph]
         parts = []
         idx = 0
-        while idx < len(paragraph):
-            end = idx + self.max_chars
-            if end > len(paragraph):
-                end = len(paragraph)
-            split_at = end
+        while idx < n:
+            end = min(idx + self.max_chars, n)
             # Try not to break words - back up to a space or newline
-            found = False
-            for j in range(split_at-1, idx-1, -1):
-                if paragraph[j] in (" ", "\n"):
-                    split_at = j + 1
-                    found = True
-                    break
-            if not found:
-                split_at = end  # if no space found, just split at max_chars
-            chunk = ""
-            for c in paragraph[idx:split_at]:
-                chunk += c
-            chunk = chunk.strip()
-            parts.append(chunk)
+            j = max(paragraph.rfind(" ", idx, end), paragraph.rfind("\n", idx, end))
+            split_at = j + 1 if j >= 0 else end  # if no space found, just split at max_chars
+            parts.append(paragraph[idx:split_at].strip())
             idx = split_at
         return parts
 
@@ -84,39 +122,17 @@ class Chunker:
         Long paragraphs are split, and small chunks are merged to stay within size limits.
         """
         paragraphs = [p.strip() for p in text.split('\n\n') if len(p.strip()) >= self.min_chars]
-        print(f"Found {len(paragraphs)} paragraphs. Lengths: {[len(p) for p in paragraphs]}")
-
-        # Split long paragraphs
-        chunks = []
-        for paragraph in paragraphs:
-            if len(paragraph) <= self.max_chars:
-                chunks.append(paragraph)
-            else:
-                for part in self._split_paragraph(paragraph):
-                    chunks.append(part)
+        if self.verbose:
+            print(f"Found {len(paragraphs)} paragraphs. Lengths: {[len(p) for p in paragraphs]}")
 
-        # Merge small chunks together (less efficient way)
-        merged = []
-        current = ""
-        i = 0
-        while i < len(chunks):
-            chunk = chunks[i]
-            if len(current) == 0:
-                current = chunk
-            elif len(current) + 1 + len(chunk) <= self.max_chars:
-                current = current + " " + chunk
-            else:
-                merged.append(current.strip())
-                current = chunk
-            i += 1
-        if current:
-            merged.append(current.strip())
+        merged = list(self.iter_chunks(paragraphs))
 
-        print(f"Final chunk count: {len(merged)}\n")
+        if self.verbose:
+            print(f"Final chunk count: {len(merged)}\n")
         return merged
 
 if __name__ == "__main__":
-    chunker = Chunker(max_chars=850, min_chars=300)
+    chunker = Chunker(max_chars=850, min_chars=300, verbose=True)
     raw_text = chunker.extract_text("tests/files/test.pdf")
     print("RAW EXTRACTED TEXT:\n", repr(raw_text))
     chunks = chunker.chunk_merged_paragraphs(raw_text)
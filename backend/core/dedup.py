@@ -0,0 +1,77 @@
+"""
+dedup.py
+
+Collapses near-duplicate chunks (e.g. the same material in lecture slides, notes and the textbook)
+before they are scheduled, so each idea becomes one learn task instead of several.
+
+Similarity is cosine similarity between chunk embeddings. The similarity matrix is computed in
+row blocks so memory stays at block_size x n floats, and chunks are clustered by linking every
+pair at or above the threshold (connected components). Each cluster is represented by its earliest
+chunk, which keeps the upload order of the schedule.
+
+    DEDUP_THRESHOLD   cosine similarity at which chunks count as duplicates (default: 0.95)
+"""
+
+import os
+from typing import Dict, List
+
+import numpy as np
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.95))
+
+
+def _find(parent: np.ndarray, i: int) -> int:
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    # Path compression
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
+
+
+def find_representatives(embeddings: np.ndarray, threshold: float = DEDUP_THRESHOLD,
+                         block_size: int = 1024) -> np.ndarray:
+    """
+    Returns an array mapping each row to the index of its cluster's representative (the earliest
+    row of the cluster). Rows without a near-duplicate map to themselves.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    n = len(vectors)
+    parent = np.arange(n)
+    if n < 2:
+        return parent
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        # Only compare against later rows: the upper triangle holds every pair once
+        sims = vectors[start:end] @ vectors[start:].T
+        rows, cols = np.nonzero(sims >= threshold)
+        rows += start
+        cols += start
+        pairs = rows < cols
+        for i, j in zip(rows[pairs].tolist(), cols[pairs].tolist()):
+            ri, rj = _find(parent, i), _find(parent, j)
+            if ri != rj:
+                # The smaller index becomes the root, so roots are the earliest rows
+                parent[max(ri, rj)] = min(ri, rj)
+
+    return np.array([_find(parent, i) for i in range(n)])
+
+
+def collapse_near_duplicates(chunk_ids: List[str], embeddings: np.ndarray,
+                             threshold: float = DEDUP_THRESHOLD) -> Dict[str, List[str]]:
+    """
+    Groups chunk IDs into near-duplicate clusters. Returns a dict from each representative chunk ID
+    to the IDs of the duplicates it stands for, in input order. Every chunk ID appears exactly once
+    (as a key or in a value list), and keys keep the input order.
+    """
+    representatives = find_representatives(embeddings, threshold)
+    clusters: Dict[str, List[str]] = {}
+    for i, rep in enumerate(representatives.tolist()):
+        if rep == i:
+            clusters[chunk_ids[i]] = []
+        else:
+            clusters[chunk_ids[rep]].append(chunk_ids[i])
+    return clusters
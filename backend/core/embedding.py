@@ -1,16 +1,20 @@
 """
 embedding.py
 
-Handles generation of vector embeddings from text chunks using OpenAI's embedding API.
+Handles generation of vector embeddings from text chunks using OpenAI's embedding API
+or one of the local backends registered in embedding_backends.
 
 This module provides functions for embedding raw chunks of text as well as an end-to-end
 pipeline of PDF text extraction, chunking with the Chunker class, and creating embeddings.
 """
 
 import openai
+import numpy as np
 from typing import List, Tuple, Optional
 import os
 from .chunking import Chunker
+from .embedding_backends import EmbeddingBackend, get_backend
+from .embedding_cache import get_embedding_cache, text_hash
 from typing import BinaryIO
 
 from dotenv import load_dotenv
@@ -18,30 +22,66 @@ load_dotenv()
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def embed_chunks(chunks: List[str], model: str = "text-embedding-3-small") -> List[List[float]]:
+def _request_embeddings(chunks: List[str], model: str, backend: EmbeddingBackend,
+                        dimensions: Optional[int] = None) -> np.ndarray:
     """
-    Sends a batch of text chunks to OpenAI and retrieves embeddings.
+    Embeds text chunks with the given backend, bypassing the cache.
+    """
+    return np.asarray(backend.embed(chunks, model, dimensions), dtype=np.float32)
+
+
+def embed_chunks(chunks: List[str], model: Optional[str] = None, use_cache: bool = True,
+                 backend: Optional[str] = None, dtype=None, dimensions: Optional[int] = None) -> np.ndarray:
+    """
+    Sends a batch of text chunks to the embedding backend and retrieves embeddings.
+
+    Chunks whose (backend, model, dimensions, text hash) is already in the embedding cache are not
+    sent again; only cache misses are embedded, and the results are merged back in the original order.
 
     Args:
         chunks: A list of text segments to embed.
-        model: The OpenAI embedding model to use.
+        model: The embedding model to use. Defaults to EMBEDDING_MODEL or the backend's default.
+        use_cache: Whether to read from and write to the embedding cache.
+        backend: Name of the embedding backend. Defaults to EMBEDDING_BACKEND ('openai').
+        dtype: numpy.float32 or numpy.float16. Defaults to EMBEDDING_DTYPE ('float32').
+        dimensions: Shorten vectors to this many dimensions. Defaults to EMBEDDING_DIMENSIONS (full size).
 
     Returns:
-        A list of embedding vectors (each vector is a list of floats).
+        A contiguous (len(chunks), dimensions) array with one embedding row per chunk.
     """
+    dtype = np.dtype(dtype or os.getenv("EMBEDDING_DTYPE", "float32"))
+    dimensions = dimensions or int(os.getenv("EMBEDDING_DIMENSIONS", 0)) or None
     if not chunks:
-        return []
+        return np.empty((0, dimensions or 0), dtype=dtype)
+
+    embedder = get_backend(backend)
+    model = model or os.getenv("EMBEDDING_MODEL") or embedder.default_model
+
+    cache = get_embedding_cache() if use_cache else None
+    if cache is None:
+        return _request_embeddings(chunks, model, embedder, dimensions).astype(dtype, copy=False)
+
+    cache_model = f"{embedder.name}:{model}" + (f":{dimensions}" if dimensions else "")
+    hashes = [text_hash(chunk) for chunk in chunks]
+    found = cache.get_many(cache_model, hashes)
+
+    # Embed each distinct missing text once, even if it appears several times
+    missing = {}
+    for h, chunk in zip(hashes, chunks):
+        if h not in found and h not in missing:
+            missing[h] = chunk
+    if missing:
+        vectors = _request_embeddings(list(missing.values()), model, embedder, dimensions)
+        fresh = dict(zip(missing.keys(), vectors))
+        cache.put_many(cache_model, fresh.items())
+        found.update(fresh)
 
-    response = openai.embeddings.create(
-        input=chunks,
-        model=model
-    )
-    return [item.embedding for item in response.data]
+    return np.stack([found[h] for h in hashes]).astype(dtype, copy=False)
 
 
-def embed_pdf(pdf_file: BinaryIO, chunker_args: Optional[dict] = None, embedding_model: str = "text-embedding-3-small") -> Tuple[List[str], List[List[float]]]:
+def chunk_pdf(pdf_file: BinaryIO, chunker_args: Optional[dict] = None) -> List[str]:
     """
-    Takes in a PDF file as a binary stream, extracts text, chunks it, and returns chunks and their embeddings.
+    Takes in a PDF file as a binary stream, extracts its text and returns the chunks.
 
     chunker_args can optionally contain 'max_chars' and 'min_chars'.
     """
@@ -49,7 +89,17 @@ def embed_pdf(pdf_file: BinaryIO, chunker_args: Optional[dict] = None, embedding
     max_chars = chunker_args.get("max_chars", 1000)
     min_chars = chunker_args.get("min_chars", 100)
     chunker = Chunker(max_chars, min_chars)
-    text = chunker.extract_text(pdf_file)
-    chunks = chunker.chunk_merged_paragraphs(text)
-    embeddings = embed_chunks(chunks, model=embedding_model)
+    # Stream paragraphs page by page straight into the chunk builder
+    return list(chunker.iter_chunks(chunker.iter_paragraphs(pdf_file)))
+
+
+def embed_pdf(pdf_file: BinaryIO, chunker_args: Optional[dict] = None, embedding_model: Optional[str] = None,
+              backend: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Takes in a PDF file as a binary stream, extracts text, chunks it, and returns chunks and their embeddings.
+
+    chunker_args can optionally contain 'max_chars' and 'min_chars'.
+    """
+    chunks = chunk_pdf(pdf_file, chunker_args)
+    embeddings = embed_chunks(chunks, model=embedding_model, backend=backend)
     return chunks, embeddings
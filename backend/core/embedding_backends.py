@@ -0,0 +1,249 @@
+"""
+embedding_backends.py
+
+Registry of embedding backends behind embed_chunks / embed_pdf.
+
+    openai                 OpenAI embeddings API (default)
+    sentence-transformers  local Hugging Face sentence-transformer model on CPU
+    onnx                   local ONNX export of a sentence-transformer, run with onnxruntime
+    hashing                dependency-free feature-hashing embeddings (lexical, for offline use and tests)
+
+Local backends load their model once per worker process and embed in fixed-size batches.
+They are configured through environment variables:
+
+    EMBEDDING_BACKEND       backend used when none is given (default: openai)
+    EMBEDDING_MODEL         model used when none is given (default: the backend's own default)
+    LOCAL_EMBEDDING_BATCH   inputs per inference batch for local backends (default: 64)
+    LOCAL_EMBEDDING_THREADS CPU threads used by local inference (default: CPU count)
+"""
+
+import base64
+import os
+from abc import ABC, abstractmethod
+import re
+import threading
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from .embedding_batcher import EmbeddingBatcher
+
+LOCAL_EMBEDDING_BATCH = int(os.getenv("LOCAL_EMBEDDING_BATCH", 64))
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", os.cpu_count() or 1))
+
+
+class EmbeddingBackend(ABC):
+    """
+    Base class for embedding backends. A subclass that leaves embed() unimplemented cannot be
+    instantiated.
+
+    Attributes:
+        name (str): Registry name, also used to namespace cache keys.
+        default_model (str): Model used when the caller does not name one.
+    """
+
+    name = ""
+    default_model = ""
+
+    @abstractmethod
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+        """
+        Returns a float32 array with one embedding row per text, in order.
+        dimensions optionally shortens the vectors, for models that support it.
+        """
+
+
+class OpenAIBackend(EmbeddingBackend):
+    """
+    Embeds with the OpenAI API through the token-aware EmbeddingBatcher.
+    """
+
+    name = "openai"
+    default_model = "text-embedding-3-small"
+
+    def __init__(self):
+        import openai
+        self._openai = openai
+        self._batcher = EmbeddingBatcher(
+            self._create_embeddings,
+            retryable=(openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                       openai.InternalServerError),
+        )
+
+    def _create_embeddings(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+        # base64 transfers raw float32 bytes instead of a JSON list of decimal floats
+        kwargs = {"dimensions": dimensions} if dimensions else {}
+        response = self._openai.embeddings.create(
+            input=texts,
+            model=model,
+            encoding_format="base64",
+            **kwargs
+        )
+        return np.stack([np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32) for item in response.data])
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+        return self._batcher.embed(texts, model, dimensions)
+
+
+class _LocalBackend(EmbeddingBackend):
+    """
+    Shared batching and per-process model loading for local CPU backends. Subclasses implement
+    _load and _embed_batch.
+    """
+
+    def __init__(self, batch_size: int = LOCAL_EMBEDDING_BATCH, threads: int = LOCAL_EMBEDDING_THREADS):
+        self.batch_size = max(1, batch_size)
+        self.threads = max(1, threads)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self, model: str):
+        """
+        Loads a model by name; the result is passed to _embed_batch.
+        """
+
+    @abstractmethod
+    def _embed_batch(self, loaded, texts: List[str]) -> np.ndarray:
+        """
+        Embeds one batch of texts with a loaded model.
+        """
+
+    def model(self, model: str):
+        """
+        Returns the loaded model, loading it on first use.
+        """
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = self._load(model)
+            return self._models[model]
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+        loaded = self.model(model)
+        vectors = np.concatenate([
+            np.asarray(self._embed_batch(loaded, texts[start:start + self.batch_size]), dtype=np.float32)
+            for start in range(0, len(texts), self.batch_size)
+        ])
+        if dimensions and dimensions < vectors.shape[1]:
+            # Keep the leading dimensions and renormalize, as the OpenAI API does
+            vectors = vectors[:, :dimensions]
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return np.ascontiguousarray(vectors)
+
+
+class SentenceTransformerBackend(_LocalBackend):
+    """
+    Embeds with a sentence-transformers model on CPU. Requires the sentence-transformers package.
+    """
+
+    name = "sentence-transformers"
+    default_model = "sentence-transformers/all-MiniLM-L6-v2"
+
+    def _load(self, model: str):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(self.threads)
+        return SentenceTransformer(model, device="cpu")
+
+    def _embed_batch(self, loaded, texts: List[str]) -> np.ndarray:
+        return loaded.encode(texts, batch_size=self.batch_size, convert_to_numpy=True, normalize_embeddings=True)
+
+
+class OnnxBackend(_LocalBackend):
+    """
+    Embeds with an ONNX export of a sentence-transformer. The model is a directory containing
+    model.onnx and tokenizer.json; outputs are mean-pooled and L2-normalized in NumPy.
+    Requires the onnxruntime and tokenizers packages.
+    """
+
+    name = "onnx"
+    default_model = os.getenv("ONNX_EMBEDDING_MODEL_DIR", "models/all-MiniLM-L6-v2-onnx")
+    max_length = 256
+
+    def _load(self, model: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        session = onnxruntime.InferenceSession(
+            os.path.join(model, "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        tokenizer = Tokenizer.from_file(os.path.join(model, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=self.max_length)
+        tokenizer.enable_padding()
+        return session, tokenizer
+
+    def _embed_batch(self, loaded, texts: List[str]) -> np.ndarray:
+        session, tokenizer = loaded
+        encodings = tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        input_names = {i.name for i in session.get_inputs()}
+        if "token_type_ids" in input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+
+class HashingBackend(_LocalBackend):
+    """
+    Lexical embeddings from signed feature hashing of word unigrams and bigrams. Needs no model
+    download or API key, so it suits offline processing and tests. The model name selects the
+    dimension, e.g. 'hashing-384'.
+    """
+
+    name = "hashing"
+    default_model = "hashing-384"
+    _token = re.compile(r"\w+")
+
+    def _load(self, model: str):
+        return int(model.rsplit("-", 1)[-1])
+
+    def _embed_batch(self, dim, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = self._token.findall(text.lower())
+            features = words + [a + " " + b for a, b in zip(words, words[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 1, 1.0, -1.0).astype(np.float32)
+            np.add.at(vectors[row], (hashes >> 1) % dim, signs)
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+_registry: Dict[str, Callable[[], EmbeddingBackend]] = {}
+_instances: Dict[str, EmbeddingBackend] = {}
+_instances_lock = threading.Lock()
+
+
+def register_backend(name: str, factory: Callable[[], EmbeddingBackend]):
+    """
+    Registers a backend factory under name. The factory is called once per process.
+    """
+    _registry[name] = factory
+    _instances.pop(name, None)
+
+
+def get_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Returns the (per-process) backend instance registered under name, or the EMBEDDING_BACKEND default.
+    """
+    name = name or os.getenv("EMBEDDING_BACKEND", "openai")
+    if name not in _registry:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = _registry[name]()
+        return _instances[name]
+
+
+register_backend(OpenAIBackend.name, OpenAIBackend)
+register_backend(SentenceTransformerBackend.name, SentenceTransformerBackend)
+register_backend(OnnxBackend.name, OnnxBackend)
+register_backend(HashingBackend.name, HashingBackend)
@@ -0,0 +1,150 @@
+"""
+embedding_batcher.py
+
+Splits large embedding jobs into API-sized requests and sends them concurrently.
+
+Chunks are packed in order into batches that stay under a token budget and an input-count limit,
+up to `concurrency` batches are in flight at once, and rate-limit or transient server errors are
+retried with jittered exponential backoff. Results are always returned in input order.
+
+Configured through environment variables:
+
+    EMBEDDING_BATCH_TOKENS      token budget per request (default: 100000)
+    EMBEDDING_BATCH_MAX_INPUTS  inputs per request (default: 2048, the OpenAI limit)
+    EMBEDDING_CONCURRENCY       requests in flight per embedding job (default: 4)
+    EMBEDDING_MAX_RETRIES       retries per request before giving up (default: 6)
+"""
+
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", 100000))
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", 2048))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 6))
+
+_encodings = {}
+
+
+def count_tokens(text: str, model: str = "text-embedding-3-small") -> int:
+    """
+    Returns the number of tokens in text for the given model. Uses tiktoken when it is installed,
+    otherwise a conservative estimate of one token per three characters.
+    """
+    if tiktoken is not None:
+        encoding = _encodings.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+            _encodings[model] = encoding
+        return len(encoding.encode(text))
+    return len(text) // 3 + 1
+
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int, max_inputs: int) -> List[Tuple[int, int]]:
+    """
+    Packs consecutive inputs into batches. Returns (start, end) index ranges such that each batch has
+    at most max_inputs inputs and at most max_tokens tokens, unless a single input is larger on its own.
+    """
+    batches = []
+    start = 0
+    tokens = 0
+    for i, count in enumerate(token_counts):
+        if i > start and (tokens + count > max_tokens or i - start >= max_inputs):
+            batches.append((start, i))
+            start = i
+            tokens = 0
+        tokens += count
+    if start < len(token_counts):
+        batches.append((start, len(token_counts)))
+    return batches
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """
+    Returns the server's Retry-After hint in seconds, if the error carries one.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingBatcher:
+    """
+    Sends embedding requests in token-bounded batches with bounded parallelism and retries.
+
+    Attributes:
+        request_fn (Callable): Function (texts, model[, dimensions]) -> vectors making one API request.
+        retryable (tuple): Exception types that trigger a backoff and retry.
+        max_tokens (int): Token budget per request.
+        max_inputs (int): Maximum inputs per request.
+        concurrency (int): Maximum requests in flight per call to embed().
+        max_retries (int): Retries per request before the error is raised.
+    """
+
+    def __init__(self, request_fn: Callable, retryable: Tuple[Type[BaseException], ...] = (),
+                 max_tokens: int = EMBEDDING_BATCH_TOKENS, max_inputs: int = EMBEDDING_BATCH_MAX_INPUTS,
+                 concurrency: int = EMBEDDING_CONCURRENCY, max_retries: int = EMBEDDING_MAX_RETRIES,
+                 base_delay: float = 0.5, max_delay: float = 30.0, sleep: Callable = time.sleep):
+        self.request_fn = request_fn
+        self.retryable = retryable
+        self.max_tokens = max_tokens
+        self.max_inputs = max_inputs
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def _send(self, texts: List[str], model: str, dimensions: Optional[int]) -> np.ndarray:
+        attempt = 0
+        while True:
+            try:
+                if dimensions:
+                    return np.asarray(self.request_fn(texts, model, dimensions), dtype=np.float32)
+                return np.asarray(self.request_fn(texts, model), dtype=np.float32)
+            except self.retryable as e:
+                if attempt >= self.max_retries:
+                    raise
+                # Full jitter: sleep a random amount up to the exponential cap
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                hint = _retry_after(e)
+                if hint is not None:
+                    delay = max(delay, hint)
+                print(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                self.sleep(delay)
+                attempt += 1
+
+    def embed(self, texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+        """
+        Embeds texts, returning a float32 array with one row per text in input order.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        counts = [count_tokens(text, model) for text in texts]
+        batches = pack_batches(counts, self.max_tokens, self.max_inputs)
+        if len(batches) == 1:
+            return self._send(texts, model, dimensions)
+
+        pool = ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches)))
+        try:
+            futures = [pool.submit(self._send, texts[start:end], model, dimensions) for start, end in batches]
+            return np.concatenate([future.result() for future in futures])
+        finally:
+            # On failure, drop the batches that have not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+embedding_cache.py
+
+Content-addressed cache for chunk embeddings.
+
+Embeddings are keyed by (model, SHA-256 of the chunk text), so identical chunks uploaded again by
+any student are embedded only once. Lookups go through an in-process LRU first and then a local
+SQLite file; the file is kept under a size budget by evicting the least recently used vectors.
+The size of the stored vectors is read once when the file is opened and kept up to date as
+vectors are written and evicted.
+
+Configured through environment variables:
+
+    EMBEDDING_CACHE_PATH       SQLite file to use; set to an empty string to disable the cache
+    EMBEDDING_CACHE_MAX_BYTES  size budget for stored vectors (default: 512 MB)
+    EMBEDDING_CACHE_LRU_ITEMS  number of vectors kept in memory (default: 10000)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .cache import LRUCache
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smart-study-scheduler", "embeddings.sqlite3")
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH)
+EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+EMBEDDING_CACHE_LRU_ITEMS = int(os.getenv("EMBEDDING_CACHE_LRU_ITEMS", 10000))
+
+# SQLite limits the number of bound parameters per statement
+_SQLITE_BATCH = 500
+
+
+def text_hash(text: str) -> str:
+    """
+    Returns the hex SHA-256 digest of a chunk's text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-level (memory, then SQLite) embedding cache with size-based eviction.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+        max_bytes (int): Size budget for the vectors stored on disk.
+        hits (int): Lookups answered from memory or disk.
+        misses (int): Lookups that had to go to the embedding API.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_BYTES,
+                 lru_items: int = EMBEDDING_CACHE_LRU_ITEMS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = LRUCache(lru_items)
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._size = self._stored_bytes()
+
+    def _stored_bytes(self) -> int:
+        (size,) = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        return size
+
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """
+        Looks up embeddings for the given text hashes. Returns a dict of the hashes that were found,
+        mapped to read-only float32 vectors.
+        """
+        unique = list(dict.fromkeys(hashes))
+        found = {}
+        missing = []
+        for h in unique:
+            vector = self._memory.get((model, h))
+            if vector is not None:
+                found[h] = vector
+            else:
+                missing.append(h)
+
+        if missing:
+            now = time.time()
+            with self._lock:
+                for start in range(0, len(missing), _SQLITE_BATCH):
+                    batch = missing[start:start + _SQLITE_BATCH]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                        [model, *batch],
+                    ).fetchall()
+                    for h, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[h] = vector
+                        self._memory.put((model, h), vector)
+                    if rows:
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                            [(now, model, h) for h, _ in rows],
+                        )
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, np.ndarray]]):
+        """
+        Stores (text hash, embedding) pairs and evicts old vectors if the size budget is exceeded.
+        """
+        now = time.time()
+        rows = {}
+        for h, vector in items:
+            vector = np.asarray(vector, dtype=np.float32)
+            self._memory.put((model, h), vector)
+            rows[h] = (model, h, vector.tobytes(), now)
+        if not rows:
+            return
+        hashes = list(rows)
+        with self._lock:
+            # Vectors are content-addressed, so a stored one is only marked as used again
+            stored = set()
+            for start in range(0, len(hashes), _SQLITE_BATCH):
+                batch = hashes[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                stored.update(h for (h,) in self._conn.execute(
+                    f"SELECT hash FROM embeddings WHERE model = ? AND hash IN ({placeholders})", [model, *batch]
+                ))
+            self._conn.executemany(
+                "INSERT INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (model, hash) DO UPDATE SET last_used = excluded.last_used", rows.values()
+            )
+            self._size += sum(len(row[2]) for h, row in rows.items() if h not in stored)
+            self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used vectors until the cache is back under 90% of its budget.
+        """
+        if self._size <= self.max_bytes:
+            return
+        # Other processes may share the file; start from its actual size before deleting anything
+        self._size = self._stored_bytes()
+        if self._size <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        oldest = self._conn.execute("SELECT model, hash, LENGTH(vector) FROM embeddings ORDER BY last_used")
+        for model, h, length in oldest:
+            if self._size <= target:
+                break
+            doomed.append((model, h))
+            self._size -= length
+        oldest.close()
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND hash = ?", doomed)
+        for key in doomed:
+            self._memory.pop(key)
+        self.evictions += len(doomed)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss/eviction counters for the cache as a whole and for its memory layer.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory": self._memory.stats(),
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Returns the process-wide embedding cache, or None if EMBEDDING_CACHE_PATH is empty.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_PATH:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+    return _cache
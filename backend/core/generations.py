@@ -0,0 +1,73 @@
+"""
+generations.py
+
+Change counters shared by every process on the machine.
+
+The API and the background workers (backend/worker.py) each keep in-process caches of per-user
+state, such as search indexes and capacity calendars. A change a worker makes would never reach
+the API's copies, so whoever changes a user's data bumps a named counter ('chunks:<user_id>',
+'capacity:<user_id>', ...). Each cache entry remembers the value it was built at and is rebuilt
+once the counter has moved. The counters live in the job queue's SQLite file, which the API and
+the workers already share; reading one is a single indexed lookup.
+"""
+
+import os
+import sqlite3
+import threading
+
+from .jobs import JOB_DB_PATH
+
+
+class Generations:
+    """
+    Named integer counters in a SQLite file. A counter that was never bumped reads as 0.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Opened on first use, so importing a module that shares its counters stays cheap
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS generations (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        return self._conn
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            row = self._connection().execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, key: str) -> int:
+        """
+        Increments a counter and returns its new value.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("INSERT INTO generations (key, value) VALUES (?, 1)"
+                             " ON CONFLICT (key) DO UPDATE SET value = value + 1", (key,))
+                value = conn.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return value
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+shared_generations = Generations()
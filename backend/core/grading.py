@@ -0,0 +1,197 @@
+"""
+grading.py
+
+Grading of short quiz answers.
+
+Every submission used to be sent to the chat model, even when the answer was empty or pasted
+from the material. PreGrader settles the clear-cut cases locally, before any model call:
+
+- non-answers (empty, punctuation only, "I don't know") score 0;
+- answers copied from the study material score 0, with a request to answer in their own words;
+- answers whose embedding has almost no similarity to the chunk's stored embedding score 0.
+
+Only rejections are settled locally. Closeness to the material does not show that an answer
+addresses the question asked; a paraphrase of the passage would otherwise count as correct. Every
+other answer is graded by the chat model through the LLM gateway; a batch of answers is
+embedded in one call and its ambiguous answers are graded concurrently. PreGrader counts how
+each answer was settled; stats() reports the counts next to the thresholds in use.
+
+Configured through environment variables:
+
+    GRADE_REJECT_SIMILARITY   cosine similarity at or below which an answer is rejected (default: 0.1)
+    GRADE_COPY_OVERLAP        share of an answer's word 5-grams found in the material for it to count
+                              as copied (default: 0.8)
+    GRADE_MODEL               chat model used for ambiguous answers (default: LLM_MODEL)
+"""
+
+import asyncio
+import os
+import re
+from collections import Counter
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .llm import LLM_MODEL, LLMGateway
+from .questions import parse_json_object
+
+GRADE_REJECT_SIMILARITY = float(os.getenv("GRADE_REJECT_SIMILARITY", 0.1))
+GRADE_COPY_OVERLAP = float(os.getenv("GRADE_COPY_OVERLAP", 0.8))
+GRADE_MODEL = os.getenv("GRADE_MODEL", LLM_MODEL)
+
+COPY_NGRAM = 5
+NON_ANSWERS = {"idk", "i dont know", "i do not know", "dont know", "no idea", "not sure", "pass", "skip", "na", "none"}
+UNAVAILABLE_FEEDBACK = "Quiz submitted! (AI grading unavailable)"
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", re.sub(r"['\u2019]", "", text.lower()))
+
+
+def _ngrams(words: List[str], n: int = COPY_NGRAM) -> set:
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+class PreGrader:
+    """
+    Local grading of answers that are clearly wrong.
+
+    Attributes:
+        reject_similarity (float): Cosine similarity at or below which an answer scores 0.
+        copy_overlap (float): Share of copied word 5-grams at which an answer counts as copied.
+        counts (Counter): Answers settled per outcome ('empty', 'copied', 'rejected', 'llm' for
+            those passed on to the model).
+    """
+
+    def __init__(self, reject_similarity: float = GRADE_REJECT_SIMILARITY, copy_overlap: float = GRADE_COPY_OVERLAP):
+        self.reject_similarity = reject_similarity
+        self.copy_overlap = copy_overlap
+        self.counts = Counter()
+
+    def check_text(self, answer: str, chunk_text: str) -> Optional[Tuple[int, str]]:
+        """
+        Lexical checks. Returns (score, feedback) for non-answers and copied answers, otherwise None.
+        """
+        words = _words(answer)
+        if not words or " ".join(words) in NON_ANSWERS:
+            self.counts["empty"] += 1
+            return 0, "You didn't give an answer. Try recalling what you can from the material."
+        # Too short to tell copying from a correct key term
+        if len(words) >= 2 * COPY_NGRAM:
+            answer_ngrams = _ngrams(words)
+            copied = len(answer_ngrams & _ngrams(_words(chunk_text))) / len(answer_ngrams)
+            if copied >= self.copy_overlap:
+                self.counts["copied"] += 1
+                return 0, "Your answer repeats the study material word for word. Try answering in your own words."
+        return None
+
+    def check_similarity(self, answer_vector: np.ndarray, chunk_vector: np.ndarray) -> Optional[Tuple[int, str]]:
+        """
+        Embedding check. Returns (0, feedback) when the answer is barely similar to the chunk,
+        otherwise None.
+        """
+        a = np.asarray(answer_vector, dtype=np.float32)
+        b = np.asarray(chunk_vector, dtype=np.float32)
+        if a.shape != b.shape:
+            # Embedded with a different model than the chunk; nothing to compare
+            return None
+        similarity = float(a @ b / max(float(np.linalg.norm(a) * np.linalg.norm(b)), 1e-12))
+        if similarity <= self.reject_similarity:
+            self.counts["rejected"] += 1
+            return 0, "Your answer doesn't seem to be about this material. Review it and try again."
+        return None
+
+    def stats(self) -> dict:
+        """
+        Returns the thresholds and how many answers were settled locally and by the model.
+        """
+        total = sum(self.counts.values())
+        return {
+            "thresholds": {
+                "reject_similarity": self.reject_similarity,
+                "copy_overlap": self.copy_overlap,
+            },
+            "counts": {outcome: self.counts[outcome] for outcome in ("empty", "copied", "rejected", "llm")},
+            "local_rate": (total - self.counts["llm"]) / total if total else 0.0,
+        }
+
+
+async def grade_with_llm(llm: LLMGateway, chunk_text: str, quiz_question: Optional[str], answer: str) -> Tuple[int, str]:
+    """
+    Grades an answer with the chat model. Returns (score, feedback); the score is 1 or 0.
+    """
+    prompt = (
+        "You are an expert grader for short-answer quizzes. "
+        "Given the study material, quiz question, and student answer, respond ONLY with a valid JSON object on a single line, like this: {\"score\": 1, \"feedback\": \"Your feedback here.\"}. "
+        "Do not include any explanation or text outside the JSON.\n\n"
+        f"Study material: {chunk_text}\n"
+        f"Quiz question: {quiz_question or 'N/A'}\n"
+        f"Student answer: {answer}\n"
+        "Grade the student's answer as 1 (fully correct) or 0 (incorrect) and provide a brief feedback. Only use 1 or 0 for the score. If the answer is incorrect, use 'you' (second person) in your feedback."
+    )
+    result = await llm.complete(
+        [
+            {"role": "system", "content": "You are an expert grader for short-answer quizzes."},
+            {"role": "user", "content": prompt}
+        ],
+        model=GRADE_MODEL,
+        max_tokens=150,
+        temperature=0.2
+    )
+    graded = parse_json_object(result)
+    if graded is None:
+        print(f"[DEBUG] No JSON object found in AI grading response: {result}")
+        return 0, UNAVAILABLE_FEEDBACK
+    score = int(round(float(graded.get("score", 0))))
+    if score != 1:
+        return 0, graded.get("feedback", "Submitted.")
+    return 1, "Correct!"
+
+
+async def _grade_with_fallback(llm: LLMGateway, chunk_text: str, quiz_question: Optional[str],
+                               answer: str) -> Tuple[int, str]:
+    try:
+        return await grade_with_llm(llm, chunk_text, quiz_question, answer)
+    except Exception as e:
+        print(f"[DEBUG] OpenAI grading error: {e!r}")
+        return 0, UNAVAILABLE_FEEDBACK
+
+
+async def grade_answers(llm: LLMGateway, pregrader: PreGrader,
+                        items: List[Tuple[str, Optional[str], str, Optional[np.ndarray]]],
+                        embed: Callable[[List[str]], Awaitable[np.ndarray]]) -> List[Tuple[int, str]]:
+    """
+    Grades several answers, given as (answer, quiz_question, chunk_text, chunk_vector), locally where
+    they are clearly wrong and with the chat model otherwise. embed embeds a list of texts; it is
+    called once, for the answers that pass the lexical checks and whose chunk has a stored
+    embedding. Ambiguous answers are graded concurrently. Returns (score, feedback) per item.
+    """
+    graded = [pregrader.check_text(answer, chunk_text) for answer, _, chunk_text, _ in items]
+    to_embed = [i for i, (_, _, _, chunk_vector) in enumerate(items) if graded[i] is None and chunk_vector is not None]
+    if to_embed:
+        try:
+            vectors = await embed([items[i][0] for i in to_embed])
+            for i, vector in zip(to_embed, vectors):
+                graded[i] = pregrader.check_similarity(vector, items[i][3])
+        except Exception as e:
+            print(f"Error embedding quiz answers: {e!r}")
+    ambiguous = [i for i in range(len(items)) if graded[i] is None]
+    pregrader.counts["llm"] += len(ambiguous)
+    results = await asyncio.gather(*(
+        _grade_with_fallback(llm, items[i][2], items[i][1], items[i][0]) for i in ambiguous
+    ))
+    for i, result in zip(ambiguous, results):
+        graded[i] = result
+    return graded
+
+
+async def grade_answer(llm: LLMGateway, pregrader: PreGrader, answer: str, quiz_question: Optional[str],
+                       chunk_text: str, chunk_vector: Optional[np.ndarray],
+                       embed: Callable[[List[str]], Awaitable[np.ndarray]]) -> Tuple[int, str]:
+    """
+    Grades a single answer; see grade_answers. Returns (score, feedback).
+    """
+    return (await grade_answers(llm, pregrader, [(answer, quiz_question, chunk_text, chunk_vector)], embed))[0]
+
+
+pregrader = PreGrader()
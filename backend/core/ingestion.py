@@ -0,0 +1,263 @@
+"""
+ingestion.py
+
+Runs the PDF ingestion pipeline (text extraction, chunking and embedding) off the event loop.
+
+CPU-bound PyMuPDF parsing and chunking run in a process pool so they scale with the number of
+cores, while the network-bound embedding call runs in a thread pool. Both pools are shared by
+every request handled by the worker and are configured through environment variables:
+
+    INGESTION_EXECUTOR   'process' (default) or 'thread' for the extraction/chunking pool
+    INGESTION_WORKERS    number of extraction/chunking workers (default: CPU count)
+    EMBEDDING_THREADS    number of concurrent embedding calls (default: 4)
+    PIPELINE_MAX_BYTES   cap on PDF bytes held in memory by a batch upload (default: 256 MB)
+    PIPELINE_IO_CONCURRENCY  concurrent storage uploads / chunk inserts per batch (default: 4)
+"""
+
+import asyncio
+import hashlib
+import inspect
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .embedding import chunk_pdf, embed_chunks
+
+INGESTION_EXECUTOR = os.getenv("INGESTION_EXECUTOR", "process")
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", os.cpu_count() or 1))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", 4))
+PIPELINE_MAX_BYTES = int(os.getenv("PIPELINE_MAX_BYTES", 256 * 1024 * 1024))
+PIPELINE_IO_CONCURRENCY = int(os.getenv("PIPELINE_IO_CONCURRENCY", 4))
+
+
+def _chunk_pdf_bytes(pdf_bytes: bytes, chunker_args: Optional[dict] = None) -> List[str]:
+    """
+    Extracts and chunks a PDF given as raw bytes. Lives at module level so it can be pickled
+    and sent to a worker process.
+    """
+    return chunk_pdf(BytesIO(pdf_bytes), chunker_args)
+
+
+def content_hash(pdf_bytes: bytes) -> str:
+    """
+    Returns the hex SHA-256 digest of a PDF's bytes, used to recognise repeat uploads.
+    """
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def chunk_ids_for(document_id: str, count: int) -> List[str]:
+    """
+    Returns the IDs of a document's first count chunks. They are derived from the document ID, so
+    storing a document's chunks again (e.g. when a failed upload is retried) overwrites the rows
+    of the earlier attempt instead of adding a second set.
+    """
+    return [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}/chunks/{i}")) for i in range(count)]
+
+
+class IngestionExecutor:
+    """
+    Owns the worker pools used to ingest PDFs without blocking the event loop.
+
+    Attributes:
+        mode (str): 'process' to chunk in worker processes, 'thread' to chunk in threads.
+        workers (int): Number of extraction/chunking workers.
+        embedding_threads (int): Number of threads available for embedding calls.
+    """
+
+    def __init__(self, mode: str = INGESTION_EXECUTOR, workers: int = INGESTION_WORKERS,
+                 embedding_threads: int = EMBEDDING_THREADS):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown ingestion executor mode: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.embedding_threads = max(1, embedding_threads)
+        self._chunk_pool: Optional[Executor] = None
+        self._embed_pool: Optional[Executor] = None
+
+    def _get_chunk_pool(self) -> Executor:
+        # Pools are created lazily so importing this module never forks.
+        if self._chunk_pool is None:
+            if self.mode == "process":
+                # 'spawn' avoids forking a process that already runs an event loop and threads
+                self._chunk_pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._chunk_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-chunk")
+        return self._chunk_pool
+
+    def _get_embed_pool(self) -> Executor:
+        if self._embed_pool is None:
+            self._embed_pool = ThreadPoolExecutor(max_workers=self.embedding_threads, thread_name_prefix="ingest-embed")
+        return self._embed_pool
+
+    async def chunk_pdf(self, pdf_bytes: bytes, chunker_args: Optional[dict] = None) -> List[str]:
+        """
+        Extracts and chunks a PDF in the chunking pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_chunk_pool(), _chunk_pdf_bytes, pdf_bytes, chunker_args)
+
+    async def embed_chunks(self, chunks: List[str], model: Optional[str] = None, use_cache: bool = True) -> np.ndarray:
+        """
+        Embeds chunks in the embedding thread pool. use_cache=False keeps texts that will not be
+        embedded again, such as quiz answers, out of the embedding cache.
+        """
+        if not chunks:
+            return embed_chunks(chunks, model, use_cache)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_embed_pool(), embed_chunks, chunks, model, use_cache)
+
+    async def embed_pdf(self, pdf_bytes: bytes, chunker_args: Optional[dict] = None,
+                        embedding_model: Optional[str] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Async counterpart of embedding.embed_pdf: chunks the PDF in the chunking pool, then embeds
+        the chunks in the embedding pool. Returns the chunks and their embeddings.
+        """
+        chunks = await self.chunk_pdf(pdf_bytes, chunker_args)
+        embeddings = await self.embed_chunks(chunks, model=embedding_model)
+        return chunks, embeddings
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shuts down both pools. They are recreated on next use.
+        """
+        for pool in (self._chunk_pool, self._embed_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._chunk_pool = None
+        self._embed_pool = None
+
+
+_executor: Optional[IngestionExecutor] = None
+
+
+def get_ingestion_executor() -> IngestionExecutor:
+    """
+    Returns the process-wide ingestion executor, creating it on first use.
+    """
+    global _executor
+    if _executor is None:
+        _executor = IngestionExecutor()
+    return _executor
+
+
+class ByteBudget:
+    """
+    Async counting semaphore over bytes. Callers wait until enough of the budget is free, which
+    applies backpressure to readers when too many PDFs are held in memory at once.
+    A single request larger than the whole budget is admitted once nothing else is held.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(1, max_bytes)
+        self.in_use = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, n: int) -> int:
+        n = min(max(0, n), self.max_bytes)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_use + n <= self.max_bytes)
+            self.in_use += n
+        return n
+
+    async def release(self, n: int):
+        async with self._condition:
+            self.in_use -= n
+            self._condition.notify_all()
+
+
+class BatchPipeline:
+    """
+    Ingests several PDFs concurrently as a staged pipeline: storage upload, text extraction,
+    embedding and chunk insertion for different PDFs overlap, so a batch takes roughly as long
+    as its slowest stage rather than the sum of all of them.
+
+    Each stage has its own concurrency limit: chunking and embedding are bounded by the
+    IngestionExecutor pools, storage and inserts by io_concurrency. PDF bytes are only read
+    once the byte budget allows it and are released as soon as they are uploaded and chunked.
+
+    store_file(document_id, pdf_bytes, file_name, content_hash) and
+    store_chunks(chunks, embeddings, document_id) are the persistence callbacks; they may be
+    coroutine functions, otherwise they are treated as blocking and run in threads. store_chunks
+    returns chunk IDs. The optional
+    reuse_document(document_id, file_name, content_hash) callback returns (chunks, embeddings) of an
+    identical, already ingested PDF, in which case upload, extraction and embedding are skipped.
+    """
+
+    def __init__(self, store_file: Callable, store_chunks: Callable,
+                 executor: Optional[IngestionExecutor] = None,
+                 max_bytes: int = PIPELINE_MAX_BYTES,
+                 io_concurrency: int = PIPELINE_IO_CONCURRENCY,
+                 reuse_document: Optional[Callable] = None):
+        self.store_file = store_file
+        self.store_chunks = store_chunks
+        self.reuse_document = reuse_document
+        self.executor = executor or get_ingestion_executor()
+        self.budget = ByteBudget(max_bytes)
+        self._io = asyncio.Semaphore(max(1, io_concurrency))
+
+    async def _run_io(self, fn: Callable, *args):
+        async with self._io:
+            if inspect.iscoroutinefunction(fn):
+                return await fn(*args)
+            return await asyncio.to_thread(fn, *args)
+
+    async def process(self, upload) -> Tuple[List[str], np.ndarray]:
+        """
+        Runs a single upload (anything with .filename, .size and an async read()) through every
+        stage and returns the IDs of its stored chunks together with their embeddings. An upload
+        with a .document_id attribute is stored under that ID, so a retried upload overwrites its
+        earlier attempt instead of leaving a second document behind.
+        """
+        document_id = getattr(upload, "document_id", None) or str(uuid.uuid4())
+        reserved = await self.budget.acquire(getattr(upload, "size", None) or 0)
+        pdf_bytes = None
+        try:
+            pdf_bytes = await upload.read()
+            digest = await asyncio.to_thread(content_hash, pdf_bytes)
+            reused = None
+            if self.reuse_document is not None:
+                reused = await self._run_io(self.reuse_document, document_id, upload.filename, digest)
+            if reused is None:
+                # Storage upload and extraction only need the raw bytes, so run them side by side
+                _, chunks = await asyncio.gather(
+                    self._run_io(self.store_file, document_id, pdf_bytes, upload.filename, digest),
+                    self.executor.chunk_pdf(pdf_bytes),
+                )
+        finally:
+            # The raw bytes are not needed past this point; free them before embedding
+            pdf_bytes = None
+            await self.budget.release(reserved)
+        if reused is not None:
+            chunks, embeddings = reused
+        else:
+            embeddings = await self.executor.embed_chunks(chunks)
+        chunk_ids = await self._run_io(self.store_chunks, chunks, embeddings, document_id)
+        return chunk_ids, embeddings
+
+    async def run(self, uploads: Sequence, on_result: Optional[Callable] = None) -> List[Tuple[List[str], np.ndarray]]:
+        """
+        Processes all uploads concurrently. Returns (chunk IDs, embeddings) of each upload, in upload order.
+        on_result(index, chunk_ids, embeddings) is awaited as each upload finishes, e.g. to checkpoint it.
+        If any upload fails, the remaining ones are cancelled and the error is raised.
+        """
+        async def process(index, upload):
+            chunk_ids, embeddings = await self.process(upload)
+            if on_result is not None:
+                await on_result(index, chunk_ids, embeddings)
+            return chunk_ids, embeddings
+
+        tasks = [asyncio.create_task(process(i, upload)) for i, upload in enumerate(uploads)]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
@@ -0,0 +1,330 @@
+"""
+jobs.py
+
+Durable background job queue in a local SQLite file.
+
+The API enqueues a job and returns its ID at once; worker processes (backend/worker.py) claim
+jobs, run them and record the outcome, so request latency no longer depends on how long the work
+takes and throughput grows with the number of workers. Claiming is a single write transaction,
+so any number of workers can share one queue file.
+
+A claimed job holds a lease that its worker renews while it runs. If the worker dies, the lease
+runs out and another worker picks the job up again. A failed job is retried with exponential
+backoff until it has used JOB_MAX_ATTEMPTS attempts. Jobs save checkpoints as they finish stages,
+so a retried or resumed job skips work that is already done. A job's input files live in
+JOB_SPOOL_DIR/<job_id>; they are removed with its checkpoints once the job is done or has failed
+for good.
+
+Periodic jobs (run_periodic) are enqueued by every worker under an ID derived from the current
+interval, so however many workers are running, each interval gets one job.
+
+Configured through environment variables:
+
+    JOB_DB_PATH          SQLite file holding the queue
+    JOB_SPOOL_DIR        directory for job input files (default: a 'spool' directory next to JOB_DB_PATH)
+    JOB_MAX_ATTEMPTS     attempts before a job is marked failed (default: 3)
+    JOB_LEASE_SECONDS    seconds a claim lasts without renewal (default: 300)
+    JOB_RETRY_DELAY      seconds before the first retry, doubling with each attempt (default: 10)
+    JOB_POLL_INTERVAL    seconds an idle worker waits before looking for work again (default: 1)
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional
+
+DEFAULT_JOB_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "smart-study-scheduler", "jobs.sqlite3")
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", DEFAULT_JOB_DB_PATH)
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(JOB_DB_PATH)), "spool"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", 10))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+
+_COLUMNS = ("id", "kind", "user_id", "payload", "status", "attempts", "progress", "result", "error",
+            "created_at", "updated_at")
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of jobs with statuses 'queued', 'running', 'done' and 'failed'.
+
+    Attributes:
+        path (str): Location of the SQLite file.
+        spool_dir (str): Directory for job input files, shared by the API and the workers.
+        max_attempts (int): Attempts before a job is marked failed.
+        lease_seconds (float): Seconds a claim lasts without renewal.
+        retry_delay (float): Seconds before the first retry.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, spool_dir: str = JOB_SPOOL_DIR, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 lease_seconds: float = JOB_LEASE_SECONDS, retry_delay: float = JOB_RETRY_DELAY,
+                 clock=time.time):
+        self.path = path
+        self.spool_dir = spool_dir
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Workers in other processes hold the write lock briefly while claiming; wait for it
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " user_id TEXT,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL,"
+            " lease_until REAL,"
+            " progress TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_checkpoints ("
+            " job_id TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (job_id, key))"
+        )
+
+    def _discard_inputs(self, job_id: str):
+        """
+        Removes the checkpoints and spooled files of a job that will not run again.
+        """
+        self._execute("DELETE FROM job_checkpoints WHERE job_id = ?", (job_id,))
+        shutil.rmtree(os.path.join(self.spool_dir, job_id), ignore_errors=True)
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def enqueue(self, kind: str, payload: dict, user_id: Optional[str] = None, job_id: Optional[str] = None) -> str:
+        """
+        Adds a job and returns its ID.
+        """
+        job_id = job_id or str(uuid.uuid4())
+        now = self._clock()
+        self._execute(
+            "INSERT INTO jobs (id, kind, user_id, payload, status, available_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, user_id, json.dumps(payload), now, now, now),
+        )
+        return job_id
+
+    def enqueue_once(self, kind: str, payload: dict, job_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        Adds a job unless one with this ID already exists. Returns whether it was added.
+        """
+        now = self._clock()
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO jobs (id, kind, user_id, payload, status, available_at, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, user_id, json.dumps(payload), now, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self) -> Optional[dict]:
+        """
+        Takes the oldest job that is due, or whose previous worker's lease ran out, and marks it
+        running under a new lease. Returns the job, or None if there is nothing to do.
+        """
+        failed = []
+        try:
+            return self._claim(failed)
+        finally:
+            for job_id in failed:
+                self._discard_inputs(job_id)
+
+    def _claim(self, failed: list) -> Optional[dict]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    now = self._clock()
+                    row = self._conn.execute(
+                        f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+                        " WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_until < ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (now, now),
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job = self._decode(row)
+                    if job["attempts"] >= self.max_attempts:
+                        # Its last attempt's worker stopped without reporting back
+                        self._conn.execute(
+                            "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                            (job["error"] or "Worker stopped before finishing the job", now, job["id"]),
+                        )
+                        failed.append(job["id"])
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ?"
+                        " WHERE id = ?",
+                        (now + self.lease_seconds, now, job["id"]),
+                    )
+                    self._conn.execute("COMMIT")
+                    job.update(status="running", attempts=job["attempts"] + 1)
+                    return job
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def renew(self, job_id: str):
+        """
+        Extends the lease of a running job.
+        """
+        now = self._clock()
+        self._execute("UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                      (now + self.lease_seconds, now, job_id))
+
+    def set_progress(self, job_id: str, progress: dict):
+        self._execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                      (json.dumps(progress), self._clock(), job_id))
+
+    def complete(self, job_id: str, result: Optional[dict] = None):
+        """
+        Marks a job done, then removes its checkpoints and spooled files.
+        """
+        self._execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (json.dumps(result), self._clock(), job_id),
+        )
+        self._discard_inputs(job_id)
+
+    def fail(self, job_id: str, error: str):
+        """
+        Records a failed attempt. The job is queued again after a backoff delay, or marked failed
+        once it has used all its attempts, and its checkpoints and spooled files are removed.
+        """
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0]
+            final = attempts >= self.max_attempts
+            if final:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+                    (error, now, job_id),
+                )
+            else:
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, available_at = ?, lease_until = NULL, updated_at = ?"
+                    " WHERE id = ?",
+                    (error, now + delay, now, job_id),
+                )
+        if final:
+            self._discard_inputs(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """
+        Returns a job with its payload, progress and result decoded, or None if it does not exist.
+        """
+        row = self._execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def save_checkpoint(self, job_id: str, key: str, value):
+        self._execute("INSERT OR REPLACE INTO job_checkpoints (job_id, key, value) VALUES (?, ?, ?)",
+                      (job_id, key, json.dumps(value)))
+
+    def checkpoints(self, job_id: str) -> Dict[str, object]:
+        """
+        Returns every checkpoint saved by a job, by key.
+        """
+        rows = self._execute("SELECT key, value FROM job_checkpoints WHERE job_id = ?", (job_id,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def _decode(self, row) -> dict:
+        job = dict(zip(_COLUMNS, row))
+        for key in ("payload", "progress", "result"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def close(self):
+        self._conn.close()
+
+
+async def run_worker(queue: JobQueue, handlers: Dict[str, Callable[[dict], Awaitable[Optional[dict]]]],
+                     poll_interval: float = JOB_POLL_INTERVAL, stop: Optional[asyncio.Event] = None,
+                     max_jobs: Optional[int] = None):
+    """
+    Claims and runs jobs until stop is set (or max_jobs jobs have run). handlers maps a job kind
+    to a coroutine function that takes the job and returns its result. The job's lease is renewed
+    while its handler runs.
+    """
+    handled = 0
+    while not (stop is not None and stop.is_set()) and (max_jobs is None or handled < max_jobs):
+        job = await asyncio.to_thread(queue.claim)
+        if job is None:
+            if max_jobs is not None:
+                return
+            await asyncio.sleep(poll_interval)
+            continue
+        handled += 1
+        renewal = asyncio.create_task(_renew_lease(queue, job["id"]))
+        try:
+            handler = handlers.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"No handler for job kind '{job['kind']}'")
+            result = await handler(job)
+            await asyncio.to_thread(queue.complete, job["id"], result)
+        except Exception as e:
+            print(f"Error running job {job['id']} ({job['kind']}): {e!r}")
+            await asyncio.to_thread(queue.fail, job["id"], str(e) or repr(e))
+        finally:
+            renewal.cancel()
+
+
+async def run_periodic(queue: JobQueue, kind: str, interval: float, payload: Optional[dict] = None,
+                       stop: Optional[asyncio.Event] = None, clock=time.time):
+    """
+    Enqueues a job of the given kind once per interval until stop is set. The job ID names the
+    interval, so when several workers run this only the first to get there adds the job.
+    """
+    while not (stop is not None and stop.is_set()):
+        slot = int(clock() // interval)
+        try:
+            await asyncio.to_thread(queue.enqueue_once, kind, payload or {}, f"{kind}:{slot}")
+        except Exception as e:
+            print(f"Error enqueueing periodic job {kind}: {e!r}")
+        await asyncio.sleep(max(0.0, (slot + 1) * interval - clock()))
+
+
+async def _renew_lease(queue: JobQueue, job_id: str):
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        await asyncio.to_thread(queue.renew, job_id)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide job queue.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+    return _queue
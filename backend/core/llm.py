@@ -0,0 +1,176 @@
+"""
+llm.py
+
+Async gateway for the chat completions behind quiz generation and grading.
+
+Handlers used to call the synchronous OpenAI client, which held the worker's event loop for the
+whole completion. LLMGateway awaits an AsyncOpenAI client on one shared HTTP connection pool and
+adds:
+
+- a semaphore capping completions in flight, so a burst of students queues instead of opening
+  unbounded connections;
+- a deadline per call, after which it raises asyncio.TimeoutError and the caller falls back;
+- hedged retries: if an attempt has not answered after LLM_HEDGE_AFTER seconds, or failed with a
+  retryable error, a second attempt starts and the first answer wins. A hedge only starts while a
+  concurrency slot is free, so hedging never adds to a backlog;
+- backoff on rate limits: after a 429 the next attempt waits for the response's retry-after, or a
+  jittered LLM_RATE_LIMIT_BACKOFF, instead of going straight back into the limit.
+
+Configured through environment variables:
+
+    LLM_MODEL            chat model used when none is given (default: gpt-3.5-turbo)
+    LLM_MAX_CONCURRENCY  completions in flight per worker (default: 16)
+    LLM_TIMEOUT          deadline of one call, including hedges and retries, in seconds (default: 20)
+    LLM_HEDGE_AFTER      seconds before a slow attempt is hedged (default: 4)
+    LLM_MAX_ATTEMPTS     attempts per call, counting hedges and retries (default: 2)
+    LLM_RATE_LIMIT_BACKOFF  seconds to wait before retrying a rate-limited attempt that gave no
+                            retry-after, jittered by +/-50% (default: 1)
+"""
+
+import asyncio
+import os
+import random
+from typing import List, Optional
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 20))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 4))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", 2))
+LLM_RATE_LIMIT_BACKOFF = float(os.getenv("LLM_RATE_LIMIT_BACKOFF", 1))
+
+
+class LLMGateway:
+    """
+    Bounded, deadline-limited access to an async chat completions client.
+
+    Attributes:
+        client: openai.AsyncOpenAI-compatible client.
+        timeout (float): Deadline of one call in seconds.
+        hedge_after (float): Seconds before a slow attempt is hedged.
+        max_attempts (int): Attempts per call, counting hedges and retries.
+        retryable (tuple): Exception types worth another attempt.
+        backoff (tuple): Retryable exception types (rate limits) after which the next attempt waits.
+        backoff_delay (float): Base wait after a backoff error without a retry-after header.
+        hedges (int): Number of attempts started because an earlier one was slow.
+    """
+
+    def __init__(self, client, max_concurrency: int = LLM_MAX_CONCURRENCY, timeout: float = LLM_TIMEOUT,
+                 hedge_after: float = LLM_HEDGE_AFTER, max_attempts: int = LLM_MAX_ATTEMPTS,
+                 retryable: tuple = (asyncio.TimeoutError,), backoff: tuple = (),
+                 backoff_delay: float = LLM_RATE_LIMIT_BACKOFF):
+        self.client = client
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.max_attempts = max(1, max_attempts)
+        self.retryable = retryable
+        self.backoff = backoff
+        self.backoff_delay = backoff_delay
+        self.hedges = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _attempt(self, kwargs: dict) -> str:
+        async with self._semaphore:
+            response = await self.client.chat.completions.create(**kwargs)
+        return response.choices[0].message.content.strip()
+
+    def _retry_delay(self, error: Exception) -> float:
+        """
+        Seconds to wait before the attempt after error: the server's retry-after for a backoff
+        error if it sent one, otherwise a jittered backoff_delay; 0 for other errors.
+        """
+        if not isinstance(error, self.backoff):
+            return 0.0
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            return max(0.0, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            return self.backoff_delay * random.uniform(0.5, 1.5)
+
+    async def _hedged(self, kwargs: dict, hedge: bool) -> str:
+        loop = asyncio.get_running_loop()
+        pending = set()
+        error = None
+        attempts = 0
+        # No attempt starts before this time, set after a rate-limited attempt
+        resume_at = 0.0
+        try:
+            while True:
+                # Start an attempt when none is running (first try or retry), or hedge a slow one
+                if attempts < self.max_attempts and loop.time() >= resume_at and (
+                        not pending or hedge and not self._semaphore.locked()):
+                    if pending:
+                        self.hedges += 1
+                    pending.add(asyncio.ensure_future(self._attempt(kwargs)))
+                    attempts += 1
+                if not pending:
+                    if attempts >= self.max_attempts:
+                        raise error
+                    await asyncio.sleep(resume_at - loop.time())
+                    continue
+                timeout = self.hedge_after if hedge and attempts < self.max_attempts else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                    if not isinstance(error, self.retryable):
+                        raise error
+                    resume_at = max(resume_at, loop.time() + self._retry_delay(error))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, messages: List[dict], model: str = LLM_MODEL, timeout: Optional[float] = None,
+                       hedge: bool = True, **kwargs) -> str:
+        """
+        Returns the stripped text of a chat completion. kwargs are passed on to the client
+        (max_tokens, temperature, ...). timeout overrides the deadline; background callers that
+        do not wait on the answer pass hedge=False and are only retried after errors.
+        Raises asyncio.TimeoutError once the deadline passes.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        request = {"model": model, "messages": messages, "timeout": timeout, **kwargs}
+        return await asyncio.wait_for(self._hedged(request, hedge), timeout)
+
+    async def aclose(self):
+        await self.client.close()
+
+
+def create_llm_gateway() -> LLMGateway:
+    """
+    Builds a gateway over an AsyncOpenAI client whose connection pool matches the concurrency cap.
+    """
+    import openai
+    import httpx
+
+    # Room for a hedge per slot; retries are the gateway's job, not the client's
+    http_client = openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=2 * LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY)
+    )
+    client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client,
+                                timeout=LLM_TIMEOUT, max_retries=0)
+    return LLMGateway(client, retryable=(asyncio.TimeoutError, openai.RateLimitError, openai.APIConnectionError,
+                                         openai.APITimeoutError, openai.InternalServerError),
+                      backoff=(openai.RateLimitError,))
+
+
+_gateway = None
+
+def get_llm_gateway() -> LLMGateway:
+    """
+    FastAPI dependency returning the process-wide LLMGateway.
+    """
+    global _gateway
+    if _gateway is None:
+        _gateway = create_llm_gateway()
+    return _gateway
+
+async def close_llm_gateway():
+    """
+    Closes the process-wide gateway's connections; the next get_llm_gateway() builds a new one.
+    """
+    global _gateway
+    if _gateway is not None:
+        gateway, _gateway = _gateway, None
+        await gateway.aclose()
@@ -0,0 +1,210 @@
+"""
+memory_model.py
+
+Spaced-repetition memory model used to pick review dates from quiz_performance history.
+
+Each chunk a user has answered questions on has a memory state: stability (days until recall
+probability falls to 90%), difficulty (1-10) and the day of the last review. States are updated
+from graded answers with the FSRS-4.5 equations (a correct answer counts as 'good', an incorrect
+one as 'again') and kept in one set of NumPy arrays per user, so updating many chunks or computing
+the due dates of every chunk is a single vectorized pass.
+
+Configured through environment variables:
+
+    DESIRED_RETENTION        recall probability at which a review falls due (default: 0.9)
+    MAX_REVIEW_INTERVAL      longest interval between reviews, in days (default: 365)
+    MEMORY_MODEL_CACHE_TTL   seconds a user's replayed model is kept in memory (default: 600)
+"""
+
+import os
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .cache import TTLCache
+
+DESIRED_RETENTION = float(os.getenv("DESIRED_RETENTION", 0.9))
+MAX_REVIEW_INTERVAL = int(os.getenv("MAX_REVIEW_INTERVAL", 365))
+MEMORY_MODEL_CACHE_TTL = float(os.getenv("MEMORY_MODEL_CACHE_TTL", 600))
+
+# FSRS-4.5 default parameters
+FSRS_WEIGHTS = np.array([
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+])
+DECAY = -0.5
+FACTOR = 0.9 ** (1 / DECAY) - 1
+
+AGAIN, GOOD = 1, 3
+
+
+def _day_number(day) -> np.ndarray:
+    return np.asarray(day, dtype="datetime64[D]").astype(np.int64)
+
+
+def retrievability(elapsed_days: np.ndarray, stability: np.ndarray) -> np.ndarray:
+    """
+    Probability of recall after elapsed_days for memories of the given stability.
+    """
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def next_interval(stability: np.ndarray, desired_retention: float = DESIRED_RETENTION) -> np.ndarray:
+    """
+    Whole days until recall probability drops to desired_retention, between 1 and MAX_REVIEW_INTERVAL.
+    """
+    interval = stability / FACTOR * (desired_retention ** (1 / DECAY) - 1)
+    return np.clip(np.rint(interval), 1, MAX_REVIEW_INTERVAL).astype(np.int64)
+
+
+class MemoryModel:
+    """
+    Memory state of one user's chunks.
+
+    Attributes:
+        chunk_ids (list): Chunk ID of each row.
+        stability (np.ndarray): float32 stability in days.
+        difficulty (np.ndarray): float32 difficulty between 1 and 10.
+        last_review (np.ndarray): int64 day number (days since 1970-01-01) of the last review.
+        reviews (np.ndarray): int32 number of graded answers.
+    """
+
+    def __init__(self, weights: np.ndarray = FSRS_WEIGHTS):
+        self.weights = weights
+        self.chunk_ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._size = 0
+        self._stability = np.empty(0, dtype=np.float32)
+        self._difficulty = np.empty(0, dtype=np.float32)
+        self._last_review = np.empty(0, dtype=np.int64)
+        self._reviews = np.empty(0, dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._positions
+
+    @property
+    def stability(self) -> np.ndarray:
+        return self._stability[:self._size]
+
+    @property
+    def difficulty(self) -> np.ndarray:
+        return self._difficulty[:self._size]
+
+    @property
+    def last_review(self) -> np.ndarray:
+        return self._last_review[:self._size]
+
+    @property
+    def reviews(self) -> np.ndarray:
+        return self._reviews[:self._size]
+
+    def _rows(self, chunk_ids: Sequence[str]) -> np.ndarray:
+        new = [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in self._positions]
+        needed = self._size + len(new)
+        if needed > len(self._stability):
+            # Grow geometrically so answers on new chunks stay amortized O(1)
+            capacity = max(needed, 2 * len(self._stability), 64)
+            for name in ("_stability", "_difficulty", "_last_review", "_reviews"):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=old.dtype)
+                grown[:self._size] = old[:self._size]
+                setattr(self, name, grown)
+        for chunk_id in new:
+            self._positions[chunk_id] = self._size
+            self.chunk_ids.append(chunk_id)
+            self._size += 1
+        return np.fromiter((self._positions[chunk_id] for chunk_id in chunk_ids), dtype=np.int64, count=len(chunk_ids))
+
+    def _initial_difficulty(self, grades: np.ndarray) -> np.ndarray:
+        w = self.weights
+        return np.clip(w[4] - (grades - 3) * w[5], 1, 10)
+
+    def review(self, chunk_ids: Sequence[str], scores: Sequence[int], day) -> np.ndarray:
+        """
+        Applies graded answers given on day (a date, or one date per answer). scores are 1 for correct
+        and 0 for incorrect. Each chunk may appear at most once per call.
+        Returns the due date (datetime64[D]) of each reviewed chunk.
+        """
+        w = self.weights
+        grades = np.where(np.asarray(scores) > 0, GOOD, AGAIN)
+        days = np.broadcast_to(_day_number(day), grades.shape)
+        with self._lock:
+            rows = self._rows(chunk_ids)
+            if len(np.unique(rows)) != len(rows):
+                raise ValueError("A chunk can only be reviewed once per call")
+            first = self._reviews[rows] == 0
+            # New chunks have no state yet; placeholders keep the update below finite for them
+            stability = np.where(first, 1.0, self._stability[rows])
+            difficulty = np.where(first, 5.0, self._difficulty[rows])
+
+            elapsed = np.maximum(days - self._last_review[rows], 0)
+            r = retrievability(elapsed, stability)
+            correct = grades == GOOD
+            recalled = stability * (
+                np.exp(w[8]) * (11 - difficulty) * stability ** -w[9] * (np.exp(w[10] * (1 - r)) - 1) + 1
+            )
+            forgotten = w[11] * difficulty ** -w[12] * ((stability + 1) ** w[13] - 1) * np.exp(w[14] * (1 - r))
+            # Mean-revert difficulty towards that of a first 'good' answer
+            updated_difficulty = w[7] * self._initial_difficulty(GOOD) + (1 - w[7]) * (difficulty - w[6] * (grades - 3))
+
+            stability = np.where(first, w[grades - 1], np.where(correct, recalled, np.minimum(forgotten, stability)))
+            difficulty = np.where(first, self._initial_difficulty(grades), np.clip(updated_difficulty, 1, 10))
+
+            self._stability[rows] = np.maximum(stability, 0.01)
+            self._difficulty[rows] = difficulty
+            self._last_review[rows] = days
+            self._reviews[rows] += 1
+            return (days + next_interval(self._stability[rows])).astype("datetime64[D]")
+
+    def due_dates(self, chunk_ids: Optional[Sequence[str]] = None,
+                  desired_retention: float = DESIRED_RETENTION) -> np.ndarray:
+        """
+        Returns the due date (datetime64[D]) of the given chunks, or of every chunk in row order.
+        Unknown chunks raise KeyError.
+        """
+        with self._lock:
+            if chunk_ids is None:
+                rows = slice(0, self._size)
+            else:
+                rows = np.fromiter((self._positions[chunk_id] for chunk_id in chunk_ids), dtype=np.int64, count=len(chunk_ids))
+            days = self._last_review[rows] + next_interval(self._stability[rows], desired_retention)
+            return days.astype("datetime64[D]")
+
+    def due_date(self, chunk_id: str, desired_retention: float = DESIRED_RETENTION) -> date:
+        return self.due_dates([chunk_id], desired_retention)[0].item()
+
+    @classmethod
+    def from_history(cls, chunk_ids: Sequence[str], scores: Sequence[int], days: Sequence) -> "MemoryModel":
+        """
+        Builds a model by replaying graded answers, which must be in chronological order.
+        Answers are applied in rounds (every chunk's first answer, then every second answer, ...),
+        so the replay takes as many vectorized passes as the most-reviewed chunk has answers.
+        """
+        model = cls()
+        if len(chunk_ids) == 0:
+            return model
+        chunk_ids = np.asarray(chunk_ids, dtype=object)
+        scores = np.asarray(scores)
+        days = np.asarray(days, dtype="datetime64[D]")
+        # Rank of each answer among the answers for the same chunk
+        _, codes = np.unique(chunk_ids, return_inverse=True)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+        counts = np.diff(np.r_[starts, len(sorted_codes)])
+        ranks = np.empty(len(codes), dtype=np.int64)
+        ranks[order] = np.arange(len(codes)) - np.repeat(starts, counts)
+        for rank in range(int(ranks.max()) + 1):
+            batch = np.flatnonzero(ranks == rank)
+            model.review(chunk_ids[batch].tolist(), scores[batch], days[batch])
+        return model
+
+
+# Replayed models by user ID, as (model, memory generation) pairs (see backend/db/reviews.py)
+memory_models = TTLCache(max_items=1024, ttl=MEMORY_MODEL_CACHE_TTL)
@@ -0,0 +1,330 @@
+"""
+questions.py
+
+Quiz-question generation for quiz and review tasks.
+
+Opening a quiz used to wait on a chat completion. Questions are now generated ahead of time by
+QuestionPregenerator, in the background, for the chunks of upcoming quiz and review tasks, and
+stored with the chunk as a pool of several questions. Sessions only generate a question live when
+no pool exists yet. Several chunks are packed into each request, and the model answers with a
+JSON object holding the questions for each chunk. All completions go through the async
+LLMGateway (backend/core/llm.py).
+
+The scan for tomorrow's tasks runs as the periodic 'pregenerate_questions' job of the background
+workers (backend/worker.py), so it happens once however many API processes there are. Each API
+process only generates the pools that its own requests queue.
+
+QuestionPools keeps chunk text and question pools in an in-process LRU cache. Sessions rotate
+through a chunk's pool so repeat reviews see different questions, and a chunk whose pool has
+mostly been served is queued for a fresh pool. A session start for a cached chunk therefore
+needs neither a model call nor a database read.
+
+Configured through environment variables:
+
+    QUESTION_MODEL            chat model used for questions (default: LLM_MODEL)
+    QUESTION_BATCH_CHUNKS     chunks packed into one generation request (default: 10)
+    QUESTION_CHUNK_CHARS      characters of each chunk included in a batched request (default: 2000)
+    QUESTION_PREGEN_INTERVAL  seconds between scans for tomorrow's tasks (default: 21600)
+    QUESTION_POOL_SIZE        questions generated for each chunk (default: 5)
+    QUESTION_POOL_LOW         refill a pool when fewer unserved questions remain (default: 2)
+    CHUNK_CACHE_SIZE          chunks kept in the in-process cache (default: 4096)
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from .cache import LRUCache
+from .llm import LLM_MODEL, LLMGateway
+
+QUESTION_MODEL = os.getenv("QUESTION_MODEL", LLM_MODEL)
+QUESTION_BATCH_CHUNKS = int(os.getenv("QUESTION_BATCH_CHUNKS", 10))
+QUESTION_CHUNK_CHARS = int(os.getenv("QUESTION_CHUNK_CHARS", 2000))
+QUESTION_PREGEN_INTERVAL = float(os.getenv("QUESTION_PREGEN_INTERVAL", 6 * 3600))
+QUESTION_POOL_SIZE = int(os.getenv("QUESTION_POOL_SIZE", 5))
+QUESTION_POOL_LOW = int(os.getenv("QUESTION_POOL_LOW", 2))
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", 4096))
+
+SINGLE_PROMPT = ("You are a helpful study assistant. Generate a short quiz question based on the following "
+                 "study material. Make sure to generate a new, unique question each time.")
+BATCH_PROMPT = ("You are a helpful study assistant. For each numbered study passage, write {count} different "
+                "short quiz questions about that passage. Respond ONLY with a JSON object on a single line that "
+                "maps each passage number to a list of its questions, like this: "
+                "{{\"1\": [\"First question?\", \"Second question?\"], \"2\": [\"Another question?\"]}}.")
+
+
+def parse_json_object(text: str) -> Optional[dict]:
+    """
+    Parses a JSON object from a model response, also when it is wrapped in other text.
+    Returns None if there is no valid object.
+    """
+    try:
+        value = json.loads(text)
+    except ValueError:
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            return None
+        try:
+            value = json.loads(match.group(0))
+        except ValueError:
+            return None
+    return value if isinstance(value, dict) else None
+
+
+async def generate_question(llm: LLMGateway, chunk_text: str, task_type: str = "quiz") -> str:
+    """
+    Generates a single question for a chunk (the live path used when no question is stored).
+    """
+    return await llm.complete(
+        [
+            {"role": "system", "content": SINGLE_PROMPT},
+            {"role": "user", "content": chunk_text}
+        ],
+        model=QUESTION_MODEL,
+        max_tokens=60,
+        temperature=1.0 if task_type == "review" else 0.7
+    )
+
+
+async def generate_questions(llm: LLMGateway, chunks: Dict[str, str], batch_size: int = QUESTION_BATCH_CHUNKS,
+                             per_chunk: int = QUESTION_POOL_SIZE) -> Dict[str, List[str]]:
+    """
+    Generates up to per_chunk questions for each chunk, packing batch_size chunks into each request.
+    chunks maps chunk ID to text; the result maps chunk ID to its questions. Chunks the model
+    skipped, and batches whose request failed, are left out of the result.
+    """
+    questions = {}
+    items = list(chunks.items())
+    for start in range(0, len(items), max(1, batch_size)):
+        batch = items[start:start + batch_size]
+        passages = "\n\n".join(
+            f"Passage {number}:\n{text[:QUESTION_CHUNK_CHARS]}" for number, (_, text) in enumerate(batch, 1)
+        )
+        try:
+            content = await llm.complete(
+                [
+                    {"role": "system", "content": BATCH_PROMPT.format(count=per_chunk)},
+                    {"role": "user", "content": passages}
+                ],
+                model=QUESTION_MODEL,
+                # Pools take longer to write than one question, and nobody waits on them
+                timeout=3 * llm.timeout,
+                hedge=False,
+                max_tokens=60 * per_chunk * len(batch),
+                temperature=0.7
+            )
+        except Exception as e:
+            print(f"Error generating questions for {len(batch)} chunks: {e!r}")
+            continue
+        answer = parse_json_object(content) or {}
+        for number, (chunk_id, _) in enumerate(batch, 1):
+            value = answer.get(str(number))
+            if not isinstance(value, list):
+                value = [value]
+            pool = [q.strip() for q in value if isinstance(q, str) and q.strip()][:per_chunk]
+            if pool:
+                questions[chunk_id] = pool
+    return questions
+
+
+class QuestionPregenerator:
+    """
+    Background job that keeps questions stored for upcoming quiz and review tasks.
+
+    Every `interval` seconds it asks load_upcoming(day) for the chunks of the next day's tasks that
+    have no stored questions yet ({chunk ID: text}); with no interval it only scans when run_once()
+    is called. Chunks can also be queued directly with enqueue() when a task is scheduled or a pool
+    runs low. Pending chunks are generated in batches through the LLM gateway and their new pools
+    handed to store({chunk ID: [questions]}).
+    """
+
+    def __init__(self, llm: LLMGateway, load_upcoming: Callable[[str], Awaitable[Dict[str, str]]],
+                 store: Callable[[Dict[str, List[str]]], Awaitable[None]],
+                 interval: Optional[float] = QUESTION_PREGEN_INTERVAL, batch_size: int = QUESTION_BATCH_CHUNKS,
+                 pool_size: int = QUESTION_POOL_SIZE):
+        self.llm = llm
+        self.load_upcoming = load_upcoming
+        self.store = store
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pool_size = pool_size
+        self.pending: Dict[str, str] = {}
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def enqueue(self, chunk_id: str, chunk_text: str):
+        """
+        Queues a chunk for question generation on the next flush.
+        """
+        if chunk_text:
+            self.pending[chunk_id] = chunk_text
+            self._wake.set()
+
+    async def flush(self):
+        """
+        Generates and stores questions for every pending chunk.
+        """
+        while self.pending:
+            batch = dict(list(self.pending.items())[:self.batch_size])
+            for chunk_id in batch:
+                del self.pending[chunk_id]
+            questions = await generate_questions(self.llm, batch, self.batch_size, self.pool_size)
+            if questions:
+                await self.store(questions)
+
+    async def run_once(self, day: Optional[date] = None):
+        """
+        Queues the chunks of day's tasks (tomorrow by default) that have no questions, then flushes.
+        """
+        day = day or date.today() + timedelta(days=1)
+        self.pending.update(await self.load_upcoming(day.isoformat()))
+        await self.flush()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_scan = 0.0 if self.interval is not None else None
+        while True:
+            # Cleared before working, so chunks queued meanwhile wake the next round
+            self._wake.clear()
+            try:
+                if next_scan is not None and loop.time() >= next_scan:
+                    next_scan = loop.time() + self.interval
+                    await self.run_once()
+                else:
+                    await self.flush()
+            except Exception as e:
+                print(f"Error pre-generating questions: {e}")
+            try:
+                timeout = max(0.0, next_scan - loop.time()) if next_scan is not None else None
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def run_question_scan(job: dict, pregenerator: QuestionPregenerator) -> dict:
+    """
+    Handler for the periodic 'pregenerate_questions' job: stores questions for the chunks of
+    tomorrow's tasks (or of the payload's 'day') that have none yet.
+    """
+    day = job["payload"].get("day")
+    day = date.fromisoformat(day) if day else date.today() + timedelta(days=1)
+    await pregenerator.run_once(day)
+    return {"day": day.isoformat()}
+
+
+class QuestionPools:
+    """
+    In-process LRU cache of chunk text and question pools, in front of the database.
+
+    Entries are dicts with the chunk's 'user_id', 'text', 'embedding' and 'questions' pool, the rotation
+    'cursor', the number of questions 'served' since the pool was filled, and whether a refill
+    is pending. They are only touched from the event loop.
+
+    Attributes:
+        low (int): A pool is refilled once fewer than this many of its questions are unserved.
+    """
+
+    def __init__(self, max_items: int = CHUNK_CACHE_SIZE, low: int = QUESTION_POOL_LOW):
+        self.low = low
+        self.cache = LRUCache(max_items)
+
+    async def get(self, load: Callable[[str, str], Awaitable[Optional[dict]]], chunk_id: str,
+                  user_id: str) -> Optional[dict]:
+        """
+        Returns the cached entry for a user's chunk, loading it with load(chunk_id, user_id) on a miss.
+        Returns None if the chunk does not exist or belongs to another user.
+        """
+        entry = self.cache.get(chunk_id)
+        if entry is not None:
+            if entry["user_id"] == user_id:
+                return entry
+            # Another user's request for the chunk falls through to the database, which refuses it
+            chunk = await load(chunk_id, user_id)
+            return self._entry(user_id, chunk) if chunk is not None else None
+        chunk = await load(chunk_id, user_id)
+        if chunk is None:
+            return None
+        entry = self._entry(user_id, chunk)
+        self.cache.put(chunk_id, entry)
+        return entry
+
+    async def get_many(self, load_many: Callable[[List[str], str], Awaitable[Dict[str, dict]]],
+                       chunk_ids: List[str], user_id: str) -> Dict[str, dict]:
+        """
+        Returns the cached entries of several chunks of a user, loading all misses with a single
+        load_many(chunk_ids, user_id) call. Missing chunks and other users' chunks are left out.
+        """
+        entries = {}
+        missing = []
+        for chunk_id in dict.fromkeys(chunk_ids):
+            entry = self.cache.get(chunk_id)
+            if entry is not None and entry["user_id"] == user_id:
+                entries[chunk_id] = entry
+            else:
+                missing.append(chunk_id)
+        if missing:
+            for chunk_id, chunk in (await load_many(missing, user_id)).items():
+                entries[chunk_id] = self._entry(user_id, chunk)
+                # Leaves another user's cached entry for the same chunk in place
+                if chunk_id not in self.cache:
+                    self.cache.put(chunk_id, entries[chunk_id])
+        return entries
+
+    def _entry(self, user_id: str, chunk: dict) -> dict:
+        entry = {"user_id": user_id, "text": chunk["text"], "embedding": chunk.get("embedding"), "refilling": False}
+        self._fill(entry, chunk["questions"])
+        return entry
+
+    def _fill(self, entry: dict, questions: List[str]):
+        entry["questions"] = list(questions)
+        # Start at a random question, so a restarted process does not repeat the same opening question
+        entry["cursor"] = random.randrange(len(questions)) if questions else 0
+        entry["served"] = 0
+
+    def next_question(self, entry: dict) -> Optional[str]:
+        """
+        Returns the next question of the entry's pool in rotation, or None if the pool is empty.
+        """
+        questions = entry["questions"]
+        if not questions:
+            return None
+        question = questions[entry["cursor"] % len(questions)]
+        entry["cursor"] += 1
+        entry["served"] += 1
+        return question
+
+    def needs_refill(self, entry: dict) -> bool:
+        """
+        Whether the entry's pool is empty or mostly served and no refill is pending yet.
+        """
+        return not entry["refilling"] and len(entry["questions"]) - entry["served"] < self.low
+
+    def update(self, questions: Dict[str, List[str]]):
+        """
+        Replaces the pools of cached chunks with newly stored ones.
+        """
+        for chunk_id, pool in questions.items():
+            entry = self.cache.get(chunk_id)
+            if entry is not None:
+                self._fill(entry, pool)
+                entry["refilling"] = False
+
+
+question_pools = QuestionPools()
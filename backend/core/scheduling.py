@@ -1,7 +1,18 @@
+import os
+import threading
 from datetime import date, timedelta
-from collections import defaultdict
+from collections import Counter
 from typing import Any
 
+import numpy as np
+
+from .cache import TTLCache
+
+# Map intensity to minutes per day
+INTENSITY_MAP = {"light": 10, "medium": 45, "hard": 90}
+# Minutes a single task is expected to take
+ESTIMATED_MINUTES_PER_TASK = 5
+
 class UserPreferences:
     def __init__(self, study_days: list[int], intensity: str):
         """
@@ -15,54 +26,52 @@ class Scheduler:
     def __init__(self, user_id: str, preferences: UserPreferences):
         self.user_id = user_id
         self.preferences = preferences
-        intensity_mapping = {
-            "light": 10,
-            "medium": 45,
-            "hard": 90,
-        }
-        self.study_minutes_per_day = intensity_mapping[preferences.intensity]
+        self.study_minutes_per_day = INTENSITY_MAP[preferences.intensity]
 
-    def schedule_tasks(self, chunk_ids: list[str], start_date: date | None = None):
+    def daily_capacity(self, estimated_minutes: int = ESTIMATED_MINUTES_PER_TASK) -> int:
+        """
+        Number of tasks that fit on one study day. A day always fits at least one task.
         """
-        For each chunk, schedule a 'learn', then a 'quiz', then a 'review' task, spaced over days.
-        Returns a list of scheduled tasks (dicts) with chunk, date, and task_type.
+        return max(1, self.study_minutes_per_day // estimated_minutes)
+
+    def schedule_columns(self, n_chunks: int, start_date: date | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Assigns n_chunks learn tasks to study days, filling each day up to its capacity in chunk order.
+        Returns (dates, chunk_indices): the datetime64[D] date of each task and the index of the chunk
+        it covers, both in date order.
         """
         if not start_date:
             start_date = date.today()
+        chunk_indices = np.arange(n_chunks)
+        if n_chunks and not self.preferences.study_days:
+            raise ValueError("At least one study day is required")
+        weekmask = [day in self.preferences.study_days for day in range(7)]
+        # Chunk i goes on the (i // capacity)-th study day on or after start_date
+        offsets = chunk_indices // self.daily_capacity()
+        dates = np.busday_offset(np.datetime64(start_date, "D"), offsets, roll="forward", weekmask=weekmask)
+        return dates, chunk_indices
 
-        estimated_minutes_per_chunk = 5
-        daily_limit = self.study_minutes_per_day
-        schedule = []
-        day_pointer = 0
-        buffer = defaultdict(list)
-        task_sequence = ["learn"]
-        spacing = 1  # days between each task type for a chunk
-
-        for chunk_id in chunk_ids:
-            for i, task_type in enumerate(task_sequence):
-                while True:
-                    target_day = start_date + timedelta(days=day_pointer)
-                    weekday = target_day.weekday()
-                    used = len(buffer[target_day]) * estimated_minutes_per_chunk
-                    if weekday in self.preferences.study_days and used + estimated_minutes_per_chunk <= daily_limit:
-                        task = {
-                            "user_id": self.user_id,
-                            "chunk_id": chunk_id,
-                            "date": target_day,
-                            "task_type": task_type,
-                        }
-                        buffer[target_day].append(task)
-                        # Space out next task for this chunk
-                        day_pointer += spacing
-                        break
-                    else:
-                        day_pointer += 1
-
-        # Flatten into list
-        for day in sorted(buffer.keys()):
-            schedule.extend(buffer[day])
-
-        return schedule
+    def schedule_tasks(self, chunk_ids: list[str], start_date: date | None = None):
+        """
+        Schedules a 'learn' task for each chunk on the study days from start_date on, at most
+        daily_capacity() per day. Returns a list of scheduled tasks (dicts) with chunk, date, task_type
+        and estimated_minutes, in date order.
+        """
+        # Tasks are in chunk order, so the chunk index column is not needed here
+        dates, _ = self.schedule_columns(len(chunk_ids), start_date)
+        return [
+            {
+                "user_id": self.user_id,
+                "chunk_id": chunk_id,
+                "date": day,
+                "task_type": "learn",
+                "estimated_minutes": ESTIMATED_MINUTES_PER_TASK,
+            }
+            for chunk_id, day in zip(chunk_ids, dates.tolist())
+        ]
+
+    # Name used by the batch upload tests
+    schedule_learn_tasks = schedule_tasks
 
 def schedule_next_quiz(user_id: str, chunk_id: str, today: date | None = None) -> dict:
     """Schedule a quiz task for the next day after learn is completed."""
@@ -89,68 +98,245 @@ def schedule_next_review(user_id: str, chunk_id: str, quiz_correct: bool, today:
         "completed": False
     }
 
-def schedule_followup_review(user_id: str, chunk_id: str, review_correct: bool, today: date | None = None) -> dict | None:
-    """Schedule another review only if the last review was incorrect."""
-    if not today:
-        today = date.today()
-    if not review_correct:
-        return {
-            "user_id": user_id,
-            "chunk_id": chunk_id,
-            "scheduled_date": (today + timedelta(days=1)).isoformat(),
-            "task_type": "review",
-            "completed": False
-        }
-    return None
+# Used for users who have not saved any preferences
+DEFAULT_PREFERENCES = {"study_days": [1,2,3,4,5], "intensity": "medium"}
+
+# Preferences are read on every quiz submission but change rarely, so rows are cached for
+# PREFERENCES_CACHE_TTL seconds and written through by set_user_preferences
+PREFERENCES_CACHE_TTL = float(os.getenv("PREFERENCES_CACHE_TTL", 600))
+preferences_cache = TTLCache(max_items=4096, ttl=PREFERENCES_CACHE_TTL)
+
+def load_user_preferences(user_id: str, supabase) -> dict | None:
+    """
+    Returns the user's stored preferences row, or None if they have not saved any.
+    Served from preferences_cache when possible; a missing row is cached too.
+    """
+    row = preferences_cache.get(user_id)
+    if row is None:
+        result = supabase.table("user_preferences").select("study_days, intensity").eq("user_id", user_id).single().execute()
+        row = result.data if hasattr(result, "data") and result.data else {}
+        preferences_cache.put(user_id, row)
+    # Copy so callers cannot change the cached row
+    return dict(row) if row else None
+
+def cache_user_preferences(user_id: str, study_days: list, intensity: str):
+    """
+    Writes freshly saved preferences through to the cache. A change of intensity or study days
+    also changes daily capacity, so the user's capacity calendar is dropped.
+    """
+    preferences_cache.put(user_id, {"study_days": list(study_days), "intensity": intensity})
+    invalidate_capacity(user_id)
+
+def invalidate_user_preferences(user_id: str):
+    preferences_cache.pop(user_id)
 
 def get_user_preferences_from_db(user_id: str, supabase) -> dict:
-    result = supabase.table("user_preferences").select("study_days, intensity").eq("user_id", user_id).single().execute()
-    if hasattr(result, "data") and result.data:
-        return result.data
-    return {"study_days": [1,2,3,4,5], "intensity": "medium"}
+    prefs = load_user_preferences(user_id, supabase)
+    if prefs:
+        return prefs
+    return {"study_days": list(DEFAULT_PREFERENCES["study_days"]), "intensity": DEFAULT_PREFERENCES["intensity"]}
 
-# Map intensity to minutes per day
-INTENSITY_MAP = {"light": 10, "medium": 45, "hard": 90}
+# Days of tasks loaded per calendar query, and how long a user's calendar is trusted
+CAPACITY_HORIZON_DAYS = int(os.getenv("CAPACITY_HORIZON_DAYS", 60))
+CAPACITY_CACHE_TTL = float(os.getenv("CAPACITY_CACHE_TTL", 300))
+# PostgREST returns at most this many rows per request
+PAGE_SIZE = 1000
 
-# Utility: Find next available slot for a user/chunk
-# Returns the date (as a date object) for the next available slot
-# and a list of tasks that need to be shifted
+class CapacityCalendar:
+    """
+    Number of tasks a user has on each day of a loaded date window [start, end).
+    The window is filled with one range query and extended as lookups move past its end,
+    so finding free capacity never needs a query per day.
+    """
 
-def find_next_available_slot(user_id: str, supabase, start_date: date, estimated_minutes: int = 5) -> date:
-    prefs = get_user_preferences_from_db(user_id, supabase)
-    study_days = prefs["study_days"]
-    intensity = prefs["intensity"]
-    daily_limit = INTENSITY_MAP.get(intensity, 45)
-    day_pointer = 0
-    while True:
-        target_day = start_date + timedelta(days=day_pointer)
-        weekday = target_day.weekday()
-        if weekday not in study_days:
-            day_pointer += 1
-            continue
-        # Count tasks already scheduled for this day
-        result = supabase.table("tasks").select("id").eq("user_id", user_id).eq("scheduled_date", target_day.isoformat()).execute()
-        num_tasks = len(result.data) if hasattr(result, "data") and result.data else 0
-        used = num_tasks * estimated_minutes
-        if used + estimated_minutes <= daily_limit:
-            return target_day
-        day_pointer += 1
-
-# Utility: Shift all tasks scheduled after a given date forward by one day, respecting study days
-
-def shift_tasks_forward(user_id: str, supabase, from_date: date):
-    prefs = get_user_preferences_from_db(user_id, supabase)
-    study_days = prefs["study_days"]
-    # Get all tasks after from_date, ordered by date
-    result = supabase.table("tasks").select("id, scheduled_date").eq("user_id", user_id).gt("scheduled_date", from_date.isoformat()).order("scheduled_date").execute()
-    tasks = result.data if hasattr(result, "data") and result.data else []
-    for task in tasks:
-        old_date = date.fromisoformat(task["scheduled_date"])
-        # Find next valid study day
-        day_pointer = 1
+    def __init__(self, user_id: str, generation: int = 0):
+        self.user_id = user_id
+        # Value of the user's shared 'capacity:<user_id>' counter the calendar was created at
+        self.generation = generation
+        self.counts = Counter()
+        self.start = None
+        self.end = None
+        self._lock = threading.Lock()
+
+    def _load_range(self, supabase, start: date, end: date):
+        offset = 0
         while True:
-            new_date = old_date + timedelta(days=day_pointer)
-            if new_date.weekday() in study_days:
+            result = supabase.table("tasks").select("scheduled_date").eq("user_id", self.user_id).gte(
+                "scheduled_date", start.isoformat()).lt("scheduled_date", end.isoformat()).order(
+                "scheduled_date").range(offset, offset + PAGE_SIZE - 1).execute()
+            rows = result.data if hasattr(result, "data") and result.data else []
+            for row in rows:
+                self.counts[date.fromisoformat(row["scheduled_date"])] += 1
+            if len(rows) < PAGE_SIZE:
                 break
-            day_pointer += 1
-        supabase.table("tasks").update({"scheduled_date": new_date.isoformat()}).eq("id", task["id"]).execute()
\ No newline at end of file
+            offset += PAGE_SIZE
+
+    def ensure_loaded(self, supabase, start: date, end: date):
+        """
+        Makes sure the counts cover [start, end), loading only the missing part.
+        """
+        if self.start is None or start < self.start:
+            self.counts = Counter()
+            end = max(end, self.end or end)
+            self._load_range(supabase, start, end)
+            self.start, self.end = start, end
+        elif end > self.end:
+            self._load_range(supabase, self.end, end)
+            self.end = end
+
+    def count(self, supabase, day: date) -> int:
+        """
+        Returns the number of tasks on day, loading the window around it if needed.
+        """
+        with self._lock:
+            if self.start is None or day < self.start or day >= self.end:
+                self.ensure_loaded(supabase, min(day, self.start or day), day + timedelta(days=CAPACITY_HORIZON_DAYS))
+            return self.counts[day]
+
+    def record(self, day: date, n: int = 1):
+        """
+        Records n tasks written to day (negative n for removed tasks).
+        """
+        with self._lock:
+            if self.start is not None and self.start <= day < self.end:
+                self.counts[day] += n
+
+    def move(self, old_day: date, new_day: date):
+        self.record(old_day, -1)
+        self.record(new_day, 1)
+
+_calendars = TTLCache(max_items=1024, ttl=CAPACITY_CACHE_TTL)
+# Shared change counters (a backend.core.generations.Generations), set by backend.db.schedule so a
+# calendar invalidated in one process, e.g. by a worker storing a schedule, is dropped in all of them
+capacity_generations = None
+
+def _capacity_generation(user_id: str) -> int:
+    return capacity_generations.get(f"capacity:{user_id}") if capacity_generations is not None else 0
+
+def get_capacity_calendar(user_id: str) -> CapacityCalendar:
+    """
+    Returns the cached capacity calendar for a user, creating an empty one if needed or if
+    another process has invalidated it.
+    """
+    generation = _capacity_generation(user_id)
+    calendar = _calendars.get(user_id)
+    if calendar is None or calendar.generation != generation:
+        calendar = CapacityCalendar(user_id, generation)
+        _calendars.put(user_id, calendar)
+    return calendar
+
+def invalidate_capacity(user_id: str):
+    """
+    Drops the user's cached calendar in every process, e.g. after bulk schedule writes.
+    """
+    _calendars.pop(user_id)
+    if capacity_generations is not None:
+        capacity_generations.bump(f"capacity:{user_id}")
+
+def next_study_day(day: date, study_days: list[int]) -> date:
+    """
+    Returns the first study day strictly after day.
+    """
+    for offset in range(1, 8):
+        candidate = day + timedelta(days=offset)
+        if candidate.weekday() in study_days:
+            return candidate
+    raise ValueError("study_days must contain at least one weekday (0-6)")
+
+# Utility: Place a follow-up task on its target day, making room by moving as little as possible.
+# Follow-ups (quizzes and reviews) are time-sensitive and learn tasks are not, so when the target
+# day is full a single learn task moves from it to the nearest study day with spare capacity,
+# instead of every later task shifting by a day. Placing a batch of tasks computes every move in
+# memory and writes them with two bulk upserts.
+
+def plan_placements(placements: list[tuple[dict, date]], prefs: dict, count, learn_tasks) -> tuple[list[date], dict, Counter]:
+    """
+    Decides where each task of placements, a list of (task, target_date), goes, in order, and sets
+    its scheduled_date. Tasks with an 'id' are stored rows being rescheduled and leave their current
+    day. count(day) returns the number of tasks already stored on day and learn_tasks(day) that
+    day's open learn task rows, in the order they make way.
+    Returns (days, moved, added): the day of each task, the moved learn rows by ID (with their new
+    scheduled_date), and the net number of tasks this pass adds to each day.
+    """
+    study_days = prefs["study_days"]
+    daily_limit = INTENSITY_MAP.get(prefs["intensity"], 45)
+    capacity = max(1, daily_limit // ESTIMATED_MINUTES_PER_TASK)
+    # Tasks this pass adds to (or moves off, if negative) each day, on top of count()
+    added = Counter()
+    learn = {}
+    moved = {}
+    for task, _ in placements:
+        if task.get("id") and task.get("scheduled_date"):
+            added[date.fromisoformat(task["scheduled_date"])] -= 1
+
+    def total(day: date) -> int:
+        return count(day) + added[day]
+
+    def movable(day: date) -> list:
+        if day not in learn:
+            learn[day] = [row for row in learn_tasks(day) if row["id"] not in moved]
+        return learn[day]
+
+    days = []
+    for task, target_date in placements:
+        day = target_date
+        if study_days:
+            if day.weekday() not in study_days:
+                day = next_study_day(day, study_days)
+            while total(day) >= capacity:
+                rows = movable(day)
+                if rows:
+                    row = rows.pop(0)
+                    free = next_study_day(day, study_days)
+                    while total(free) >= capacity:
+                        free = next_study_day(free, study_days)
+                    moved[row["id"]] = {**row, "scheduled_date": free.isoformat()}
+                    added[day] -= 1
+                    added[free] += 1
+                    break
+                # Nothing on this day can give way, so the task itself goes to the next study day
+                day = next_study_day(day, study_days)
+        task["scheduled_date"] = day.isoformat()
+        added[day] += 1
+        days.append(day)
+    return days, moved, added
+
+def place_tasks(user_id: str, supabase, placements: list[tuple[dict, date]]) -> list[date]:
+    """
+    Stores each task of placements, a list of (task, target_date), on the first study day on or
+    after its target date, in order. Returns the day each task was stored on.
+    """
+    prefs = get_user_preferences_from_db(user_id, supabase)
+    calendar = get_capacity_calendar(user_id)
+
+    def learn_tasks(day: date) -> list:
+        # Whole rows, so the upsert below rewrites them without touching any other column
+        result = supabase.table("tasks").select("*").eq("user_id", user_id).eq(
+            "scheduled_date", day.isoformat()).eq("task_type", "learn").eq("completed", False).order(
+            "id", desc=True).execute()
+        return result.data if hasattr(result, "data") and result.data else []
+
+    days, moved, added = plan_placements(placements, prefs, lambda day: calendar.count(supabase, day), learn_tasks)
+    if moved:
+        supabase.table("tasks").upsert(list(moved.values())).execute()
+    if placements:
+        supabase.table("tasks").upsert([task for task, _ in placements]).execute()
+    if (moved or placements) and capacity_generations is not None:
+        # Other processes recount the user's days; this calendar stays in step by recording the
+        # writes, unless another process changed the schedule since it was loaded
+        generation = capacity_generations.bump(f"capacity:{user_id}")
+        if calendar.generation != generation - 1:
+            _calendars.pop(user_id)
+            return days
+        calendar.generation = generation
+    for day, n in added.items():
+        if n:
+            calendar.record(day, n)
+    return days
+
+def place_task(user_id: str, supabase, task: dict, target_date: date) -> date:
+    """
+    Stores task on the first study day on or after target_date and returns that day.
+    At most two rows are written.
+    """
+    return place_tasks(user_id, supabase, [(task, target_date)])[0]
@@ -0,0 +1,157 @@
+"""
+uploads.py
+
+Upload batches as background jobs.
+
+/upload-batch spools the PDFs to the queue's spool directory and enqueues an 'upload_batch' job; a worker
+(backend/worker.py) then runs run_upload_batch, which takes the batch through the same stages the
+request used to: storage, extraction, embedding and chunk insert for every PDF, near-duplicate
+collapsing, and scheduling. Each finished stage is checkpointed, per PDF for ingestion, so a job
+that is retried after a failure or a crashed worker skips the PDFs it already stored. The queue
+removes the spool directory once the job is done or has failed for good.
+"""
+
+import asyncio
+import os
+import shutil
+import uuid
+from typing import List, Optional
+
+import numpy as np
+
+from .dedup import collapse_near_duplicates
+from .ingestion import BatchPipeline, IngestionExecutor
+from .jobs import JobQueue
+from .scheduling import Scheduler, UserPreferences
+
+
+class SpooledUpload:
+    """
+    A spooled PDF in the form BatchPipeline expects from an upload.
+    """
+
+    def __init__(self, path: str, filename: str, size: int, document_id: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.document_id = document_id
+
+    async def read(self) -> bytes:
+        def read_file():
+            with open(self.path, "rb") as f:
+                return f.read()
+        return await asyncio.to_thread(read_file)
+
+
+def _copy_to(path: str, source) -> int:
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f)
+        return f.tell()
+
+
+async def spool_uploads(queue: JobQueue, job_id: str, uploads: List) -> List[dict]:
+    """
+    Copies uploaded PDFs (FastAPI UploadFiles) into the job's directory under the queue's spool
+    directory. Returns the file descriptions stored in the job payload.
+    """
+    directory = os.path.join(queue.spool_dir, job_id)
+    await asyncio.to_thread(os.makedirs, directory, exist_ok=True)
+    files = []
+    for i, upload in enumerate(uploads):
+        path = os.path.join(directory, f"{i}.pdf")
+        await upload.seek(0)
+        size = await asyncio.to_thread(_copy_to, path, upload.file)
+        files.append({
+            "path": path,
+            "filename": upload.filename,
+            "size": size,
+            # Fixed per file, so a retried attempt overwrites what an earlier one stored
+            "document_id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{job_id}/{i}")),
+        })
+    return files
+
+
+async def run_upload_batch(job: dict, queue: JobQueue, db, executor: Optional[IngestionExecutor] = None) -> dict:
+    """
+    Runs an 'upload_batch' job against db (a backend.db.access.Database or compatible object)
+    and returns the same summary /upload-batch used to return.
+    """
+    job_id = job["id"]
+    user_id = job["user_id"]
+    payload = job["payload"]
+    class_id = payload["class_id"]
+    files = payload["files"]
+    done = await asyncio.to_thread(queue.checkpoints, job_id)
+
+    results = {}
+    for i, spooled in enumerate(files):
+        checkpoint = done.get(f"pdf:{i}")
+        if checkpoint is not None:
+            results[i] = (checkpoint["chunk_ids"], np.load(checkpoint["embeddings"]))
+
+    async def report(stage: str):
+        await asyncio.to_thread(queue.set_progress, job_id,
+                                {"stage": stage, "pdfs_done": len(results), "pdfs_total": len(files)})
+
+    remaining = [i for i in range(len(files)) if i not in results]
+    if remaining:
+        await report("ingesting")
+
+        async def store_file(document_id, pdf_bytes, file_name, digest):
+            return await db.store_file(user_id, class_id, document_id, pdf_bytes, file_name, digest)
+
+        async def store_chunks(chunks, embeddings, document_id):
+            return await db.store_chunks(chunks, embeddings, user_id=user_id, document_id=document_id, class_id=class_id)
+
+        async def reuse_document(document_id, file_name, digest):
+            return await db.reuse_document(user_id, class_id, document_id, file_name, digest)
+
+        async def checkpoint(index, chunk_ids, embeddings):
+            i = remaining[index]
+            embeddings_path = os.path.join(os.path.dirname(files[i]["path"]), f"{i}.npy")
+            await asyncio.to_thread(np.save, embeddings_path, np.asarray(embeddings, dtype=np.float32))
+            await asyncio.to_thread(queue.save_checkpoint, job_id, f"pdf:{i}",
+                                    {"chunk_ids": list(chunk_ids), "embeddings": embeddings_path})
+            results[i] = (list(chunk_ids), embeddings)
+            await report("ingesting")
+
+        pipeline = BatchPipeline(store_file=store_file, store_chunks=store_chunks, reuse_document=reuse_document,
+                                 executor=executor)
+        await pipeline.run([
+            SpooledUpload(files[i]["path"], files[i]["filename"], files[i]["size"], files[i]["document_id"])
+            for i in remaining
+        ], on_result=checkpoint)
+
+    all_chunk_ids = []
+    all_embeddings = []
+    for i in range(len(files)):
+        chunk_ids, embeddings = results[i]
+        all_chunk_ids.extend(chunk_ids)
+        if len(chunk_ids):
+            all_embeddings.append(np.asarray(embeddings, dtype=np.float32))
+
+    clusters = done.get("clusters")
+    if clusters is None:
+        await report("deduplicating")
+        # Overlapping slides, notes and readings become one task per cluster of near-duplicates
+        clusters = {chunk_id: [] for chunk_id in all_chunk_ids}
+        if all_embeddings and len({e.shape[1] for e in all_embeddings}) == 1:
+            clusters = collapse_near_duplicates(all_chunk_ids, np.concatenate(all_embeddings))
+            await db.link_duplicate_chunks(clusters, user_id)
+        await asyncio.to_thread(queue.save_checkpoint, job_id, "clusters", clusters)
+
+    if "scheduled" not in done:
+        await report("scheduling")
+        preferences = UserPreferences(study_days=payload["study_days"], intensity=payload["intensity"])
+        scheduler = Scheduler(user_id=user_id, preferences=preferences)
+        # Create schedule for all chunks combined
+        await db.store_schedule(scheduler.schedule_tasks(list(clusters.keys())), user_id)
+        await asyncio.to_thread(queue.save_checkpoint, job_id, "scheduled", True)
+
+    # The spooled files and checkpointed embeddings stay until the queue has marked the job done
+    await report("done")
+    return {
+        "total_chunks": len(all_chunk_ids),
+        "scheduled_chunks": len(clusters),
+        "total_pdfs": len(files),
+    }
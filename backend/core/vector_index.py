@@ -0,0 +1,264 @@
+"""
+vector_index.py
+
+In-process vector indexes over a user's chunk embeddings, used by semantic search.
+
+Each user gets a VectorIndex holding their normalized embeddings in one contiguous float32 matrix.
+Small indexes are searched by brute force (one matrix-vector product); once an index grows past
+IVF_MIN_ROWS it also builds an inverted-file (IVF) partition with k-means and only scans the
+nprobe lists closest to the query. Indexes are loaded lazily from the database on first search,
+kept in a bounded LRU registry, and updated in place when new chunks are stored. Chunks stored
+by another process (e.g. an upload worker) are picked up through a shared per-user generation
+counter (backend/core/generations.py): a stale index is reloaded on its next search.
+
+Configured through environment variables:
+
+    VECTOR_INDEX_MAX_USERS  number of user indexes kept in memory (default: 256)
+    IVF_MIN_ROWS            rows at which an index switches to IVF search (default: 20000)
+    IVF_NPROBE              IVF lists scanned per query (default: 8)
+"""
+
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .cache import LRUCache
+
+VECTOR_INDEX_MAX_USERS = int(os.getenv("VECTOR_INDEX_MAX_USERS", 256))
+IVF_MIN_ROWS = int(os.getenv("IVF_MIN_ROWS", 20000))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means on normalized vectors. Returns the (n_clusters, dim) normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        # Re-seed empty clusters with random points so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over one user's chunks.
+
+    Attributes:
+        dim (int): Embedding dimension, fixed by the first vectors added.
+        ids (list): Chunk ID of each row.
+        class_ids (list): Class ID of each row (None when unknown).
+    """
+
+    def __init__(self, ivf_min_rows: int = IVF_MIN_ROWS, nprobe: int = IVF_NPROBE):
+        self.dim = None
+        self.ids: List[str] = []
+        self.class_ids: List[Optional[str]] = []
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        # Integer code of each row's class, so class filters are a vectorized comparison
+        self._class_codes = np.empty(0, dtype=np.int32)
+        self._codes: Dict[Optional[str], int] = {None: -1}
+        self._size = 0
+        self._positions: Dict[str, int] = {}
+        self._centroids = None
+        self._lists: List[np.ndarray] = []
+        self._trained_size = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray, class_ids: Optional[Sequence[Optional[str]]] = None):
+        """
+        Adds (or replaces) rows for the given chunk IDs.
+        """
+        if len(ids) == 0:
+            return
+        vectors = _normalize(vectors)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one vector per chunk ID")
+        class_ids = list(class_ids) if class_ids is not None else [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._matrix = np.empty((0, self.dim), dtype=np.float32)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            new_rows = []
+            for i, chunk_id in enumerate(ids):
+                position = self._positions.get(chunk_id)
+                if position is not None:
+                    self._matrix[position] = vectors[i]
+                    self.class_ids[position] = class_ids[i]
+                    self._class_codes[position] = self._code(class_ids[i])
+                else:
+                    new_rows.append(i)
+            if not new_rows:
+                return
+
+            needed = self._size + len(new_rows)
+            if needed > len(self._matrix):
+                # Grow geometrically so repeated small adds stay amortized O(1) per row
+                grown = np.empty((max(needed, 2 * len(self._matrix), 64), self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+                codes = np.empty(len(grown), dtype=np.int32)
+                codes[:self._size] = self._class_codes[:self._size]
+                self._class_codes = codes
+            start = self._size
+            self._matrix[start:needed] = vectors[new_rows]
+            for offset, i in enumerate(new_rows):
+                self._positions[ids[i]] = start + offset
+                self._class_codes[start + offset] = self._code(class_ids[i])
+                self.ids.append(ids[i])
+                self.class_ids.append(class_ids[i])
+            self._size = needed
+
+            if self._size >= self.ivf_min_rows and (self._centroids is None or self._size >= 2 * self._trained_size):
+                self._train()
+            elif self._centroids is not None:
+                self._assign(np.arange(start, needed))
+
+    def _code(self, class_id: Optional[str]) -> int:
+        code = self._codes.get(class_id)
+        if code is None:
+            code = self._codes[class_id] = len(self._codes) - 1
+        return code
+
+    def _train(self):
+        vectors = self._matrix[:self._size]
+        n_lists = max(1, int(np.sqrt(self._size)))
+        sample = vectors
+        if len(vectors) > 50 * n_lists:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), size=50 * n_lists, replace=False)]
+        self._centroids = kmeans(sample, n_lists)
+        self._trained_size = self._size
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._assign(np.arange(self._size))
+
+    def _assign(self, rows: np.ndarray):
+        assignment = np.argmax(self._matrix[rows] @ self._centroids.T, axis=1)
+        for lst in np.unique(assignment):
+            self._lists[lst] = np.concatenate([self._lists[lst], rows[assignment == lst]])
+
+    def search(self, query: np.ndarray, k: int = 10, class_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (chunk ID, cosine similarity) pairs, best first, optionally restricted to a class.
+        """
+        with self._lock:
+            if self._size == 0:
+                return []
+            query = _normalize(query).reshape(-1)
+            if query.shape[0] != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimensional query, got {query.shape[0]}")
+
+            code = None
+            if class_id is not None:
+                code = self._codes.get(class_id)
+                if code is None:
+                    return []
+
+            if self._centroids is not None:
+                probe = np.argsort(self._centroids @ query)[::-1][:self.nprobe]
+                rows = np.concatenate([self._lists[p] for p in probe])
+                if code is not None:
+                    rows = rows[self._class_codes[rows] == code]
+                scores = self._matrix[rows] @ query
+            else:
+                # Brute force over the contiguous matrix, without copying it
+                rows = np.arange(self._size)
+                scores = self._matrix[:self._size] @ query
+                if code is not None:
+                    keep = self._class_codes[:self._size] == code
+                    rows, scores = rows[keep], scores[keep]
+            if len(rows) == 0:
+                return []
+
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+
+class VectorIndexRegistry:
+    """
+    Bounded LRU of per-user indexes, loaded lazily with loader(user_id) -> (ids, vectors, class_ids).
+    With generations set (a backend.core.generations.Generations), each index remembers the user's
+    'chunks:<user_id>' counter it was loaded at and is reloaded once another process has moved it.
+    """
+
+    def __init__(self, loader: Optional[Callable] = None, max_users: int = VECTOR_INDEX_MAX_USERS,
+                 generations=None):
+        self.loader = loader
+        self.generations = generations
+        # user ID -> (index, generation it is current for)
+        self._indexes = LRUCache(max_users)
+        self._lock = threading.Lock()
+
+    def _generation(self, user_id: str) -> int:
+        return self.generations.get(f"chunks:{user_id}") if self.generations is not None else 0
+
+    def get(self, user_id: str) -> VectorIndex:
+        """
+        Returns the user's index, loading it from the database on first use or once it is stale.
+        """
+        generation = self._generation(user_id)
+        entry = self._indexes.get(user_id)
+        if entry is not None and entry[1] == generation:
+            return entry[0]
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is None or entry[1] != generation:
+                index = VectorIndex()
+                if self.loader is not None:
+                    ids, vectors, class_ids = self.loader(user_id)
+                    index.add(ids, vectors, class_ids)
+                entry = (index, generation)
+                self._indexes.put(user_id, entry)
+        return entry[0]
+
+    def add(self, user_id: str, ids: Sequence[str], vectors: np.ndarray, class_id: Optional[str] = None):
+        """
+        Adds newly stored chunks to the user's index if it is loaded, and tells other processes their
+        copy is stale. Unloaded indexes will pick the chunks up from the database when they are
+        first searched.
+        """
+        if not len(ids):
+            return
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if self.generations is None:
+                if entry is not None:
+                    entry[0].add(ids, vectors, [class_id] * len(ids))
+                return
+            generation = self.generations.bump(f"chunks:{user_id}")
+            if entry is None:
+                return
+            if entry[1] == generation - 1:
+                entry[0].add(ids, vectors, [class_id] * len(ids))
+                self._indexes.put(user_id, (entry[0], generation))
+            else:
+                # Another process changed the user's chunks too; reload on the next search
+                self._indexes.pop(user_id)
+
+    def evict(self, user_id: str):
+        self._indexes.pop(user_id)
+
+
+user_indexes = VectorIndexRegistry()
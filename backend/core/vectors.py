@@ -0,0 +1,29 @@
+"""
+vectors.py
+
+Compact encoding of embedding vectors for storage in pgvector columns.
+"""
+
+import numpy as np
+
+
+def to_pgvector(vector):
+    """
+    Encodes an embedding as a pgvector text literal, e.g. '[0.1,-0.25]'. float32 vectors are written
+    with 9 significant digits (enough to round-trip float32) and float16 vectors with 5, which is far
+    smaller than the JSON encoding of the boxed Python floats.
+    """
+    if vector is None:
+        return None
+    vector = np.asarray(vector)
+    fmt = "{:.5g}" if vector.dtype == np.float16 else "{:.9g}"
+    return "[" + ",".join(map(fmt.format, vector.tolist())) + "]"
+
+
+def parse_pgvector(value, dtype=np.float32):
+    """
+    Decodes a pgvector value returned by PostgREST ('[x,y,...]' string or list) into a numpy vector.
+    """
+    if isinstance(value, str):
+        return np.fromstring(value.strip("[]"), dtype=dtype, sep=",")
+    return np.asarray(value, dtype=dtype)
@@ -0,0 +1,160 @@
+"""
+access.py
+
+Async data access for the API handlers.
+
+The Supabase client is synchronous, so calling it from an async handler blocks the event loop for
+the whole round trip and a worker serves one request at a time. Database exposes the backend/db
+operations as coroutines that run on a bounded thread pool, sized like the client's HTTP
+connection pool (DB_POOL_SIZE), so many requests' database calls are in flight at once over
+kept-alive connections.
+
+Handlers receive the instance through the get_database dependency; tests override it with
+backend.db.memory.InMemoryDatabase, which has the same interface.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import backend.db.chunks
+import backend.db.classes
+import backend.db.preferences
+import backend.db.reviews
+import backend.db.schedule
+from backend.core.vector_index import VectorIndex, user_indexes
+from backend.db.database import DB_POOL_SIZE
+
+
+class Database:
+    """
+    Awaitable wrappers around the backend/db modules.
+
+    Attributes:
+        workers (int): Maximum number of database calls running at once.
+    """
+
+    def __init__(self, workers: int = DB_POOL_SIZE):
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="db")
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Runs a blocking call on the database pool and returns its result.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._pool, partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    # Classes
+
+    async def get_user_classes(self, user_id: str) -> List[Dict]:
+        return await self.run(backend.db.classes.get_user_classes, user_id)
+
+    async def get_class_by_id(self, class_id: str, user_id: str) -> Optional[Dict]:
+        return await self.run(backend.db.classes.get_class_by_id, class_id, user_id)
+
+    async def create_class(self, user_id: str, name: str) -> Optional[Dict]:
+        return await self.run(backend.db.classes.create_class, user_id, name)
+
+    async def delete_class(self, class_id: str, user_id: str) -> bool:
+        return await self.run(backend.db.classes.delete_class, class_id, user_id)
+
+    # Documents and chunks
+
+    async def store_file(self, user_id, class_id, document_id, pdf_bytes, file_name, content_hash=None):
+        return await self.run(backend.db.chunks.store_file, user_id, class_id, document_id, pdf_bytes, file_name, content_hash)
+
+    async def reuse_document(self, user_id, class_id, document_id, file_name, content_hash):
+        return await self.run(backend.db.chunks.reuse_document, user_id, class_id, document_id, file_name, content_hash)
+
+    async def store_chunks(self, chunks: List[str], embeddings: np.ndarray, user_id, document_id, class_id=None) -> List[str]:
+        return await self.run(backend.db.chunks.store_chunks, chunks, embeddings, user_id, document_id, class_id)
+
+    async def get_chunk_text(self, chunk_id: str, user_id: str) -> Optional[str]:
+        return await self.run(backend.db.chunks.get_chunk_text, chunk_id, user_id)
+
+    async def get_chunk(self, chunk_id: str, user_id: str) -> Optional[Dict]:
+        return await self.run(backend.db.chunks.get_chunk, chunk_id, user_id)
+
+    async def get_chunks(self, chunk_ids: List[str], user_id: str) -> Dict[str, Dict]:
+        return await self.run(backend.db.chunks.get_chunks, chunk_ids, user_id)
+
+    async def set_chunk_questions(self, questions: Dict[str, List[str]]):
+        return await self.run(backend.db.chunks.set_chunk_questions, questions)
+
+    async def get_chunks_needing_questions(self, day: str) -> Dict[str, str]:
+        return await self.run(backend.db.chunks.get_chunks_needing_questions, day)
+
+    async def get_chunk_texts(self, chunk_ids: List[str], user_id: str) -> Dict[str, str]:
+        return await self.run(backend.db.chunks.get_chunk_texts, chunk_ids, user_id)
+
+    async def link_duplicate_chunks(self, clusters: Dict[str, List[str]], user_id: str):
+        return await self.run(backend.db.chunks.link_duplicate_chunks, clusters, user_id)
+
+    async def get_search_index(self, user_id: str) -> VectorIndex:
+        # The first call loads the user's embeddings from the database; later ones are in memory
+        return await self.run(user_indexes.get, user_id)
+
+    # Tasks and reviews
+
+    async def store_schedule(self, schedule: List[dict], user_id: str):
+        return await self.run(backend.db.schedule.store_schedule, schedule, user_id)
+
+    async def schedule_task(self, task: dict, user_id: str, from_date: date) -> date:
+        return await self.run(backend.db.schedule.schedule_task, task, user_id, from_date)
+
+    async def schedule_tasks(self, placements: List[Tuple[dict, date]], user_id: str) -> List[date]:
+        return await self.run(backend.db.schedule.schedule_tasks, placements, user_id)
+
+    async def reschedule_reviews(self, user_id: str, today: date) -> int:
+        return await self.run(backend.db.schedule.reschedule_reviews, user_id, today)
+
+    async def get_tasks(self, user_id: str, start: str, end: str) -> List[Dict]:
+        return await self.run(backend.db.schedule.get_tasks, user_id, start, end)
+
+    async def get_todays_reviews(self, user_id: str, today: str) -> List[Dict]:
+        return await self.run(backend.db.reviews.get_todays_reviews, user_id, today)
+
+    async def complete_task(self, user_id: str, chunk_id: str, task_type: str):
+        return await self.run(backend.db.reviews.complete_task, user_id, chunk_id, task_type)
+
+    async def complete_tasks(self, user_id: str, tasks: List[Tuple[str, str]]):
+        return await self.run(backend.db.reviews.complete_tasks, user_id, tasks)
+
+    async def review_chunks(self, user_id: str, chunk_ids: List[str], scores: List[int], day: date) -> List[date]:
+        return await self.run(backend.db.reviews.review_chunks, user_id, chunk_ids, scores, day)
+
+    async def store_quiz_results(self, user_id: str, results: List[Dict]):
+        return await self.run(backend.db.reviews.store_quiz_results, user_id, results)
+
+    async def review_chunk(self, user_id: str, chunk_id: str, score: int, day: date) -> date:
+        return await self.run(backend.db.reviews.review_chunk, user_id, chunk_id, score, day)
+
+    async def store_quiz_result(self, user_id: str, chunk_id: str, answer: str, score: int, feedback: str, task_type: str):
+        return await self.run(backend.db.reviews.store_quiz_result, user_id, chunk_id, answer, score, feedback, task_type)
+
+    # Preferences
+
+    async def get_user_preferences(self, user_id: str) -> Optional[Dict]:
+        return await self.run(backend.db.preferences.get_user_preferences, user_id)
+
+    async def set_user_preferences(self, user_id: str, study_days: list, intensity: str) -> bool:
+        return await self.run(backend.db.preferences.set_user_preferences, user_id, study_days, intensity)
+
+
+_database = None
+
+def get_database() -> Database:
+    """
+    FastAPI dependency returning the process-wide Database.
+    """
+    global _database
+    if _database is None:
+        _database = Database()
+    return _database
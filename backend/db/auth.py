@@ -1,14 +1,43 @@
 from fastapi import HTTPException, Request, Header
 from backend.db.database import supabase
+from backend.core.cache import TTLCache
+import asyncio
+import hashlib
+import jwt
 import os
 import time
 
 SUPABASE_PROJECT_ID = os.environ["SUPABASE_PROJECT_ID"]
+# HS256 projects sign tokens with the project's JWT secret; others publish keys as JWKS
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL", f"{os.getenv('SUPABASE_URL', '').rstrip('/')}/auth/v1/.well-known/jwks.json")
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
 
-def verify_supabase_jwt(authorization: str = Header(...)):
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-    token = authorization.split(" ", 1)[1]
+# Verified tokens, keyed by token hash, expiring with the token (or TOKEN_CACHE_TTL if sooner)
+_token_cache = TTLCache(max_items=10000, ttl=TOKEN_CACHE_TTL)
+_jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True, lifespan=3600) if not SUPABASE_JWT_SECRET else None
+
+class _LocalVerificationUnavailable(Exception):
+    """Raised when a token cannot be checked locally and the network path should decide."""
+
+def _verify_locally(token: str) -> dict:
+    """
+    Verifies the token signature and expiry without calling Supabase. Returns the claims.
+    Raises jwt.InvalidTokenError for bad tokens and _LocalVerificationUnavailable when no key is available.
+    """
+    options = {"require": ["exp", "sub"]}
+    if SUPABASE_JWT_SECRET:
+        return jwt.decode(token, SUPABASE_JWT_SECRET, algorithms=["HS256"], audience="authenticated", options=options)
+    try:
+        signing_key = _jwks_client.get_signing_key_from_jwt(token)
+    except (jwt.PyJWKClientError, jwt.DecodeError) as e:
+        raise _LocalVerificationUnavailable(str(e))
+    return jwt.decode(token, signing_key.key, algorithms=["RS256", "ES256"], audience="authenticated", options=options)
+
+def _verify_with_supabase(token: str):
+    """
+    Verifies the token with a round trip to Supabase Auth. Returns the user ID.
+    """
     try:
         # Use Supabase client to verify the token
         result = supabase.auth.get_user(token)
@@ -17,6 +46,8 @@ def verify_supabase_jwt(authorization: str = Header(...)):
         else:
             print("No user found in result")  
             raise HTTPException(status_code=401, detail="Invalid token")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Verification error: {e}") 
         if "Server disconnected" in str(e):
@@ -29,6 +60,8 @@ def verify_supabase_jwt(authorization: str = Header(...)):
                 else:
                     print("No user found in result (retry)")  
                     raise HTTPException(status_code=401, detail="Invalid token (retry)")
+            except HTTPException:
+                raise
             except Exception as e2:
                 print(f"Verification retry error: {e2}")
                 raise HTTPException(status_code=401, detail=f"Token verification failed after retry: {str(e2)}")
@@ -36,6 +69,33 @@ def verify_supabase_jwt(authorization: str = Header(...)):
             raise HTTPException(status_code=401, detail="Token expired. Please log in again.")
         raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
 
+def verify_supabase_jwt(authorization: str = Header(...)):
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
+    token = authorization.split(" ", 1)[1]
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user_id = _token_cache.get(key)
+    if user_id is not None:
+        return user_id
+
+    try:
+        claims = _verify_locally(token)
+        user_id = claims["sub"]
+        ttl = min(TOKEN_CACHE_TTL, claims["exp"] - time.time())
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired. Please log in again.")
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
+    except _LocalVerificationUnavailable as e:
+        # No usable signing key (e.g. JWKS unreachable): fall back to asking Supabase
+        print(f"Local token verification unavailable, using Supabase: {e}")
+        user_id = _verify_with_supabase(token)
+        ttl = TOKEN_CACHE_TTL
+
+    if ttl > 0:
+        _token_cache.put(key, user_id, ttl=ttl)
+    return user_id
+
 async def login_user(request: Request):
     data = await request.json()
     email = data.get("email")
@@ -43,7 +103,8 @@ async def login_user(request: Request):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required.")
     try:
-        result = supabase.auth.sign_in_with_password({
+        # Run the blocking auth request off the event loop
+        result = await asyncio.to_thread(supabase.auth.sign_in_with_password, {
             "email": email,
             "password": password
         })
@@ -71,7 +132,7 @@ async def signup_user(request: Request):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required.")
     try:
-        result = supabase.auth.admin.create_user({
+        result = await asyncio.to_thread(supabase.auth.admin.create_user, {
             "email": email,
             "password": password,
             "email_confirm": True  
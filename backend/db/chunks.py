@@ -5,41 +5,55 @@ DB logic for chunks and embeddings. Supports storage, updating, and retrieval fo
 """
 
 from backend.db.database import supabase 
+from backend.core.generations import shared_generations
+from backend.core.ingestion import chunk_ids_for
+from backend.core.vectors import to_pgvector, parse_pgvector
+from backend.core.vector_index import user_indexes
+from collections import Counter
+import numpy as np
 import uuid
 
-def store_chunks(chunks : list[str], embeddings: list[list[float]], user_id, document_id): 
+# PostgREST returns at most this many rows per request
+PAGE_SIZE = 1000
+
+def store_chunks(chunks : list[str], embeddings: np.ndarray, user_id, document_id, class_id=None): 
     """ 
     Stores given chunks and their corresponding embeddings for a given document id. 
+    embeddings is a (len(chunks), dimensions) float32 or float16 array (or a list of vectors).
+    class_id, if given, is recorded in the user's in-memory search index.
     Returns a list of chunk IDs that were store in order by chunk in document and by document.
+    Chunk IDs are derived from document_id, so storing the same document again overwrites its rows.
     """
     if len(chunks) != len(embeddings): 
         raise Exception("Unequal number of chunk and embeddings")
     
     # Build data entries to enter in database
-    chunk_ids = []
+    chunk_ids = chunk_ids_for(document_id, len(chunks))
     data = []
-    for i in range(len(chunks)): 
-        chunk_id = str(uuid.uuid4())
-        chunk_ids.append(chunk_id)
+    for i, chunk_id in enumerate(chunk_ids): 
         data.append({
             "id": chunk_id,
             "document_id": document_id, 
             "user_id": user_id,
             "chunk_index": i, 
             "text": chunks[i],
-            "embedding": embeddings[i]
+            "embedding": to_pgvector(embeddings[i])
         })
 
     try: 
         supabase.from_("document_chunks").upsert(data).execute()
+        # Keep a loaded search index in step with the table
+        if len(chunk_ids) and embeddings[0] is not None:
+            user_indexes.add(user_id, chunk_ids, np.asarray(embeddings, dtype=np.float32), class_id)
         return chunk_ids
     except Exception as e:
         print(f"Error storing chunks: {e}")
         raise
 
-def store_file(user_id, class_id, document_id, pdf_bytes, file_name):
+def store_file(user_id, class_id, document_id, pdf_bytes, file_name, content_hash=None):
     """ 
     Stores a file in Supabase bucket storage. 
+    content_hash is the SHA-256 of pdf_bytes, recorded so later uploads of the same file can reuse it.
     """
     try: 
         storage_path = f"{user_id}/{class_id}/{document_id}/{file_name}"
@@ -48,7 +62,8 @@ def store_file(user_id, class_id, document_id, pdf_bytes, file_name):
         supabase.storage.from_("documents").upload(
             path=storage_path,
             file=pdf_bytes,
-            file_options={"content-type": "application/pdf"}
+            # Overwrite the blob a failed earlier attempt may have left at the same path
+            file_options={"content-type": "application/pdf", "upsert": "true"}
         )
 
         # Store file metadata
@@ -58,12 +73,71 @@ def store_file(user_id, class_id, document_id, pdf_bytes, file_name):
             "class_id": class_id,
             "filename": file_name,
             "pdf_path": storage_path,
+            "content_hash": content_hash,
         }).execute()
 
     except Exception as e:
         print(f"Error storing file: {e}")
         raise
 
+def find_document_by_hash(content_hash: str, user_id: str, class_id: str):
+    """
+    Finds a previously uploaded document with the same content hash, uploaded either by this user
+    or by anyone in the same class. Returns the document row, or None if there is none.
+    """
+    try:
+        # One parameterised query per owner column, so neither ID is ever parsed as a filter
+        for column, value in (("user_id", user_id), ("class_id", class_id)):
+            if not value:
+                continue
+            result = supabase.table("documents").select("id, pdf_path").eq("content_hash", content_hash).eq(
+                column, value).limit(1).execute()
+            if hasattr(result, "data") and result.data:
+                return result.data[0]
+        return None
+    except Exception as e:
+        print(f"Error finding document by hash: {e}")
+        return None
+
+def get_document_chunks(document_id: str):
+    """
+    Retrieves the chunk texts and embeddings (as a float32 array) of a document, in chunk order.
+    """
+    result = supabase.table("document_chunks").select("text, embedding").eq("document_id", document_id).order("chunk_index").execute()
+    rows = result.data if hasattr(result, "data") and result.data else []
+    chunks = [row["text"] for row in rows]
+    if not rows:
+        return chunks, np.empty((0, 0), dtype=np.float32)
+    embeddings = np.stack([parse_pgvector(row["embedding"]) for row in rows])
+    return chunks, embeddings
+
+def reuse_document(user_id, class_id, document_id, file_name, content_hash):
+    """ 
+    If a file with the same content hash was already ingested, registers document_id as a new
+    document pointing at the stored blob and returns the existing (chunks, embeddings) so they can be
+    stored for this user without re-uploading, re-extracting or re-embedding. Returns None otherwise.
+    """
+    existing = find_document_by_hash(content_hash, user_id, class_id)
+    if not existing:
+        return None
+    chunks, embeddings = get_document_chunks(existing["id"])
+    if not chunks:
+        # The earlier upload has no chunks yet (or failed part way); ingest from scratch
+        return None
+    try:
+        supabase.from_("documents").upsert({
+            "id": document_id,
+            "user_id": user_id,
+            "class_id": class_id,
+            "filename": file_name,
+            "pdf_path": existing["pdf_path"],
+            "content_hash": content_hash,
+        }).execute()
+    except Exception as e:
+        print(f"Error storing reused file: {e}")
+        raise
+    return chunks, embeddings
+
 def get_chunk_text(chunk_id: str, user_id: str) -> str:
     """
     Retrieve the text content of a specific chunk.
@@ -85,6 +159,145 @@ def get_chunk_text(chunk_id: str, user_id: str) -> str:
         print(f"Error retrieving chunk text: {e}")
         return None
 
+def load_user_embeddings(user_id: str):
+    """
+    Loads every chunk embedding of a user for the in-memory search index.
+    Returns (chunk IDs, float32 embedding matrix, class ID of each chunk).
+    """
+    documents = supabase.table("documents").select("id, class_id").eq("user_id", user_id).execute()
+    class_by_document = {row["id"]: row["class_id"] for row in (documents.data or [])}
+
+    ids, vectors, class_ids = [], [], []
+    offset = 0
+    while True:
+        result = supabase.table("document_chunks").select("id, document_id, embedding").eq(
+            "user_id", user_id).order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        rows = result.data if hasattr(result, "data") and result.data else []
+        for row in rows:
+            if row.get("embedding") is None:
+                continue
+            ids.append(row["id"])
+            vectors.append(parse_pgvector(row["embedding"]))
+            class_ids.append(class_by_document.get(row["document_id"]))
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    if not vectors:
+        return [], np.empty((0, 0), dtype=np.float32), []
+    # Skip rows embedded with a different model/dimension than the majority
+    dim = Counter(len(v) for v in vectors).most_common(1)[0][0]
+    keep = [i for i, v in enumerate(vectors) if len(v) == dim]
+    return [ids[i] for i in keep], np.stack([vectors[i] for i in keep]), [class_ids[i] for i in keep]
+
+def get_chunk_texts(chunk_ids: list[str], user_id: str) -> dict:
+    """
+    Retrieves the text of several chunks in one query. Returns a dict of chunk ID to text.
+    """
+    if not chunk_ids:
+        return {}
+    try:
+        result = supabase.table("document_chunks").select("id, text").in_("id", chunk_ids).eq("user_id", user_id).execute()
+        return {row["id"]: row["text"] for row in (result.data or [])}
+    except Exception as e:
+        print(f"Error retrieving chunk texts: {e}")
+        return {}
+
+def link_duplicate_chunks(clusters: dict, user_id: str):
+    """
+    Records near-duplicate chunks by pointing their duplicate_of column at the cluster's
+    representative chunk. clusters maps representative chunk ID -> list of duplicate chunk IDs.
+    All links are written in one statement (see supabase/migrations).
+    """
+    links = [{"id": duplicate, "duplicate_of": representative}
+             for representative, duplicates in clusters.items() for duplicate in duplicates]
+    if not links:
+        return
+    try:
+        supabase.rpc("link_duplicate_chunks", {"links": links, "owner": user_id}).execute()
+    except Exception as e:
+        print(f"Error linking duplicate chunks: {e}")
+        raise
+
+def get_chunk(chunk_id: str, user_id: str):
+    """
+    Retrieves a chunk's text, stored quiz questions and embedding. Returns a dict with 'text',
+    'questions' (a possibly empty list) and 'embedding' (a float32 array, or None), or None if the
+    chunk does not exist or belongs to another user.
+    """
+    try:
+        result = supabase.table("document_chunks").select("text, questions, embedding").eq("id", chunk_id).eq("user_id", user_id).execute()
+        if hasattr(result, "data") and result.data:
+            return _chunk_fields(result.data[0])
+        return None
+    except Exception as e:
+        print(f"Error retrieving chunk: {e}")
+        return None
+
+def _chunk_fields(row: dict) -> dict:
+    embedding = row.get("embedding")
+    return {"text": row.get("text") or "", "questions": row.get("questions") or [],
+            "embedding": parse_pgvector(embedding) if embedding is not None else None}
+
+def get_chunks(chunk_ids: list[str], user_id: str) -> dict:
+    """
+    Retrieves several chunks in one query, in the form returned by get_chunk.
+    Returns a dict of chunk ID to chunk; missing chunks and other users' chunks are left out.
+    """
+    if not chunk_ids:
+        return {}
+    try:
+        result = supabase.table("document_chunks").select("id, text, questions, embedding").in_(
+            "id", chunk_ids).eq("user_id", user_id).execute()
+        return {row["id"]: _chunk_fields(row) for row in (result.data or [])}
+    except Exception as e:
+        print(f"Error retrieving chunks: {e}")
+        return {}
+
+def set_chunk_questions(questions: dict):
+    """
+    Stores quiz questions with their chunks. questions maps chunk ID -> list of question strings.
+    All pools are written in one statement (see supabase/migrations).
+    """
+    if not questions:
+        return
+    try:
+        updates = [{"id": chunk_id, "questions": chunk_questions} for chunk_id, chunk_questions in questions.items()]
+        supabase.rpc("set_chunk_questions", {"updates": updates}).execute()
+    except Exception as e:
+        print(f"Error storing chunk questions: {e}")
+        raise
+
+def get_chunks_needing_questions(day: str) -> dict:
+    """
+    Finds the chunks of all open quiz and review tasks scheduled on day that have no stored
+    question yet. Returns a dict of chunk ID to text.
+    """
+    chunk_ids = set()
+    offset = 0
+    while True:
+        result = supabase.table("tasks").select("chunk_id").eq("scheduled_date", day).in_(
+            "task_type", ["quiz", "review"]).eq("completed", False).order("id").range(offset, offset + PAGE_SIZE - 1).execute()
+        rows = result.data if hasattr(result, "data") and result.data else []
+        chunk_ids.update(row["chunk_id"] for row in rows)
+        if len(rows) < PAGE_SIZE:
+            break
+        offset += PAGE_SIZE
+
+    texts = {}
+    chunk_ids = sorted(chunk_ids)
+    for start in range(0, len(chunk_ids), PAGE_SIZE):
+        result = supabase.table("document_chunks").select("id, text, questions").in_(
+            "id", chunk_ids[start:start + PAGE_SIZE]).execute()
+        for row in (result.data or []):
+            if not row.get("questions") and row.get("text"):
+                texts[row["id"]] = row["text"]
+    return texts
+
+user_indexes.loader = load_user_embeddings
+# Chunks stored by upload workers reach the API's indexes through the shared counters
+user_indexes.generations = shared_generations
+
 # Mock example for testing:
 if __name__ == "__main__":
     store_chunks(["hello"], [None], str(uuid.uuid4()), str(uuid.uuid4()))
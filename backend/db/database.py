@@ -3,8 +3,14 @@ database.py
 
 Sets up connection to Supabase client.
 
+PostgREST, storage and auth share one HTTP client, so requests reuse a bounded pool of
+kept-alive connections instead of opening a new one per call.
+
+    DB_POOL_SIZE     concurrent database calls and pooled HTTP connections (default: 16)
+    DB_TIMEOUT       seconds before a database request times out (default: 120)
 """
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+import httpx
 import os
 from dotenv import load_dotenv
 
@@ -12,5 +18,12 @@ load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 16))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", 120))
+
+http_client = httpx.Client(
+    limits=httpx.Limits(max_connections=DB_POOL_SIZE, max_keepalive_connections=DB_POOL_SIZE, keepalive_expiry=60),
+    timeout=DB_TIMEOUT,
+)
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=http_client))
@@ -0,0 +1,267 @@
+"""
+memory.py
+
+In-memory stand-in for backend.db.access.Database, for tests and for running the API without
+Supabase. Tables are plain lists and dicts held by the instance; nothing is shared between
+instances. Follow-up tasks are placed by the real scheduler's plan_placements.
+"""
+
+import uuid
+from collections import Counter
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.core.ingestion import chunk_ids_for
+from backend.core.memory_model import MemoryModel
+from backend.core.scheduling import DEFAULT_PREFERENCES, plan_placements
+from backend.core.vector_index import VectorIndex
+
+
+class InMemoryDatabase:
+    """
+    Same awaitable interface as Database, backed by in-memory tables.
+
+    Attributes:
+        classes (list): Class rows.
+        documents (dict): Document rows by document ID.
+        chunks (dict): Chunk rows by chunk ID; embeddings are kept as float32 arrays.
+        tasks (list): Task rows.
+        quiz_results (list): Graded answers.
+        preferences (dict): Preference rows by user ID.
+    """
+
+    def __init__(self):
+        self.classes: List[Dict] = []
+        self.documents: Dict[str, Dict] = {}
+        self.chunks: Dict[str, Dict] = {}
+        self.tasks: List[Dict] = []
+        self.quiz_results: List[Dict] = []
+        self.preferences: Dict[str, Dict] = {}
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._models: Dict[str, MemoryModel] = {}
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+    # Classes
+
+    async def get_user_classes(self, user_id: str) -> List[Dict]:
+        return [dict(row) for row in self.classes if row["user_id"] == user_id]
+
+    async def get_class_by_id(self, class_id: str, user_id: str) -> Optional[Dict]:
+        for row in self.classes:
+            if row["id"] == class_id and row["user_id"] == user_id:
+                return dict(row)
+        return None
+
+    async def create_class(self, user_id: str, name: str) -> Optional[Dict]:
+        row = {"id": str(uuid.uuid4()), "name": name, "user_id": user_id}
+        self.classes.append(row)
+        return dict(row)
+
+    async def delete_class(self, class_id: str, user_id: str) -> bool:
+        self.classes = [row for row in self.classes if not (row["id"] == class_id and row["user_id"] == user_id)]
+        return True
+
+    # Documents and chunks
+
+    async def store_file(self, user_id, class_id, document_id, pdf_bytes, file_name, content_hash=None):
+        self.documents[document_id] = {
+            "id": document_id,
+            "user_id": user_id,
+            "class_id": class_id,
+            "filename": file_name,
+            "pdf_path": f"{user_id}/{class_id}/{document_id}/{file_name}",
+            "content_hash": content_hash,
+        }
+
+    def _document_chunks(self, document_id: str) -> List[Dict]:
+        rows = [row for row in self.chunks.values() if row["document_id"] == document_id]
+        return sorted(rows, key=lambda row: row["chunk_index"])
+
+    async def reuse_document(self, user_id, class_id, document_id, file_name, content_hash):
+        for existing in list(self.documents.values()):
+            if existing["content_hash"] != content_hash:
+                continue
+            if existing["user_id"] != user_id and existing["class_id"] != class_id:
+                continue
+            rows = self._document_chunks(existing["id"])
+            if not rows:
+                return None
+            self.documents[document_id] = {**existing, "id": document_id, "user_id": user_id,
+                                           "class_id": class_id, "filename": file_name}
+            return [row["text"] for row in rows], np.stack([row["embedding"] for row in rows])
+        return None
+
+    async def store_chunks(self, chunks: List[str], embeddings: np.ndarray, user_id, document_id, class_id=None) -> List[str]:
+        if len(chunks) != len(embeddings):
+            raise Exception("Unequal number of chunk and embeddings")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        chunk_ids = chunk_ids_for(document_id, len(chunks))
+        for i, (chunk_id, text) in enumerate(zip(chunk_ids, chunks)):
+            self.chunks[chunk_id] = {
+                "id": chunk_id,
+                "document_id": document_id,
+                "user_id": user_id,
+                "chunk_index": i,
+                "text": text,
+                "embedding": embeddings[i],
+            }
+        index = self._indexes.get(user_id)
+        if index is not None and chunk_ids:
+            index.add(chunk_ids, embeddings, [class_id] * len(chunk_ids))
+        return chunk_ids
+
+    async def get_chunk_text(self, chunk_id: str, user_id: str) -> Optional[str]:
+        row = self.chunks.get(chunk_id)
+        return row["text"] if row and row["user_id"] == user_id else None
+
+    async def get_chunk(self, chunk_id: str, user_id: str) -> Optional[Dict]:
+        row = self.chunks.get(chunk_id)
+        if not row or row["user_id"] != user_id:
+            return None
+        return {"text": row["text"], "questions": list(row.get("questions") or []), "embedding": row["embedding"]}
+
+    async def get_chunks(self, chunk_ids: List[str], user_id: str) -> Dict[str, Dict]:
+        chunks = {chunk_id: await self.get_chunk(chunk_id, user_id) for chunk_id in chunk_ids}
+        return {chunk_id: chunk for chunk_id, chunk in chunks.items() if chunk is not None}
+
+    async def set_chunk_questions(self, questions: Dict[str, List[str]]):
+        for chunk_id, chunk_questions in questions.items():
+            self.chunks[chunk_id]["questions"] = list(chunk_questions)
+
+    async def get_chunks_needing_questions(self, day: str) -> Dict[str, str]:
+        chunk_ids = {row["chunk_id"] for row in self.tasks if row["scheduled_date"] == day
+                     and row["task_type"] in ("quiz", "review") and not row["completed"]}
+        return {chunk_id: self.chunks[chunk_id]["text"] for chunk_id in sorted(chunk_ids)
+                if chunk_id in self.chunks and not self.chunks[chunk_id].get("questions")}
+
+    async def get_chunk_texts(self, chunk_ids: List[str], user_id: str) -> Dict[str, str]:
+        return {chunk_id: self.chunks[chunk_id]["text"] for chunk_id in chunk_ids
+                if chunk_id in self.chunks and self.chunks[chunk_id]["user_id"] == user_id}
+
+    async def link_duplicate_chunks(self, clusters: Dict[str, List[str]], user_id: str):
+        for representative, duplicates in clusters.items():
+            for chunk_id in duplicates:
+                if self.chunks[chunk_id]["user_id"] == user_id:
+                    self.chunks[chunk_id]["duplicate_of"] = representative
+
+    async def get_search_index(self, user_id: str) -> VectorIndex:
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = self._indexes[user_id] = VectorIndex()
+            rows = [row for row in self.chunks.values() if row["user_id"] == user_id]
+            if rows:
+                index.add([row["id"] for row in rows], np.stack([row["embedding"] for row in rows]),
+                          [self.documents.get(row["document_id"], {}).get("class_id") for row in rows])
+        return index
+
+    # Tasks and reviews
+
+    async def store_schedule(self, schedule: List[dict], user_id: str):
+        for task in schedule:
+            self.tasks.append({
+                "id": str(uuid.uuid4()),
+                "user_id": user_id,
+                "chunk_id": task["chunk_id"],
+                "scheduled_date": task["date"].isoformat(),
+                "task_type": task["task_type"],
+                "completed": False,
+            })
+
+    async def schedule_task(self, task: dict, user_id: str, from_date: date) -> date:
+        return (await self.schedule_tasks([(task, from_date)], user_id))[0]
+
+    async def schedule_tasks(self, placements: List[Tuple[dict, date]], user_id: str) -> List[date]:
+        user_tasks = [row for row in self.tasks if row["user_id"] == user_id]
+        counts = Counter(row["scheduled_date"] for row in user_tasks)
+
+        def learn_tasks(day: date) -> List[Dict]:
+            rows = [row for row in user_tasks if row["scheduled_date"] == day.isoformat()
+                    and row["task_type"] == "learn" and not row["completed"]]
+            return sorted(rows, key=lambda row: row["id"], reverse=True)
+
+        days, moved, _ = plan_placements(placements, self.preferences.get(user_id) or DEFAULT_PREFERENCES,
+                                         lambda day: counts[day.isoformat()], learn_tasks)
+        stored = {row["id"]: row for row in user_tasks}
+        for row_id, row in moved.items():
+            stored[row_id]["scheduled_date"] = row["scheduled_date"]
+        for task, _ in placements:
+            if task.get("id") in stored:
+                stored[task["id"]].update(task)
+            else:
+                self.tasks.append({"id": str(uuid.uuid4()), **task})
+        return days
+
+    async def reschedule_reviews(self, user_id: str, today: date) -> int:
+        model = self._model(user_id)
+        rows = [dict(row) for row in self.tasks if row["user_id"] == user_id and row["task_type"] == "review"
+                and not row["completed"] and row["scheduled_date"] >= today.isoformat() and row["chunk_id"] in model]
+        if not rows:
+            return 0
+        due_dates = model.due_dates([row["chunk_id"] for row in rows])
+        placements = sorted(((row, max(due.item(), today)) for row, due in zip(rows, due_dates)), key=lambda p: p[1])
+        await self.schedule_tasks(placements, user_id)
+        return len(placements)
+
+    async def get_tasks(self, user_id: str, start: str, end: str) -> List[Dict]:
+        return [dict(row) for row in self.tasks
+                if row["user_id"] == user_id and start <= row["scheduled_date"] <= end]
+
+    async def get_todays_reviews(self, user_id: str, today: str) -> List[Dict]:
+        return [dict(row) for row in self.tasks if row["user_id"] == user_id and row["scheduled_date"] == today]
+
+    async def complete_task(self, user_id: str, chunk_id: str, task_type: str):
+        for row in self.tasks:
+            if row["user_id"] == user_id and row["chunk_id"] == chunk_id and row["task_type"] == task_type:
+                row["completed"] = True
+
+    async def complete_tasks(self, user_id: str, tasks: List[Tuple[str, str]]):
+        for chunk_id, task_type in tasks:
+            await self.complete_task(user_id, chunk_id, task_type)
+
+    def _model(self, user_id: str) -> MemoryModel:
+        model = self._models.get(user_id)
+        if model is None:
+            history = [row for row in self.quiz_results if row["user_id"] == user_id]
+            model = self._models[user_id] = MemoryModel.from_history(
+                [row["chunk_id"] for row in history], [row["score"] for row in history],
+                [row["timestamp"][:10] for row in history])
+        return model
+
+    async def review_chunk(self, user_id: str, chunk_id: str, score: int, day: date) -> date:
+        return self._model(user_id).review([chunk_id], [score], day)[0].item()
+
+    async def review_chunks(self, user_id: str, chunk_ids: List[str], scores: List[int], day: date) -> List[date]:
+        return [due.item() for due in self._model(user_id).review(chunk_ids, scores, day)]
+
+    async def store_quiz_results(self, user_id: str, results: List[Dict]):
+        for result in results:
+            await self.store_quiz_result(user_id, result["chunk_id"], result["answer"], result["score"],
+                                         result["feedback"], result["task_type"])
+
+    async def store_quiz_result(self, user_id: str, chunk_id: str, answer: str, score: int, feedback: str, task_type: str):
+        self.quiz_results.append({
+            "user_id": user_id,
+            "chunk_id": chunk_id,
+            "answer": answer,
+            "score": score,
+            "feedback": feedback,
+            "timestamp": datetime.utcnow().isoformat(),
+            "task_type": task_type,
+        })
+
+    # Preferences
+
+    async def get_user_preferences(self, user_id: str) -> Optional[Dict]:
+        row = self.preferences.get(user_id)
+        return dict(row) if row else None
+
+    async def set_user_preferences(self, user_id: str, study_days: list, intensity: str) -> bool:
+        self.preferences[user_id] = {"study_days": list(study_days), "intensity": intensity}
+        return True
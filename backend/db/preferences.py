@@ -1,11 +1,9 @@
 from backend.db.database import supabase
+from backend.core.scheduling import load_user_preferences, cache_user_preferences, invalidate_user_preferences
 
 def get_user_preferences(user_id: str):
     try:
-        result = supabase.table("user_preferences").select("study_days, intensity").eq("user_id", user_id).single().execute()
-        if hasattr(result, "data") and result.data:
-            return result.data
-        return None
+        return load_user_preferences(user_id, supabase)
     except Exception as e:
         print(f"Error fetching user preferences: {e}")
         return None
@@ -17,7 +15,10 @@ def set_user_preferences(user_id: str, study_days: list, intensity: str):
             "study_days": study_days,
             "intensity": intensity
         }).execute()
+        cache_user_preferences(user_id, study_days, intensity)
         return True
     except Exception as e:
+        # The write may or may not have landed, so don't trust the cached row
+        invalidate_user_preferences(user_id)
         print(f"Error setting user preferences: {e}")
         return False 
\ No newline at end of file
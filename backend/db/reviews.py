@@ -5,8 +5,16 @@ Database operations for review sessions and tracking review progress.
 """
 
 from backend.db.database import supabase
+from backend.core.generations import shared_generations
+from backend.core.memory_model import MemoryModel, memory_models
 from typing import List, Dict, Optional
-from datetime import datetime
+from datetime import date, datetime
+
+# PostgREST returns at most this many rows per request
+PAGE_SIZE = 1000
+
+# Storing answers bumps 'memory:<user_id>', so a model another process cached before them is replayed again
+memory_generations = shared_generations
 
 def get_todays_reviews(user_id: str, today: str) -> List[Dict]:
     """Get all review tasks scheduled for today (all types)"""
@@ -42,4 +50,92 @@ def complete_review(user_id: str, chunk_id: str) -> bool:
         return True
     except Exception as e:
         print(f"Error completing review: {e}")
-        return False 
\ No newline at end of file
+        return False
+
+def complete_task(user_id: str, chunk_id: str, task_type: str):
+    """Mark the user's tasks of one type for a chunk as completed"""
+    supabase.table("tasks").update({"completed": True}).eq("user_id", user_id).eq("chunk_id", chunk_id).eq("task_type", task_type).execute()
+
+def complete_tasks(user_id: str, tasks: List[tuple]):
+    """Mark the user's tasks for several (chunk_id, task_type) pairs as completed, one update per task type"""
+    by_type = {}
+    for chunk_id, task_type in tasks:
+        by_type.setdefault(task_type, []).append(chunk_id)
+    for task_type, chunk_ids in by_type.items():
+        supabase.table("tasks").update({"completed": True}).eq("user_id", user_id).eq(
+            "task_type", task_type).in_("chunk_id", chunk_ids).execute()
+
+def store_quiz_result(user_id: str, chunk_id: str, answer: str, score: int, feedback: str, task_type: str):
+    """Record a graded quiz or review answer"""
+    supabase.table("quiz_performance").insert({
+        "user_id": user_id,
+        "chunk_id": chunk_id,
+        "answer": answer,
+        "score": score,
+        "feedback": feedback,
+        "timestamp": datetime.utcnow().isoformat(),
+        "task_type": task_type
+    }).execute()
+    _answers_stored(user_id)
+
+def store_quiz_results(user_id: str, results: List[Dict]):
+    """Record several graded answers (dicts with chunk_id, answer, score, feedback, task_type) in one insert"""
+    if not results:
+        return
+    timestamp = datetime.utcnow().isoformat()
+    supabase.table("quiz_performance").insert([
+        {"user_id": user_id, "timestamp": timestamp, **{key: result[key] for key in
+                                                       ("chunk_id", "answer", "score", "feedback", "task_type")}}
+        for result in results
+    ]).execute()
+    _answers_stored(user_id)
+
+def _answers_stored(user_id: str):
+    """Move the user's memory generation past newly stored answers. This process's cached model has
+    already reviewed them, so it is kept unless another process stored answers in the meantime."""
+    generation = memory_generations.bump(f"memory:{user_id}")
+    cached = memory_models.pop(user_id)
+    if cached is not None and cached[1] == generation - 1:
+        memory_models.put(user_id, (cached[0], generation))
+
+def get_quiz_history(user_id: str) -> List[Dict]:
+    """Get all of a user's graded answers (chunk_id, score, timestamp), oldest first"""
+    rows = []
+    offset = 0
+    while True:
+        result = supabase.table("quiz_performance").select("chunk_id, score, timestamp").eq(
+            "user_id", user_id).order("timestamp").range(offset, offset + PAGE_SIZE - 1).execute()
+        page = result.data if hasattr(result, "data") and result.data else []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+def get_memory_model(user_id: str) -> MemoryModel:
+    """Get the user's memory model, replaying their answer history on first use and again once
+    answers stored by another process have moved its generation"""
+    # Read before the history, so answers stored during the replay trigger another one
+    generation = memory_generations.get(f"memory:{user_id}")
+    cached = memory_models.get(user_id)
+    if cached is not None and cached[1] == generation:
+        return cached[0]
+    history = get_quiz_history(user_id)
+    model = MemoryModel.from_history(
+        [row["chunk_id"] for row in history],
+        [row["score"] for row in history],
+        [row["timestamp"][:10] for row in history],
+    )
+    memory_models.put(user_id, (model, generation))
+    return model
+
+def review_chunk(user_id: str, chunk_id: str, score: int, day: date) -> date:
+    """Apply a graded answer to the user's memory model and return the chunk's next due date.
+    Call before storing the answer, so a model replayed from history does not count it twice."""
+    model = get_memory_model(user_id)
+    return model.review([chunk_id], [score], day)[0].item()
+
+def review_chunks(user_id: str, chunk_ids: List[str], scores: List[int], day: date) -> List[date]:
+    """Apply several graded answers (at most one per chunk) in one vectorized update and return
+    each chunk's next due date. Call before storing the answers, as with review_chunk."""
+    model = get_memory_model(user_id)
+    return [due.item() for due in model.review(chunk_ids, scores, day)]
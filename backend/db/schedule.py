@@ -5,7 +5,15 @@ DB logic for task schedules.
 """
 
 import uuid 
+from datetime import date
 from backend.db.database import supabase 
+from backend.core import scheduling
+from backend.core.generations import shared_generations
+from backend.core.scheduling import invalidate_capacity, place_task, place_tasks
+from backend.db.reviews import get_memory_model
+
+# Schedules stored by upload workers reach the API's capacity calendars through the shared counters
+scheduling.capacity_generations = shared_generations
 
 def store_schedule(schedule: list[dict], user_id: str):
     """
@@ -30,7 +38,51 @@ def store_schedule(schedule: list[dict], user_id: str):
         
         # Store in database
         supabase.from_("tasks").upsert(data).execute()
+        # Per-day task counts cached for slot lookups are now stale
+        invalidate_capacity(user_id)
         
     except Exception as e:
         print(f"Error storing schedule: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def schedule_task(task: dict, user_id: str, from_date: date) -> date:
+    """
+    Stores a single follow-up task (quiz or review) on the user's first study day on or after
+    from_date, moving one learn task out of the way if that day is full.
+    Returns the date the task was scheduled for.
+    """
+    return place_task(user_id, supabase, task, from_date)
+
+def schedule_tasks(placements: list[tuple[dict, date]], user_id: str) -> list[date]:
+    """
+    Stores several follow-up tasks, given as (task, from_date) pairs, in one placement pass.
+    Returns the date each task was scheduled for.
+    """
+    return place_tasks(user_id, supabase, placements)
+
+def reschedule_reviews(user_id: str, today: date) -> int:
+    """
+    Places the user's open review tasks from today on again under their current preferences, on the
+    first study day on or after each chunk's due date. The due dates of all of them come from one
+    vectorized pass over the memory model. Returns the number of tasks placed.
+    """
+    result = supabase.table("tasks").select("*").eq("user_id", user_id).eq("task_type", "review").eq(
+        "completed", False).gte("scheduled_date", today.isoformat()).execute()
+    model = get_memory_model(user_id)
+    # Whole rows, so the upsert in place_tasks rewrites them without touching any other column
+    rows = [row for row in (result.data or []) if row["chunk_id"] in model]
+    if not rows:
+        return 0
+    due_dates = model.due_dates([row["chunk_id"] for row in rows])
+    placements = sorted(((row, max(due.item(), today)) for row, due in zip(rows, due_dates)), key=lambda p: p[1])
+    place_tasks(user_id, supabase, placements)
+    return len(placements)
+
+def get_tasks(user_id: str, start: str, end: str) -> list[dict]:
+    """
+    Returns the user's tasks scheduled between start and end (inclusive ISO dates).
+    """
+    result = supabase.table("tasks").select(
+        "id, chunk_id, scheduled_date, task_type, completed"
+    ).eq("user_id", user_id).gte("scheduled_date", start).lte("scheduled_date", end).execute()
+    return result.data if hasattr(result, "data") else []
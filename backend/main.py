@@ -1,28 +1,47 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from backend.core.embedding import embed_pdf
+from backend.core.ingestion import get_ingestion_executor, content_hash
+from backend.core.jobs import JobQueue, get_job_queue
+from backend.core.uploads import spool_uploads
+from backend.core.grading import UNAVAILABLE_FEEDBACK, grade_answer, grade_answers, pregrader
+from backend.core.llm import LLMGateway, close_llm_gateway, get_llm_gateway
+from backend.core.questions import QuestionPregenerator, generate_question, question_pools
 from backend.core.scheduling import (
-    Scheduler, UserPreferences, schedule_next_quiz, schedule_next_review, schedule_followup_review,
-    find_next_available_slot, shift_tasks_forward
+    INTENSITY_MAP, schedule_next_quiz, schedule_next_review
 )
-import backend.db.chunks
-import backend.db.schedule
-import backend.db.classes
-import backend.db.reviews
+from backend.db.access import Database, get_database
 import uuid
-from io import BytesIO
 from typing import List, Optional
-from datetime import datetime, date
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+import asyncio
 import json 
-from backend.db.database import supabase
+import logging
 from backend.db.auth import verify_supabase_jwt, login_user, signup_user, refresh_user_token
-import os
-import openai
-from backend.db.preferences import get_user_preferences, set_user_preferences
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = get_database()
 
-app = FastAPI()
+    async def store_questions(questions):
+        await db.set_chunk_questions(questions)
+        question_pools.update(questions)
+
+    # Generate the question pools queued by this process's requests in the background. The scan for
+    # tomorrow's quizzes and reviews is a periodic job of the workers (backend/worker.py), so it runs once
+    app.state.question_pregenerator = QuestionPregenerator(get_llm_gateway(), db.get_chunks_needing_questions,
+                                                           store_questions, interval=None)
+    app.state.question_pregenerator.start()
+    yield
+    await app.state.question_pregenerator.stop()
+    await close_llm_gateway()
+    # Release the ingestion and database worker pools on shutdown
+    get_ingestion_executor().shutdown(wait=False)
+    db.shutdown(wait=False)
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +52,28 @@ app.add_middleware(
 )
 
 
+def refill_questions(request: Request, chunk_id: str, chunk: dict):
+    """Queue a new question pool for a cached chunk whose pool is empty or running low"""
+    pregenerator = getattr(request.app.state, "question_pregenerator", None)
+    if pregenerator is not None and question_pools.needs_refill(chunk):
+        chunk["refilling"] = True
+        pregenerator.enqueue(chunk_id, chunk["text"])
+
+
+async def embed_answers(answers: List[str]):
+    """Embed quiz answers for grading, without adding them to the embedding cache"""
+    return await get_ingestion_executor().embed_chunks(answers, use_cache=False)
+
+
+async def queue_question(request: Request, db: Database, user_id: str, chunk_id: str, day: date):
+    """Make sure a quiz or review task that falls due by tomorrow has questions waiting"""
+    if day > date.today() + timedelta(days=1):
+        return
+    chunk = await question_pools.get(db.get_chunk, chunk_id, user_id)
+    if chunk is not None:
+        refill_questions(request, chunk_id, chunk)
+
+
 @app.post("/api/login")
 async def login(request: Request):
     return await login_user(request)
@@ -42,13 +83,13 @@ async def signup(request: Request):
     return await signup_user(request)
 
 @app.get("/api/classes")
-async def get_classes(user_id: str = Depends(verify_supabase_jwt)):
-    classes = backend.db.classes.get_user_classes(user_id)
+async def get_classes(user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
+    classes = await db.get_user_classes(user_id)
     return {"classes": classes}
 
 @app.get("/api/classes/{class_id}")
-async def get_class(class_id: str, user_id: str = Depends(verify_supabase_jwt)):
-    class_info = backend.db.classes.get_class_by_id(class_id, user_id)
+async def get_class(class_id: str, user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
+    class_info = await db.get_class_by_id(class_id, user_id)
     if not class_info:
         raise HTTPException(status_code=404, detail="Class not found")
     return {"class": class_info}
@@ -57,109 +98,136 @@ async def get_class(class_id: str, user_id: str = Depends(verify_supabase_jwt)):
 async def upload_pdf(
     class_id: str = Form(...),
     pdf: UploadFile = File(...),
-    user_id: str = Depends(verify_supabase_jwt)
+    user_id: str = Depends(verify_supabase_jwt),
+    db: Database = Depends(get_database)
 ):
     try:
-        # Store PDF file in bucket
         document_id = str(uuid.uuid4())
         pdf_bytes = await pdf.read()
-        backend.db.chunks.store_file(user_id, class_id, document_id, pdf_bytes, pdf.filename)
+        digest = content_hash(pdf_bytes)
 
-        # Get PDF chunks and embeddings 
-        chunks, embeddings = embed_pdf(BytesIO(pdf_bytes))
+        # Reuse the blob, chunks and embeddings of an identical earlier upload if there is one
+        reused = await db.reuse_document(user_id, class_id, document_id, pdf.filename, digest)
+        if reused is not None:
+            chunks, embeddings = reused
+        else:
+            # Store PDF file in bucket
+            await db.store_file(user_id, class_id, document_id, pdf_bytes, pdf.filename, digest)
+
+            # Get PDF chunks and embeddings off the event loop
+            chunks, embeddings = await get_ingestion_executor().embed_pdf(pdf_bytes)
 
         # Store embeddings and get chunk IDs
-        chunk_ids = backend.db.chunks.store_chunks(chunks, embeddings, user_id=user_id, document_id=document_id)
+        chunk_ids = await db.store_chunks(chunks, embeddings, user_id=user_id, document_id=document_id, class_id=class_id)
         return {"status": "ok", "chunks": len(chunks), "chunk_ids": chunk_ids}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/upload-batch")
+@app.post("/upload-batch", status_code=202)
 async def upload_batch(
     class_id: str = Form(...),
     pdfs: List[UploadFile] = File(...),
     study_days: str = Form(...),  
     intensity: str = Form(...),   
-    user_id: str = Depends(verify_supabase_jwt)
+    user_id: str = Depends(verify_supabase_jwt),
+    queue: JobQueue = Depends(get_job_queue)
 ):
     """
-    Upload multiple PDFs for a specified class, process them, and create a combined study schedule.
+    Upload multiple PDFs for a specified class. The PDFs are spooled and processed into a combined
+    study schedule by a background worker; poll /api/jobs/{job_id} for progress.
     """
     try:
-        # Parse study days 
         study_days_list = json.loads(study_days)
-
-        preferences = UserPreferences(study_days=study_days_list, intensity=intensity)
-        scheduler = Scheduler(user_id=user_id, preferences=preferences)
-        all_chunk_ids = []
-        
-        # Process each PDF
-        for pdf in pdfs:
-            # Store PDF file in bucket
-            document_id = str(uuid.uuid4())
-            pdf_bytes = await pdf.read()
-            backend.db.chunks.store_file(user_id, class_id, document_id, pdf_bytes, pdf.filename)
-
-            # Get PDF chunks and embeddings 
-            chunks, embeddings = embed_pdf(BytesIO(pdf_bytes))
-
-            # Store embeddings and get chunk IDs
-            chunk_ids = backend.db.chunks.store_chunks(chunks, embeddings, user_id=user_id, document_id=document_id)
-            all_chunk_ids.extend(chunk_ids)
-        
-        print("DEBUG: About to create schedule")
-        # Create schedule for all chunks combined (learn, quiz, review)
-        schedule = scheduler.schedule_tasks(all_chunk_ids)
-        
-        # Store schedule in database
-        backend.db.schedule.store_schedule(schedule, user_id)
-        
-        return {
-            "status": "ok", 
-            "total_chunks": len(all_chunk_ids),
-            "total_pdfs": len(pdfs)
-        }
-        
+    except ValueError:
+        raise HTTPException(status_code=400, detail="study_days must be a JSON list.")
+    # The worker only schedules after every PDF is stored, so bad settings are rejected up front
+    if not isinstance(study_days_list, list) or not study_days_list or not all(
+            type(day) is int and 0 <= day <= 6 for day in study_days_list):
+        raise HTTPException(status_code=400, detail="study_days must be a non-empty list of weekdays 0-6.")
+    if intensity not in INTENSITY_MAP:
+        raise HTTPException(status_code=400, detail=f"intensity must be one of: {', '.join(INTENSITY_MAP)}.")
+    try:
+        job_id = str(uuid.uuid4())
+        files = await spool_uploads(queue, job_id, pdfs)
+        await asyncio.to_thread(queue.enqueue, "upload_batch", {
+            "class_id": class_id,
+            "study_days": study_days_list,
+            "intensity": intensity,
+            "files": files,
+        }, user_id, job_id)
+        return {"status": "queued", "job_id": job_id, "total_pdfs": len(pdfs)}
     except Exception as e:
-        print(e)
+        logger.exception("Failed to queue upload batch for user %s", user_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, user_id: str = Depends(verify_supabase_jwt), queue: JobQueue = Depends(get_job_queue)):
+    """Report the status and progress of one of the user's background jobs"""
+    job = await asyncio.to_thread(queue.get, job_id)
+    if job is None or job["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"],
+    }
+
+@app.get("/api/search")
+async def search_chunks(q: str, k: int = 10, class_id: Optional[str] = None, user_id: str = Depends(verify_supabase_jwt),
+                        db: Database = Depends(get_database)):
+    """
+    Semantic search over the user's chunks, optionally restricted to one class.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q is required.")
+    k = max(1, min(k, 50))
+    query_vector = (await get_ingestion_executor().embed_chunks([q]))[0]
+    index = await db.get_search_index(user_id)
+    try:
+        hits = index.search(query_vector, k=k, class_id=class_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=f"Search index does not match the embedding model: {e}")
+    texts = await db.get_chunk_texts([chunk_id for chunk_id, _ in hits], user_id)
+    return {"results": [
+        {"chunk_id": chunk_id, "score": score, "text": texts.get(chunk_id, "")}
+        for chunk_id, score in hits
+    ]}
+
 @app.get("/api/reviews/today")
-async def get_todays_reviews(user_id: str = Depends(verify_supabase_jwt)):
+async def get_todays_reviews(user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
     """Get today's review tasks for the user"""
     today = date.today().isoformat()
-    reviews = backend.db.reviews.get_todays_reviews(user_id, today)
+    reviews = await db.get_todays_reviews(user_id, today)
     return {"reviews": reviews}
 
 @app.post("/api/reviews/start")
-async def start_review_session(request: Request, user_id: str = Depends(verify_supabase_jwt)):
+async def start_review_session(request: Request, user_id: str = Depends(verify_supabase_jwt),
+                               db: Database = Depends(get_database), llm: LLMGateway = Depends(get_llm_gateway)):
     data = await request.json()
     chunk_id = data.get("chunk_id")
     task_type = data.get("type")
     if not chunk_id:
         raise HTTPException(status_code=400, detail="chunk_id is required.")
-    from backend.db.database import supabase
-    chunk_result = supabase.table("document_chunks").select("text").eq("id", chunk_id).single().execute()
-    chunk_text = ""
-    if hasattr(chunk_result, "data") and chunk_result.data:
-        chunk_text = chunk_result.data.get("text", "")
+    # Text and question pool come from the in-process cache; only a miss reads the database
+    chunk = await question_pools.get(db.get_chunk, chunk_id, user_id)
+    chunk_text = chunk["text"] if chunk else ""
     # AI-based quiz generation for both 'quiz' and 'review' tasks
     quiz_question = None
     if task_type in ("quiz", "review"):
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful study assistant. Generate a short quiz question based on the following study material. Make sure to generate a new, unique question each time."},
-                    {"role": "user", "content": chunk_text}
-                ],
-                max_tokens=60,
-                temperature=1.0 if task_type == "review" else 0.7
-            )
-            quiz_question = response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"[DEBUG] OpenAI quiz generation error: {e}")
-            quiz_question = "Write a short summary of this material."
+        if chunk is not None:
+            # Rotate through the chunk's pool, and queue a fresh pool once it is mostly served
+            quiz_question = question_pools.next_question(chunk)
+            refill_questions(request, chunk_id, chunk)
+        if quiz_question is None:
+            try:
+                quiz_question = await generate_question(llm, chunk_text, task_type)
+            except Exception as e:
+                print(f"[DEBUG] OpenAI quiz generation error: {e!r}")
+                quiz_question = "Write a short summary of this material."
     return {
         "chunk_text": chunk_text,
         "chunk_id": chunk_id,
@@ -167,26 +235,24 @@ async def start_review_session(request: Request, user_id: str = Depends(verify_s
     }
 
 @app.post("/api/reviews/complete")
-async def complete_review_session(request: Request, user_id: str = Depends(verify_supabase_jwt)):
+async def complete_review_session(request: Request, user_id: str = Depends(verify_supabase_jwt),
+                                  db: Database = Depends(get_database)):
     """Complete a review session"""
     data = await request.json()
     chunk_id = data.get("chunk_id")
     if not chunk_id:
         raise HTTPException(status_code=400, detail="chunk_id is required")
-    from backend.db.database import supabase
-    from datetime import date
     # Mark the learn task as completed
-    supabase.table("tasks").update({"completed": True}).eq("user_id", user_id).eq("chunk_id", chunk_id).eq("task_type", "learn").execute()
+    await db.complete_task(user_id, chunk_id, "learn")
     # Schedule a quiz for the next available day
     quiz_task = schedule_next_quiz(user_id, chunk_id, date.today())
-    next_day = find_next_available_slot(user_id, supabase, date.today())
-    quiz_task["scheduled_date"] = next_day.isoformat()
-    supabase.table("tasks").upsert(quiz_task).execute()
-    shift_tasks_forward(user_id, supabase, next_day)
+    quiz_day = await db.schedule_task(quiz_task, user_id, date.today())
+    await queue_question(request, db, user_id, chunk_id, quiz_day)
     return {"status": "completed", "chunk_id": chunk_id}
 
 @app.post("/api/quiz/submit")
-async def submit_quiz_answer(request: Request, user_id: str = Depends(verify_supabase_jwt)):
+async def submit_quiz_answer(request: Request, user_id: str = Depends(verify_supabase_jwt),
+                             db: Database = Depends(get_database), llm: LLMGateway = Depends(get_llm_gateway)):
     data = await request.json()
     chunk_id = data.get("chunk_id")
     answer = data.get("answer")
@@ -195,125 +261,124 @@ async def submit_quiz_answer(request: Request, user_id: str = Depends(verify_sup
     if not chunk_id or not answer:
         raise HTTPException(status_code=400, detail="chunk_id and answer are required.")
     try:
-        from backend.db.database import supabase
-        from datetime import date
-        chunk_result = supabase.table("document_chunks").select("text").eq("id", chunk_id).single().execute()
-        chunk_text = ""
-        if hasattr(chunk_result, "data") and chunk_result.data:
-            chunk_text = chunk_result.data.get("text", "")
-        # AI-based grading
-        ai_score = 0
-        ai_feedback = ""
-        try:
-            prompt = (
-                "You are an expert grader for short-answer quizzes. "
-                "Given the study material, quiz question, and student answer, respond ONLY with a valid JSON object on a single line, like this: {\"score\": 1, \"feedback\": \"Your feedback here.\"}. "
-                "Do not include any explanation or text outside the JSON.\n\n"
-                f"Study material: {chunk_text}\n"
-                f"Quiz question: {quiz_question or 'N/A'}\n"
-                f"Student answer: {answer}\n"
-                "Grade the student's answer as 1 (fully correct) or 0 (incorrect) and provide a brief feedback. Only use 1 or 0 for the score. If the answer is incorrect, use 'you' (second person) in your feedback."
-            )
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert grader for short-answer quizzes."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=150,
-                temperature=0.2
-            )
-            import json as pyjson
-            ai_result = response.choices[0].message.content.strip()
-            print(f"[DEBUG] Raw AI grading response: {ai_result}")
-            try:
-                ai_json = pyjson.loads(ai_result)
-            except Exception:
-                import re
-                print("[DEBUG] Failed to parse as JSON, trying regex extraction...")
-                match = re.search(r'\{.*\}', ai_result, re.DOTALL)
-                if match:
-                    try:
-                        ai_json = pyjson.loads(match.group(0))
-                    except Exception as e2:
-                        print(f"[DEBUG] Regex JSON extraction failed: {e2}")
-                        ai_json = {"score": 0, "feedback": "Quiz submitted! (AI grading unavailable)"}
-                else:
-                    print("[DEBUG] No JSON object found in AI response.")
-                    ai_json = {"score": 0, "feedback": "Quiz submitted! (AI grading unavailable)"}
-            ai_score = int(round(float(ai_json.get("score", 0))))
-            if ai_score not in (0, 1):
-                ai_score = 0
-            if ai_score == 1:
-                ai_feedback = "Correct!"
-            else:
-                ai_feedback = ai_json.get("feedback", "Submitted.")
-        except Exception as e:
-            print(f"[DEBUG] OpenAI grading error: {e}")
-            ai_feedback = "Quiz submitted! (AI grading unavailable)"
-            ai_score = 0
+        chunk = await question_pools.get(db.get_chunk, chunk_id, user_id)
+        chunk_text = chunk["text"] if chunk else ""
+        # Clearly wrong answers are graded locally; the rest go to the model
+        ai_score, ai_feedback = await grade_answer(
+            llm, pregrader, answer, quiz_question, chunk_text, chunk.get("embedding") if chunk else None,
+            embed_answers
+        )
+        if ai_feedback == UNAVAILABLE_FEEDBACK:
+            # Not graded: recording a 0 would count an outage as a lapse in the memory model, so the
+            # task stays open for another attempt and nothing is stored or scheduled
+            return {"feedback": ai_feedback, "score": ai_score, "graded": False}
+        today = date.today()
+        # Update the chunk's memory state before the answer is stored, so it is counted once
+        due_date = await db.review_chunk(user_id, chunk_id, ai_score, today)
         # Store the answer, score, and feedback
-        result = supabase.table("quiz_performance").insert({
-            "user_id": user_id,
-            "chunk_id": chunk_id,
-            "answer": answer,
-            "score": ai_score,
-            "feedback": ai_feedback,
-            "timestamp": datetime.utcnow().isoformat(),
-            "task_type": task_type or "quiz"
-        }).execute()
+        await db.store_quiz_result(user_id, chunk_id, answer, ai_score, ai_feedback, task_type or "quiz")
         # Mark the task as completed
-        supabase.table("tasks").update({"completed": True}).eq("user_id", user_id).eq("chunk_id", chunk_id).eq("task_type", task_type).execute()
+        await db.complete_task(user_id, chunk_id, task_type)
         # Next task scheduling logic
-        today = date.today()
         if task_type == "learn":
             # Schedule a quiz for the next available day
             quiz_task = schedule_next_quiz(user_id, chunk_id, today)
-            next_day = find_next_available_slot(user_id, supabase, today)
-            quiz_task["scheduled_date"] = next_day.isoformat()
-            supabase.table("tasks").upsert(quiz_task).execute()
-            shift_tasks_forward(user_id, supabase, next_day)
-        elif task_type == "quiz":
-            # Schedule a review, interval depends on correctness
+            quiz_day = await db.schedule_task(quiz_task, user_id, today)
+            await queue_question(request, db, user_id, chunk_id, quiz_day)
+        elif task_type in ("quiz", "review"):
+            # Schedule the next review for when the memory model expects recall to drop to the
+            # target retention: soon after a wrong answer, further out after each correct one
             review_task = schedule_next_review(user_id, chunk_id, ai_score == 1, today)
-            next_day = find_next_available_slot(user_id, supabase, today)
-            review_task["scheduled_date"] = next_day.isoformat()
-            supabase.table("tasks").upsert(review_task).execute()
-            shift_tasks_forward(user_id, supabase, next_day)
-        elif task_type == "review":
-            # Schedule another review only if incorrect
-            followup = schedule_followup_review(user_id, chunk_id, ai_score == 1, today)
-            if followup:
-                next_day = find_next_available_slot(user_id, supabase, today)
-                followup["scheduled_date"] = next_day.isoformat()
-                supabase.table("tasks").upsert(followup).execute()
-                shift_tasks_forward(user_id, supabase, next_day)
-        return {"feedback": ai_feedback, "score": ai_score}
+            review_day = await db.schedule_task(review_task, user_id, due_date)
+            await queue_question(request, db, user_id, chunk_id, review_day)
+        return {"feedback": ai_feedback, "score": ai_score, "graded": True}
     except Exception as e:
         print(f"Error storing quiz answer: {e}")
         raise HTTPException(status_code=500, detail="Failed to store quiz answer.")
 
+@app.post("/api/quiz/submit-batch")
+async def submit_quiz_batch(request: Request, user_id: str = Depends(verify_supabase_jwt),
+                            db: Database = Depends(get_database), llm: LLMGateway = Depends(get_llm_gateway)):
+    """
+    Grade and record a batch of answers, {"answers": [{chunk_id, answer, quiz_question, type}, ...]},
+    with one read of the uncached chunks, one insert of the results, one update per task type and
+    one scheduling pass for the follow-up tasks.
+    """
+    data = await request.json()
+    items = data.get("answers") or []
+    if not items or any(not item.get("chunk_id") or not item.get("answer") for item in items):
+        raise HTTPException(status_code=400, detail="answers must be a non-empty list with chunk_id and answer for each.")
+    chunk_ids = [item["chunk_id"] for item in items]
+    if len(set(chunk_ids)) != len(chunk_ids):
+        raise HTTPException(status_code=400, detail="Each chunk can only be answered once per batch.")
+    try:
+        chunks = await question_pools.get_many(db.get_chunks, chunk_ids, user_id)
+        entries = [chunks.get(chunk_id) for chunk_id in chunk_ids]
+        graded = await grade_answers(llm, pregrader, [
+            (item["answer"], item.get("quiz_question"), chunk["text"] if chunk else "", chunk["embedding"] if chunk else None)
+            for item, chunk in zip(items, entries)
+        ], embed_answers)
+        # Answers that could not be graded are left out, as in /api/quiz/submit
+        done = [i for i, (_, feedback) in enumerate(graded) if feedback != UNAVAILABLE_FEEDBACK]
+        done_ids = [chunk_ids[i] for i in done]
+        scores = [graded[i][0] for i in done]
+        task_types = [items[i].get("type") or "quiz" for i in done]
+        today = date.today()
+        # Update the memory states before the answers are stored, so they are counted once
+        due_dates = await db.review_chunks(user_id, done_ids, scores, today) if done else []
+        if done:
+            await db.store_quiz_results(user_id, [
+                {"chunk_id": chunk_ids[i], "answer": items[i]["answer"], "score": graded[i][0],
+                 "feedback": graded[i][1], "task_type": task_type}
+                for i, task_type in zip(done, task_types)
+            ])
+            await db.complete_tasks(user_id, list(zip(done_ids, task_types)))
+        # Follow-up tasks, as in /api/quiz/submit, placed together in one pass
+        placements = []
+        for chunk_id, score, due_date, task_type in zip(done_ids, scores, due_dates, task_types):
+            if task_type == "learn":
+                placements.append((schedule_next_quiz(user_id, chunk_id, today), today))
+            elif task_type in ("quiz", "review"):
+                placements.append((schedule_next_review(user_id, chunk_id, score == 1, today), due_date))
+        days = await db.schedule_tasks(placements, user_id) if placements else []
+        for (task, _), day in zip(placements, days):
+            await queue_question(request, db, user_id, task["chunk_id"], day)
+        return {"results": [
+            {"chunk_id": chunk_id, "score": score, "feedback": feedback, "graded": feedback != UNAVAILABLE_FEEDBACK}
+            for chunk_id, (score, feedback) in zip(chunk_ids, graded)
+        ]}
+    except Exception as e:
+        print(f"Error storing quiz answers: {e}")
+        raise HTTPException(status_code=500, detail="Failed to store quiz answers.")
+
+@app.get("/api/grading/stats")
+async def get_grading_stats(user_id: str = Depends(verify_supabase_jwt)):
+    """Report the pre-grading thresholds and how many answers were graded locally"""
+    return pregrader.stats()
+
 @app.get("/api/preferences")
-async def get_preferences(user_id: str = Depends(verify_supabase_jwt)):
-    prefs = get_user_preferences(user_id)
+async def get_preferences(user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
+    prefs = await db.get_user_preferences(user_id)
     return {"preferences": prefs}
 
 @app.post("/api/preferences")
-async def set_preferences(request: Request, user_id: str = Depends(verify_supabase_jwt)):
+async def set_preferences(request: Request, user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
     data = await request.json()
     study_days = data.get("study_days")
     intensity = data.get("intensity")
     if not isinstance(study_days, list) or not intensity:
         raise HTTPException(status_code=400, detail="study_days (list) and intensity (str) required")
-    success = set_user_preferences(user_id, study_days, intensity)
+    success = await db.set_user_preferences(user_id, study_days, intensity)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to set preferences")
+    try:
+        # Move the open reviews onto the new study days, at the dates the memory model has them due
+        await db.reschedule_reviews(user_id, date.today())
+    except Exception as e:
+        print(f"Error rescheduling reviews: {e}")
     return {"status": "ok"}
 
 @app.get("/api/tasks")
-async def get_tasks(start: str, end: str, user_id: str = Depends(verify_supabase_jwt)):
-    from backend.db.database import supabase
-    result = supabase.table("tasks").select(
-        "id, chunk_id, scheduled_date, task_type, completed"
-    ).eq("user_id", user_id).gte("scheduled_date", start).lte("scheduled_date", end).execute()
-    return {"tasks": result.data if hasattr(result, "data") else []}
\ No newline at end of file
+async def get_tasks(start: str, end: str, user_id: str = Depends(verify_supabase_jwt), db: Database = Depends(get_database)):
+    tasks = await db.get_tasks(user_id, start, end)
+    return {"tasks": tasks}
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+worker.py
+
+Worker processes for the background job queue (backend/core/jobs.py).
+
+Start alongside the API, on the same machine (they share the queue file and spool directory):
+
+    PYTHONPATH=. python -m backend.worker --processes 4
+
+Each process runs one job at a time, with the PDFs of an upload batch still processed
+concurrently inside it; more processes take more jobs at once. Every process also enqueues the
+periodic 'pregenerate_questions' job, which stores questions for tomorrow's quiz and review tasks;
+the queue keeps one such job per QUESTION_PREGEN_INTERVAL, so one worker runs each scan.
+Configured through JOB_WORKERS (number of processes when --processes is not given, default: 1)
+and the JOB_* variables of backend/core/jobs.py.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+from functools import partial
+
+from backend.core.ingestion import get_ingestion_executor
+from backend.core.jobs import get_job_queue, run_periodic, run_worker
+from backend.core.llm import close_llm_gateway, get_llm_gateway
+from backend.core.questions import QUESTION_PREGEN_INTERVAL, QuestionPregenerator, run_question_scan
+from backend.core.uploads import run_upload_batch
+from backend.db.access import Database
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+
+
+async def run_jobs(queue, db):
+    """
+    Runs jobs, and enqueues the periodic ones, until cancelled.
+    """
+    pregenerator = QuestionPregenerator(get_llm_gateway(), db.get_chunks_needing_questions, db.set_chunk_questions,
+                                        interval=None)
+    handlers = {
+        "upload_batch": partial(run_upload_batch, queue=queue, db=db),
+        "pregenerate_questions": partial(run_question_scan, pregenerator=pregenerator),
+    }
+    periodic = asyncio.create_task(run_periodic(queue, "pregenerate_questions", QUESTION_PREGEN_INTERVAL))
+    try:
+        await run_worker(queue, handlers)
+    finally:
+        periodic.cancel()
+        await close_llm_gateway()
+
+
+def run_process():
+    """
+    Runs jobs in this process until it is interrupted.
+    """
+    queue = get_job_queue()
+    db = Database()
+    print(f"Worker {os.getpid()} waiting for jobs in {queue.path}")
+    try:
+        asyncio.run(run_jobs(queue, db))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        get_ingestion_executor().shutdown(wait=False)
+        db.shutdown(wait=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run background job workers.")
+    parser.add_argument("--processes", type=int, default=JOB_WORKERS, help="number of worker processes")
+    args = parser.parse_args(argv)
+    if args.processes <= 1:
+        run_process()
+        return
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_process, name=f"worker-{i}") for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
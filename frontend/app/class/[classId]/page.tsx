@@ -3,6 +3,9 @@ import { useEffect, useState, useRef } from "react";
 import { useRouter, useParams } from "next/navigation";
 
 const backendUrl = process.env.NEXT_PUBLIC_BACKEND_URL;
+// Upload jobs are polled every JOB_POLL_MS until they finish or JOB_POLL_ATTEMPTS polls have gone by
+const JOB_POLL_MS = 2000;
+const JOB_POLL_ATTEMPTS = 900;
 
 interface Class {
   id: string;
@@ -67,6 +70,21 @@ export default function ClassDetailPage() {
         body: formData,
       });
       if (!res.ok) throw new Error("Upload failed");
+      // The PDFs are processed in the background; wait for the job to finish
+      const { job_id } = await res.json();
+      let finished = false;
+      for (let attempt = 0; attempt < JOB_POLL_ATTEMPTS && !finished; attempt++) {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+        const jobRes = await fetch(`${backendUrl}/api/jobs/${job_id}`, {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (jobRes.status === 404) throw new Error("Upload job not found");
+        if (!jobRes.ok) throw new Error("Upload failed");
+        const job = await jobRes.json();
+        if (job.status === "failed") throw new Error(job.error || "Upload failed");
+        finished = job.status === "done";
+      }
+      if (!finished) throw new Error("Upload is still processing; check back later");
       setSelectedFiles([]);
       if (fileInputRef.current) fileInputRef.current.value = "";
     } catch (err: unknown) {
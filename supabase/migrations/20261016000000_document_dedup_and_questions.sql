@@ -0,0 +1,12 @@
+-- Columns used by upload deduplication (backend/db/chunks.py) and stored quiz questions.
+
+-- SHA-256 of the uploaded PDF, so a repeat upload reuses the earlier document's chunks
+alter table documents add column if not exists content_hash text;
+create index if not exists documents_content_hash_idx on documents (content_hash);
+
+-- Near-duplicate chunks point at their cluster's representative chunk
+alter table document_chunks add column if not exists duplicate_of uuid
+    references document_chunks (id) on delete set null;
+
+-- Pregenerated quiz questions, a JSON array of strings
+alter table document_chunks add column if not exists questions jsonb;
@@ -0,0 +1,28 @@
+-- Bulk updates used by backend/db/chunks.py. Each call writes every row in one statement; an
+-- upsert of partial rows would fail the NOT NULL checks of document_chunks.
+
+-- updates: [{"id": <chunk id>, "questions": [<question>, ...]}, ...]
+create or replace function set_chunk_questions(updates jsonb)
+returns void
+language sql
+as $$
+    update document_chunks c
+    set questions = u.questions
+    from jsonb_to_recordset(updates) as u (id uuid, questions jsonb)
+    where c.id = u.id;
+$$;
+
+-- links: [{"id": <duplicate chunk id>, "duplicate_of": <representative chunk id>}, ...]
+create or replace function link_duplicate_chunks(links jsonb, owner uuid)
+returns void
+language sql
+as $$
+    update document_chunks c
+    set duplicate_of = l.duplicate_of
+    from jsonb_to_recordset(links) as l (id uuid, duplicate_of uuid)
+    where c.id = l.id and c.user_id = owner;
+$$;
+
+-- Only the backend, with the service role key, writes through these
+revoke execute on function set_chunk_questions(jsonb) from public, anon, authenticated;
+revoke execute on function link_duplicate_chunks(jsonb, uuid) from public, anon, authenticated;
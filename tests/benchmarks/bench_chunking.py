@@ -0,0 +1,72 @@
+"""
+bench_chunking.py
+
+Benchmarks the Chunker on synthetic texts and on tests/files/test.pdf.
+
+For each input it reports throughput (chars/sec) from an untraced run, and the net number of
+allocated blocks and the peak traced memory from a second run under tracemalloc.
+
+Run with: PYTHONPATH=. python tests/benchmarks/bench_chunking.py [sizes in MB ...]
+Defaults to 1 10 100.
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from backend.core.chunking import Chunker
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), "..", "files", "test.pdf")
+
+WORDS = ["the", "memory", "spaced", "repetition", "retrieval", "practice", "cortex",
+         "hippocampus", "interval", "a", "of", "consolidation", "encoding", "schema"]
+
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    """
+    Builds roughly size_bytes of paragraphs with a realistic mix of short and very long paragraphs.
+    """
+    rng = random.Random(seed)
+    paragraphs = []
+    total = 0
+    while total < size_bytes:
+        n_words = rng.choice([5, 40, 120, 400, 2000])
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(n_words))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(label: str, run, n_chars: int):
+    start = time.perf_counter()
+    chunks = run()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    rate = n_chars / elapsed if elapsed else float("inf")
+    print(f"{label:>14}  {n_chars:>12,} chars  {len(chunks):>8,} chunks  "
+          f"{elapsed:8.3f} s  {rate:>14,.0f} chars/s  "
+          f"{allocations:>10,} blocks  {peak / 1e6:8.1f} MB peak")
+
+
+def main(sizes_mb):
+    chunker = Chunker(max_chars=1000, min_chars=100)
+    for size_mb in sizes_mb:
+        text = synthetic_text(int(size_mb * 1024 * 1024))
+        measure(f"synthetic {size_mb:g}MB", lambda: chunker.chunk_merged_paragraphs(text), len(text))
+
+    pdf_text = chunker.extract_text(TEST_PDF)
+    measure("test.pdf", lambda: list(chunker.iter_chunks(chunker.iter_paragraphs(TEST_PDF))), len(pdf_text))
+
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or [1, 10, 100])
@@ -0,0 +1,38 @@
+"""
+bench_scheduling.py
+
+Benchmarks Scheduler.schedule_columns (the columnar schedule) and Scheduler.schedule_tasks
+(the list of task dicts stored by /upload-batch) for increasing numbers of chunks.
+
+Run with: PYTHONPATH=. python tests/benchmarks/bench_scheduling.py [chunk counts ...]
+Defaults to 1000 10000 100000 1000000.
+"""
+
+import sys
+import time
+from datetime import date
+
+from backend.core.scheduling import Scheduler, UserPreferences
+
+
+def best_of(run, repeats: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(counts):
+    scheduler = Scheduler("bench", UserPreferences(study_days=[0, 2, 4], intensity="medium"))
+    start_date = date(2024, 1, 1)
+    for n in counts:
+        chunk_ids = [f"chunk-{i}" for i in range(n)]
+        columns = best_of(lambda: scheduler.schedule_columns(n, start_date))
+        tasks = best_of(lambda: scheduler.schedule_tasks(chunk_ids, start_date))
+        print(f"{n:>10,} chunks  columns {columns * 1e3:9.2f} ms  tasks {tasks * 1e3:9.2f} ms")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000])
@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+# Without an OpenAI key, embed with the local hashing backend so the suite runs offline,
+# and keep the tests from reading or writing the shared on-disk embedding cache.
+if not os.getenv("OPENAI_API_KEY"):
+    os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+# The job queue file also holds the change counters shared between processes; keep it out of ~/.cache
+os.environ.setdefault("JOB_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="jobs-"), "jobs.sqlite3"))
+
+# The API modules read their Supabase and OpenAI settings at import. Placeholders let the tests
+# import them; handler tests run against backend.db.memory.InMemoryDatabase, not a real project.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("SUPABASE_PROJECT_ID", "test")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret")
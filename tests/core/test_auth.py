@@ -0,0 +1,79 @@
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from backend.db import auth
+from backend.db.auth import verify_supabase_jwt
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    auth._token_cache.clear()
+    yield
+    auth._token_cache.clear()
+
+def _token(secret="test-secret", audience="authenticated", expires_in=3600, sub="u1"):
+    claims = {"sub": sub, "aud": audience, "exp": int(time.time()) + expires_in}
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+def _status(token):
+    with pytest.raises(HTTPException) as e:
+        verify_supabase_jwt(f"Bearer {token}")
+    return e.value.status_code
+
+def test_valid_token_is_accepted_locally(monkeypatch):
+    """ Tests that an HS256 token signed with the project secret yields its subject without calling Supabase. """
+    assert auth.SUPABASE_JWT_SECRET == "test-secret"
+    monkeypatch.setattr(auth, "_verify_with_supabase", lambda token: pytest.fail("Supabase was called"))
+    assert verify_supabase_jwt(f"Bearer {_token(sub='user-42')}") == "user-42"
+
+def test_expired_token_is_rejected():
+    """ Tests that an expired token is answered with 401. """
+    assert _status(_token(expires_in=-60)) == 401
+
+def test_token_with_bad_signature_is_rejected():
+    """ Tests that a token signed with another secret is answered with 401. """
+    assert _status(_token(secret="other-secret")) == 401
+
+def test_token_for_wrong_audience_is_rejected():
+    """ Tests that a token issued for another audience is answered with 401. """
+    assert _status(_token(audience="anon")) == 401
+
+def test_missing_bearer_prefix_is_rejected():
+    """ Tests that an Authorization header without the Bearer scheme is answered with 401. """
+    with pytest.raises(HTTPException) as e:
+        verify_supabase_jwt(_token())
+    assert e.value.status_code == 401
+
+def test_cached_token_skips_decoding(monkeypatch):
+    """ Tests that a token verified once is answered from the cache without being decoded again. """
+    decoded = []
+    verify_locally = auth._verify_locally
+
+    def counting_verify_locally(token):
+        decoded.append(token)
+        return verify_locally(token)
+
+    monkeypatch.setattr(auth, "_verify_locally", counting_verify_locally)
+    token = _token()
+    assert verify_supabase_jwt(f"Bearer {token}") == "u1"
+    assert verify_supabase_jwt(f"Bearer {token}") == "u1"
+    assert decoded == [token]
+
+def test_falls_back_to_supabase_without_signing_key(monkeypatch):
+    """ Tests that a token is checked with Supabase when no secret is set and the JWKS has no key for it. """
+    class NoKeys:
+        def get_signing_key_from_jwt(self, token):
+            raise jwt.PyJWKClientError("Unable to find a signing key")
+
+    remote = []
+    monkeypatch.setattr(auth, "SUPABASE_JWT_SECRET", None)
+    monkeypatch.setattr(auth, "_jwks_client", NoKeys())
+    monkeypatch.setattr(auth, "_verify_with_supabase", lambda token: remote.append(token) or "remote-user")
+    token = _token()
+    assert verify_supabase_jwt(f"Bearer {token}") == "remote-user"
+    assert verify_supabase_jwt(f"Bearer {token}") == "remote-user"
+    assert remote == [token]
+
+# Run with: PYTHONPATH=. pytest tests/core/test_auth.py
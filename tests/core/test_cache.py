@@ -0,0 +1,30 @@
+from backend.core.cache import LRUCache, TTLCache
+
+def test_lru_cache_evicts_least_recently_used():
+    """ Tests that the LRU cache keeps recently used entries and counts hits and misses. """
+    cache = LRUCache(max_items=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_ttl_cache_expires_entries():
+    """ Tests that TTL entries expire on the cache clock and per-entry TTLs are honoured. """
+    now = [0.0]
+    cache = TTLCache(max_items=10, ttl=10, clock=lambda: now[0])
+    cache.put("default", "x")
+    cache.put("short", "y", ttl=1)
+    now[0] = 5
+    assert cache.get("default") == "x"
+    assert cache.get("short") is None
+    now[0] = 10
+    assert cache.get("default") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+    assert len(cache) == 0
+
+# Run with: PYTHONPATH=. pytest tests/core/test_cache.py
@@ -1,4 +1,5 @@
 import os
+import random
 import pytest
 from backend.core.chunking import Chunker
 
@@ -46,4 +47,71 @@ def test_chunker_pdf_chunking():
     # Chunks should not be too small
     assert all(len(c) >= 50 for c in chunks)
 
+def test_iter_chunks_matches_chunk_merged_paragraphs():
+    """ Tests that streaming chunking produces the same chunks as chunking the full text. """
+    chunker = Chunker(max_chars=300, min_chars=50)
+    text = chunker.extract_text(TEST_PDF)
+    streamed = list(chunker.iter_chunks(chunker.iter_paragraphs(TEST_PDF)))
+    assert streamed == chunker.chunk_merged_paragraphs(text)
+    assert list(chunker.iter_chunks(SAMPLE_TEXT.split("\n\n"))) == chunker.chunk_merged_paragraphs(SAMPLE_TEXT)
+
+def test_iter_paragraphs_is_lazy():
+    """ Tests that paragraphs and chunks are yielded before the whole document is parsed. """
+    chunker = Chunker(max_chars=300, min_chars=50)
+    with open(TEST_PDF, "rb") as f:
+        paragraphs = chunker.iter_paragraphs(f)
+        first = next(chunker.iter_chunks(paragraphs))
+    assert len(first) >= 50
+    assert "\n" not in first
+
+def _reference_chunks(text, max_chars, min_chars):
+    """ The original character-by-character chunking algorithm, kept to check the linear one against. """
+    paragraphs = [p.strip() for p in text.split('\n\n') if len(p.strip()) >= min_chars]
+    chunks = []
+    for paragraph in paragraphs:
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+        idx = 0
+        while idx < len(paragraph):
+            end = min(idx + max_chars, len(paragraph))
+            split_at = end
+            for j in range(end - 1, idx - 1, -1):
+                if paragraph[j] in (" ", "\n"):
+                    split_at = j + 1
+                    break
+            chunks.append(paragraph[idx:split_at].strip())
+            idx = split_at
+    merged = []
+    current = ""
+    for chunk in chunks:
+        if len(current) == 0:
+            current = chunk
+        elif len(current) + 1 + len(chunk) <= max_chars:
+            current = current + " " + chunk
+        else:
+            merged.append(current.strip())
+            current = chunk
+    if current:
+        merged.append(current.strip())
+    return merged
+
+def test_linear_chunking_matches_reference():
+    """ Tests that the single-pass chunker produces exactly the original chunks on random text. """
+    rng = random.Random(0)
+    alphabet = ["word", "a", "longerword", "x" * 40, " ", "  ", "\n", "\n\n", ".", "\t"]
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 400)))
+        max_chars = rng.randint(5, 120)
+        min_chars = rng.randint(0, max_chars)
+        chunker = Chunker(max_chars=max_chars, min_chars=min_chars)
+        assert chunker.chunk_merged_paragraphs(text) == _reference_chunks(text, max_chars, min_chars)
+
+def test_chunker_records_stats():
+    """ Tests that chunking records paragraph and chunk counts instead of printing them. """
+    chunker = Chunker(max_chars=50, min_chars=10)
+    chunks = chunker.chunk_merged_paragraphs(SAMPLE_TEXT)
+    assert chunker.stats["chunks"] == len(chunks)
+    assert chunker.stats["paragraphs"] == 2
+
 # Run with: PYTHONPATH=. pytest tests/core/test_chunking.py
\ No newline at end of file
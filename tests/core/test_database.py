@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from backend.core.generations import Generations
+from backend.db import chunks, reviews
+from backend.db.access import Database, get_database
+from backend.db.auth import verify_supabase_jwt
+from backend.db.memory import InMemoryDatabase
+from backend.main import app
+from tests.core.test_scheduling import FakeSupabase
+
+def _client(db):
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    return TestClient(app)
+
+def test_database_runs_calls_off_the_event_loop():
+    """ Tests that blocking calls run concurrently on the pool instead of on the event loop thread. """
+    db = Database(workers=4)
+
+    def blocking_call():
+        time.sleep(0.2)
+        return threading.current_thread().name
+
+    async def main():
+        start = time.perf_counter()
+        names = await asyncio.gather(*(db.run(blocking_call) for _ in range(4)))
+        return names, time.perf_counter() - start
+
+    try:
+        names, elapsed = asyncio.run(main())
+    finally:
+        db.shutdown()
+    assert elapsed < 0.6
+    assert all(name.startswith("db") for name in names)
+
+def test_handlers_use_the_injected_database():
+    """ Tests that class, preference and task endpoints read and write through the injected database. """
+    db = InMemoryDatabase()
+    client = _client(db)
+    try:
+        response = client.post("/api/preferences", json={"study_days": [0, 1, 2, 3, 4, 5, 6], "intensity": "light"})
+        assert response.status_code == 200
+        assert client.get("/api/preferences").json()["preferences"]["intensity"] == "light"
+
+        asyncio.run(db.create_class("u1", "Biology"))
+        asyncio.run(db.create_class("u2", "Chemistry"))
+        assert [c["name"] for c in client.get("/api/classes").json()["classes"]] == ["Biology"]
+
+        today = date.today().isoformat()
+        db.tasks.append({"id": "t1", "user_id": "u1", "chunk_id": "c1", "scheduled_date": today,
+                         "task_type": "learn", "completed": False})
+        assert [t["id"] for t in client.get("/api/reviews/today").json()["reviews"]] == ["t1"]
+
+        assert client.post("/api/reviews/complete", json={"chunk_id": "c1"}).status_code == 200
+        assert db.tasks[0]["completed"]
+        quiz = [t for t in db.tasks if t["task_type"] == "quiz"]
+        assert len(quiz) == 1 and quiz[0]["scheduled_date"] == today
+
+        tasks = client.get("/api/tasks", params={"start": today, "end": today}).json()["tasks"]
+        assert {t["task_type"] for t in tasks} == {"learn", "quiz"}
+    finally:
+        app.dependency_overrides.clear()
+
+def test_in_memory_schedule_task_respects_capacity():
+    """ Tests that the in-memory database fills a light day (two tasks) before moving to the next study day. """
+    db = InMemoryDatabase()
+    asyncio.run(db.set_user_preferences("u1", [0, 2], "light"))
+    monday = date(2024, 1, 1)
+    days = [asyncio.run(db.schedule_task({"user_id": "u1", "chunk_id": f"c{i}", "task_type": "quiz"}, "u1", monday))
+            for i in range(3)]
+    assert days == [monday, monday, date(2024, 1, 3)]
+
+def test_in_memory_review_chunk_replays_history_once():
+    """ Tests that the in-memory database builds the memory model from stored answers before updating it. """
+    db = InMemoryDatabase()
+    asyncio.run(db.store_quiz_result("u1", "c1", "answer", 1, "Correct!", "quiz"))
+    db.quiz_results[0]["timestamp"] = "2024-01-01T09:00:00"
+    due = asyncio.run(db.review_chunk("u1", "c1", 1, date(2024, 1, 5)))
+    assert due > date(2024, 1, 9)
+
+def test_find_document_by_hash_matches_owner_or_class_only(monkeypatch):
+    """ Tests that a repeat upload is found through its user or class, and a class ID cannot widen the filter. """
+    db = FakeSupabase({"documents": [
+        {"id": "mine", "pdf_path": "a.pdf", "content_hash": "h1", "user_id": "u1", "class_id": "c9"},
+        {"id": "classmate", "pdf_path": "b.pdf", "content_hash": "h2", "user_id": "u2", "class_id": "c1"},
+        {"id": "stranger", "pdf_path": "c.pdf", "content_hash": "h3", "user_id": "u3", "class_id": "c3"},
+    ]})
+    monkeypatch.setattr(chunks, "supabase", db)
+    assert chunks.find_document_by_hash("h1", "u1", "c1")["id"] == "mine"
+    assert chunks.find_document_by_hash("h2", "u1", "c1")["id"] == "classmate"
+    assert chunks.find_document_by_hash("h3", "u1", "c1,user_id.eq.u3") is None
+    assert chunks.find_document_by_hash("h2", "u1", None) is None
+
+class RecordingRpc:
+    """ Records Supabase RPC calls. """
+    def __init__(self):
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
+
+def test_chunk_updates_are_written_in_one_call(monkeypatch):
+    """ Tests that question pools and duplicate links for many chunks are each sent as a single bulk update. """
+    db = RecordingRpc()
+    monkeypatch.setattr(chunks, "supabase", db)
+    chunks.set_chunk_questions({"c1": ["Why?"], "c2": ["How?", "When?"]})
+    chunks.link_duplicate_chunks({"c1": ["c3", "c4"], "c2": ["c5"], "c6": []}, "u1")
+    chunks.set_chunk_questions({})
+    chunks.link_duplicate_chunks({"c6": []}, "u1")
+    assert db.calls == [
+        ("set_chunk_questions", {"updates": [{"id": "c1", "questions": ["Why?"]}, {"id": "c2", "questions": ["How?", "When?"]}]}),
+        ("link_duplicate_chunks", {"owner": "u1", "links": [{"id": "c3", "duplicate_of": "c1"},
+                                                            {"id": "c4", "duplicate_of": "c1"},
+                                                            {"id": "c5", "duplicate_of": "c2"}]}),
+    ]
+
+def test_memory_model_is_replayed_after_another_process_stores_answers(tmp_path, monkeypatch):
+    """ Tests that a cached memory model survives this process's answers but is replayed after another process's. """
+    path = str(tmp_path / "generations.sqlite3")
+    db = FakeSupabase({"quiz_performance": []})
+    monkeypatch.setattr(reviews, "supabase", db)
+    monkeypatch.setattr(reviews, "memory_generations", Generations(path))
+    reviews.memory_models.pop("u1")
+    monday = date(2024, 1, 1)
+
+    model = reviews.get_memory_model("u1")
+    first_due = reviews.review_chunk("u1", "c1", 1, monday)
+    reviews.store_quiz_result("u1", "c1", "answer", 1, "Correct!", "quiz")
+    assert reviews.get_memory_model("u1") is model
+    assert db.queries.count("quiz_performance") == 2
+
+    # What another API process answering c2 does, through its own connection
+    db.tables["quiz_performance"].append({"user_id": "u1", "chunk_id": "c2", "score": 1,
+                                          "timestamp": "2024-01-01T10:00:00"})
+    db.tables["quiz_performance"][0]["timestamp"] = "2024-01-01T09:00:00"
+    Generations(path).bump("memory:u1")
+    replayed = reviews.get_memory_model("u1")
+    assert replayed is not model
+    assert "c1" in replayed and "c2" in replayed
+    # The second review of c1 builds on the first, whichever process handled it
+    assert reviews.review_chunk("u1", "c1", 1, first_due) > first_due + (first_due - monday)
+    reviews.memory_models.pop("u1")
+
+# Run with: PYTHONPATH=. pytest tests/core/test_database.py
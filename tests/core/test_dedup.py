@@ -0,0 +1,28 @@
+import numpy as np
+from backend.core.dedup import collapse_near_duplicates, find_representatives
+
+def test_find_representatives_clusters_near_duplicates():
+    """ Tests that near-identical rows share the earliest row as representative. """
+    rng = np.random.default_rng(0)
+    base = rng.standard_normal((3, 64)).astype(np.float32)
+    noisy = base + 0.001 * rng.standard_normal((3, 64)).astype(np.float32)
+    # Order: a, b, a', c, b'
+    vectors = np.stack([base[0], base[1], noisy[0], base[2], noisy[1]])
+    assert find_representatives(vectors, threshold=0.99).tolist() == [0, 1, 0, 3, 1]
+
+def test_find_representatives_blocked_matches_unblocked():
+    """ Tests that the blocked similarity computation gives the same clusters as one block. """
+    rng = np.random.default_rng(1)
+    base = rng.standard_normal((40, 16)).astype(np.float32)
+    vectors = np.concatenate([base, base[::2] + 0.001])
+    assert np.array_equal(find_representatives(vectors, 0.99, block_size=7),
+                          find_representatives(vectors, 0.99, block_size=1024))
+
+def test_collapse_near_duplicates_covers_every_chunk():
+    """ Tests that each chunk appears exactly once and representatives keep input order. """
+    vectors = np.array([[1, 0], [0, 1], [1, 0.001], [1, 0]], dtype=np.float32)
+    clusters = collapse_near_duplicates(["a", "b", "c", "d"], vectors, threshold=0.99)
+    assert clusters == {"a": ["c", "d"], "b": []}
+    assert collapse_near_duplicates([], np.empty((0, 2), dtype=np.float32)) == {}
+
+# Run with: PYTHONPATH=. pytest tests/core/test_dedup.py
@@ -1,4 +1,5 @@
 import os
+import numpy as np
 import pytest
 from backend.core.embedding import embed_chunks, embed_pdf
 
@@ -10,25 +11,31 @@ SAMPLE_CHUNKS = [
 TEST_PDF = os.path.join(os.path.dirname(__file__), "..", "files", "test.pdf")
 
 def test_embed_chunks_returns_vectors():
-    """ Tests that embeddings are vectors. """
+    """ Tests that embeddings are returned as a contiguous float32 matrix. """
     vectors = embed_chunks(SAMPLE_CHUNKS)
-    assert isinstance(vectors, list)
-    assert len(vectors) == len(SAMPLE_CHUNKS)
-    # Each embedding should be a list of floats
-    assert all(isinstance(vec, list) for vec in vectors)
-    assert all(isinstance(x, float) for vec in vectors for x in vec)
+    assert isinstance(vectors, np.ndarray)
+    assert vectors.dtype == np.float32
+    assert vectors.flags["C_CONTIGUOUS"]
+    assert vectors.shape[0] == len(SAMPLE_CHUNKS)
+
+def test_embed_chunks_compact_options():
+    """ Tests that float16 and reduced-dimension embeddings can be requested. """
+    half = embed_chunks(SAMPLE_CHUNKS, dtype=np.float16, dimensions=64)
+    assert half.dtype == np.float16
+    assert half.shape == (len(SAMPLE_CHUNKS), 64)
+    assert embed_chunks([]).shape[0] == 0
 
 def test_embed_pdf_pipeline_runs():
-    """ Tests that the full pipeline of text extraction, chunking, and embedding runs without errors and returns valid list of floats."""
+    """ Tests that the full pipeline of text extraction, chunking, and embedding runs without errors and returns a float32 matrix."""
     # This will run the full pipeline: extract, chunk, embed
     chunks, vectors = embed_pdf(TEST_PDF, chunker_args={"max_chars": 300, "min_chars": 50})
     assert isinstance(chunks, list)
-    assert isinstance(vectors, list)
+    assert isinstance(vectors, np.ndarray)
     assert len(chunks) == len(vectors)
     # Chunks should not be empty
     assert all(len(c) > 0 for c in chunks)
-    # Embeddings should be lists of floats
-    assert all(isinstance(vec, list) for vec in vectors)
-    assert all(isinstance(x, float) for vec in vectors for x in vec)
+    # Embeddings should be a float32 matrix
+    assert vectors.dtype == np.float32
+    assert vectors.ndim == 2
 
 # Run with: PYTHONPATH=. pytest tests/core/test_embedding.py
\ No newline at end of file
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from backend.core.embedding import embed_chunks
+from backend.core.embedding_backends import EmbeddingBackend, get_backend, register_backend
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    """ Tests that the local hashing backend returns stable unit vectors of the requested size. """
+    backend = get_backend("hashing")
+    first = backend.embed(["spaced repetition works", ""], "hashing-64")
+    second = backend.embed(["spaced repetition works"], "hashing-64")
+    assert first.shape == (2, 64)
+    assert first.dtype == np.float32
+    assert np.array_equal(first[0], second[0])
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+    # Empty text has no features
+    assert not any(first[1])
+
+def test_hashing_backend_reflects_overlap():
+    """ Tests that texts sharing words are closer than unrelated texts. """
+    a, b, c = get_backend("hashing").embed(
+        ["the hippocampus consolidates memory", "memory is consolidated by the hippocampus", "photosynthesis in plants"],
+        "hashing-384",
+    )
+    assert np.dot(a, b) > np.dot(a, c)
+
+def test_backend_registry():
+    """ Tests that registered backends are used by embed_chunks and created once per process, and incomplete ones refused. """
+    created = []
+
+    class ConstantBackend(EmbeddingBackend):
+        name = "constant"
+        default_model = "constant-1"
+
+        def __init__(self):
+            created.append(self)
+
+        def embed(self, texts, model, dimensions=None):
+            return [[1.0] for _ in texts]
+
+    class IncompleteBackend(EmbeddingBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+    register_backend("constant", ConstantBackend)
+    assert embed_chunks(["a", "b"], backend="constant", use_cache=False).tolist() == [[1.0], [1.0]]
+    assert embed_chunks(["c"], backend="constant", use_cache=False).tolist() == [[1.0]]
+    assert len(created) == 1
+    with pytest.raises(ValueError):
+        get_backend("missing")
+
+# Run with: PYTHONPATH=. pytest tests/core/test_embedding_backends.py
@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from backend.core.embedding_batcher import EmbeddingBatcher, pack_batches
+
+class FakeRateLimit(Exception):
+    pass
+
+def test_pack_batches_respects_limits():
+    """ Tests that batches stay within the token and input budgets and cover every input in order. """
+    batches = pack_batches([4, 4, 4, 10, 1, 1, 1], max_tokens=8, max_inputs=2)
+    assert batches == [(0, 2), (2, 3), (3, 4), (4, 6), (6, 7)]
+    # An input larger than the budget still gets a batch of its own
+    assert pack_batches([100], max_tokens=8, max_inputs=2) == [(0, 1)]
+    assert pack_batches([], max_tokens=8, max_inputs=2) == []
+
+def test_batcher_keeps_order_under_concurrency():
+    """ Tests that concurrently sent batches are merged back in input order. """
+    in_flight = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def request(texts, model):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        # Later batches finish first
+        time.sleep(0.05 / (1 + int(texts[0])))
+        with lock:
+            in_flight["now"] -= 1
+        return [[float(t)] for t in texts]
+
+    texts = [str(i) for i in range(20)]
+    batcher = EmbeddingBatcher(request, max_tokens=1000, max_inputs=3, concurrency=3)
+    assert batcher.embed(texts, "model").tolist() == [[float(i)] for i in range(20)]
+    assert 1 < in_flight["peak"] <= 3
+
+def test_batcher_backs_off_on_rate_limit():
+    """ Tests that retryable errors are retried with growing delays and then succeed. """
+    calls = {"n": 0}
+    sleeps = []
+
+    def request(texts, model):
+        calls["n"] += 1
+        if calls["n"] <= 2:
+            raise FakeRateLimit("429")
+        return [[1.0] for _ in texts]
+
+    batcher = EmbeddingBatcher(request, retryable=(FakeRateLimit,), base_delay=1.0, sleep=sleeps.append)
+    assert batcher.embed(["a", "b"], "model").tolist() == [[1.0], [1.0]]
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+def test_batcher_gives_up_after_max_retries():
+    """ Tests that a persistent rate limit is eventually raised. """
+    def request(texts, model):
+        raise FakeRateLimit("429")
+
+    batcher = EmbeddingBatcher(request, retryable=(FakeRateLimit,), max_retries=3, sleep=lambda s: None)
+    with pytest.raises(FakeRateLimit):
+        batcher.embed(["a"], "model")
+
+# Run with: PYTHONPATH=. pytest tests/core/test_embedding_batcher.py
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import backend.core.embedding as embedding
+from backend.core.embedding_cache import EmbeddingCache, text_hash
+
+MODEL = "text-embedding-3-small"
+
+def test_cache_round_trip(tmp_path):
+    """ Tests that stored vectors are returned from memory and from disk. """
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path=path)
+    cache.put_many(MODEL, [(text_hash("a"), [0.5, 0.25]), (text_hash("b"), [1.0, 2.0])])
+    assert cache.get_many(MODEL, [text_hash("a")])[text_hash("a")].tolist() == [0.5, 0.25]
+    cache.close()
+
+    # A fresh cache has an empty memory layer, so this hit comes from SQLite
+    reopened = EmbeddingCache(path=path)
+    found = reopened.get_many(MODEL, [text_hash("a"), text_hash("b"), text_hash("c")])
+    assert {h: v.tolist() for h, v in found.items()} == {text_hash("a"): [0.5, 0.25], text_hash("b"): [1.0, 2.0]}
+    assert reopened.stats()["hits"] == 2
+    assert reopened.stats()["misses"] == 1
+    # Vectors are keyed by model as well as text
+    assert reopened.get_many("other-model", [text_hash("a")]) == {}
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """ Tests that the cache stays under its size budget by evicting old vectors. """
+    vector = [0.0] * 64  # 256 bytes as float32
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"), max_bytes=1024, lru_items=1)
+    for i in range(8):
+        cache.put_many(MODEL, [(text_hash(str(i)), vector)])
+    assert cache.stats()["evictions"] > 0
+    assert cache._size == cache._stored_bytes() <= 1024
+    assert text_hash("7") in cache.get_many(MODEL, [text_hash("7")])
+    assert cache.get_many(MODEL, [text_hash("0")]) == {}
+
+def test_cache_tracks_stored_size_without_scanning(tmp_path):
+    """ Tests that writes keep a running size that survives reopening, without summing the table per write. """
+    path = str(tmp_path / "cache.sqlite3")
+    vector = [0.0] * 64  # 256 bytes as float32
+    cache = EmbeddingCache(path=path, max_bytes=4096)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    cache.put_many(MODEL, [(text_hash("a"), vector), (text_hash("b"), vector), (text_hash("a"), vector)])
+    cache.put_many(MODEL, [(text_hash("b"), vector), (text_hash("c"), vector)])
+    assert cache._size == 3 * 256
+    assert not [s for s in statements if "SUM(" in s]
+    cache.close()
+    assert EmbeddingCache(path=path)._size == 3 * 256
+
+def test_embed_chunks_only_sends_misses(tmp_path, monkeypatch):
+    """ Tests that embed_chunks only requests uncached, distinct texts and keeps input order. """
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"))
+    requests = []
+
+    def fake_request(chunks, model, backend, dimensions=None):
+        requests.append(list(chunks))
+        return np.array([[float(len(c))] for c in chunks], dtype=np.float32)
+
+    monkeypatch.setattr(embedding, "get_embedding_cache", lambda: cache)
+    monkeypatch.setattr(embedding, "_request_embeddings", fake_request)
+
+    assert embedding.embed_chunks(["aa", "b"], backend="hashing").tolist() == [[2.0], [1.0]]
+    assert embedding.embed_chunks(["ccc", "aa", "ccc", "b"], backend="hashing").tolist() == [[3.0], [2.0], [3.0], [1.0]]
+    assert requests == [["aa", "b"], ["ccc"]]
+
+# Run with: PYTHONPATH=. pytest tests/core/test_embedding_cache.py
@@ -0,0 +1,196 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import backend.core.embedding as embedding
+from backend.core.embedding_cache import EmbeddingCache
+from backend.core.grading import UNAVAILABLE_FEEDBACK, PreGrader, grade_answer
+from backend.core.llm import LLMGateway, get_llm_gateway
+from backend.db.access import get_database
+from backend.db.auth import verify_supabase_jwt
+from backend.db.memory import InMemoryDatabase
+from backend.main import app
+
+MATERIAL = ("Photosynthesis converts light energy into chemical energy. Plants use chlorophyll in their "
+            "chloroplasts to capture sunlight and produce glucose and oxygen from carbon dioxide and water.")
+
+class GradingClient:
+    """ Chat client that answers every grading prompt with a fixed response. """
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+async def no_embedding(texts):
+    raise AssertionError("No embedding expected")
+
+def _grade(answer, chunk_vector=None, answer_vector=None, content='{"score": 1, "feedback": "ok"}'):
+    client = GradingClient(content)
+    pregrader = PreGrader(reject_similarity=0.1)
+
+    async def embed(texts):
+        return np.asarray([answer_vector])
+
+    result = asyncio.run(grade_answer(LLMGateway(client), pregrader, answer, "What does photosynthesis do?",
+                                      MATERIAL, chunk_vector, embed if answer_vector is not None else no_embedding))
+    return result, client.calls, pregrader
+
+def test_non_answers_are_graded_without_model_or_embedding():
+    """ Tests that blank and 'I don't know' answers score 0 locally. """
+    for answer in ["   ", "?!", "I don't know", "idk"]:
+        (score, _), calls, pregrader = _grade(answer, chunk_vector=np.ones(4))
+        assert score == 0 and calls == 0
+        assert pregrader.counts["empty"] == 1
+
+def test_copied_answer_is_rejected():
+    """ Tests that an answer pasted from the material scores 0 without a model call. """
+    answer = "Plants use chlorophyll in their chloroplasts to capture sunlight and produce glucose"
+    (score, feedback), calls, pregrader = _grade(answer)
+    assert score == 0 and calls == 0
+    assert "own words" in feedback and pregrader.counts["copied"] == 1
+
+def test_similarity_only_settles_rejections_locally():
+    """ Tests that unrelated answers are rejected locally and answers close to the material still go to the model. """
+    chunk = np.array([1.0, 0.0, 0.0, 0.0])
+    (score, _), calls, _ = _grade("Mitochondria are organelles", chunk, np.array([0.0, 1.0, 0.0, 0.0]))
+    assert (score, calls) == (0, 0)
+    (score, _), calls, pregrader = _grade("It makes food for the plant", chunk, np.array([0.6, 0.8, 0.0, 0.0]))
+    assert (score, calls) == (1, 1)
+    assert pregrader.stats()["counts"]["llm"] == 1
+    # A paraphrase of the passage is close to it without answering the question
+    (score, feedback), calls, _ = _grade("Chlorophyll sits in the chloroplasts of plants", chunk,
+                                         np.array([0.99, 0.01, 0.0, 0.0]), content='{"score": 0, "feedback": "You described where, not what."}')
+    assert (score, calls) == (0, 1)
+
+def test_mismatched_embedding_dimensions_fall_back_to_model():
+    """ Tests that an answer embedded with another model's dimensions is graded by the model. """
+    (score, _), calls, _ = _grade("It makes food", np.ones(4), np.ones(8), content='{"score": 0, "feedback": "No."}')
+    assert (score, calls) == (0, 1)
+
+def test_model_response_is_parsed_from_wrapped_text():
+    """ Tests that the grading JSON is found inside surrounding text and unparseable responses score 0. """
+    (score, feedback), _, _ = _grade("It makes food", content='Here: {"score": 0, "feedback": "You missed oxygen."}')
+    assert (score, feedback) == (0, "You missed oxygen.")
+    (score, feedback), _, _ = _grade("It makes food", content="Looks right to me")
+    assert score == 0 and "unavailable" in feedback
+
+def test_stats_report_thresholds_and_local_rate():
+    """ Tests that stats() reports the thresholds and the share of answers graded locally. """
+    pregrader = PreGrader(reject_similarity=0.2, copy_overlap=0.7)
+    pregrader.counts.update({"empty": 1, "rejected": 2, "llm": 1})
+    stats = pregrader.stats()
+    assert stats["thresholds"] == {"reject_similarity": 0.2, "copy_overlap": 0.7}
+    assert stats["local_rate"] == 0.75
+
+def test_submit_grades_empty_answer_locally():
+    """ Tests that the submit endpoint stores a locally graded answer without calling the model. """
+    db = InMemoryDatabase()
+    chunk_id = asyncio.run(db.store_chunks([MATERIAL], np.ones((1, 4)), "u1", "submitted-doc"))[0]
+    client = GradingClient('{"score": 1}')
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    app.dependency_overrides[get_llm_gateway] = lambda: LLMGateway(client)
+    try:
+        response = TestClient(app).post("/api/quiz/submit", json={"chunk_id": chunk_id, "answer": "no idea", "type": "quiz"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.json()["score"] == 0
+    assert client.calls == 0
+    assert db.quiz_results[0]["score"] == 0
+
+def test_submitted_answers_are_not_cached(tmp_path, monkeypatch):
+    """ Tests that answers are embedded for grading without being written to the embedding cache. """
+    cache = EmbeddingCache(path=str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(embedding, "get_embedding_cache", lambda: cache)
+    db = InMemoryDatabase()
+    chunk_id = asyncio.run(db.store_chunks([MATERIAL], np.ones((1, 4)), "u1", "uncached-doc"))[0]
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    app.dependency_overrides[get_llm_gateway] = lambda: LLMGateway(GradingClient('{"score": 1}'))
+    try:
+        response = TestClient(app).post("/api/quiz/submit", json={"chunk_id": chunk_id, "answer": "It makes sugar", "type": "quiz"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert cache._stored_bytes() == 0
+    assert cache.stats()["hits"] + cache.stats()["misses"] == 0
+
+def test_submit_batch_grades_stores_and_schedules_together():
+    """ Tests that a batch submission reads chunks once, stores every result and schedules each follow-up. """
+    db = InMemoryDatabase()
+    chunk_ids = asyncio.run(db.store_chunks([MATERIAL, "Mitosis splits a cell in two.", "Osmosis moves water."],
+                                            np.ones((3, 4)), "u1", "batch-doc"))
+    today = date.today().isoformat()
+    for chunk_id, task_type in zip(chunk_ids, ["quiz", "review", "learn"]):
+        db.tasks.append({"id": chunk_id, "user_id": "u1", "chunk_id": chunk_id, "scheduled_date": today,
+                         "task_type": task_type, "completed": False})
+    reads = []
+    get_chunks = db.get_chunks
+
+    async def counting_get_chunks(chunk_ids, user_id):
+        reads.append(list(chunk_ids))
+        return await get_chunks(chunk_ids, user_id)
+
+    db.get_chunks = counting_get_chunks
+    client = GradingClient('{"score": 1, "feedback": "ok"}')
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    app.dependency_overrides[get_llm_gateway] = lambda: LLMGateway(client)
+    answers = [
+        {"chunk_id": chunk_ids[0], "answer": "idk", "type": "quiz"},
+        {"chunk_id": chunk_ids[1], "answer": "It makes two daughter cells", "type": "review"},
+        {"chunk_id": chunk_ids[2], "answer": "Water crosses a membrane", "type": "learn"},
+    ]
+    try:
+        test_client = TestClient(app)
+        response = test_client.post("/api/quiz/submit-batch", json={"answers": answers})
+        duplicate = test_client.post("/api/quiz/submit-batch", json={"answers": answers[:1] * 2})
+    finally:
+        app.dependency_overrides.clear()
+    assert [result["score"] for result in response.json()["results"]] == [0, 1, 1]
+    assert client.calls == 2
+    assert reads == [chunk_ids]
+    assert [row["score"] for row in db.quiz_results] == [0, 1, 1]
+    assert all(row["completed"] for row in db.tasks[:3])
+    followups = {row["chunk_id"]: row["task_type"] for row in db.tasks[3:]}
+    assert followups == {chunk_ids[0]: "review", chunk_ids[1]: "review", chunk_ids[2]: "quiz"}
+    assert duplicate.status_code == 400
+
+def test_unavailable_grading_leaves_memory_and_schedule_untouched():
+    """ Tests that answers the model could not grade are not stored, reviewed or scheduled, and keep their task open. """
+    db = InMemoryDatabase()
+    chunk_ids = asyncio.run(db.store_chunks([MATERIAL, "Mitosis splits a cell in two."], np.ones((2, 4)), "u1", "outage-doc"))
+    today = date.today().isoformat()
+    for chunk_id in chunk_ids:
+        db.tasks.append({"id": chunk_id, "user_id": "u1", "chunk_id": chunk_id, "scheduled_date": today,
+                         "task_type": "review", "completed": False})
+    client = GradingClient("The grader is overloaded")
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    app.dependency_overrides[get_llm_gateway] = lambda: LLMGateway(client)
+    try:
+        test_client = TestClient(app)
+        single = test_client.post("/api/quiz/submit", json={"chunk_id": chunk_ids[0], "answer": "Plants make sugar from light",
+                                                            "type": "review"})
+        batch = test_client.post("/api/quiz/submit-batch", json={"answers": [
+            {"chunk_id": chunk_ids[0], "answer": "Plants make sugar from light", "type": "review"},
+            {"chunk_id": chunk_ids[1], "answer": "no idea", "type": "review"},
+        ]})
+    finally:
+        app.dependency_overrides.clear()
+    assert single.json() == {"feedback": UNAVAILABLE_FEEDBACK, "score": 0, "graded": False}
+    assert [result["graded"] for result in batch.json()["results"]] == [False, True]
+    # Only the locally graded non-answer is recorded, reviewed and followed up
+    assert [row["chunk_id"] for row in db.quiz_results] == [chunk_ids[1]]
+    assert chunk_ids[0] not in db._model("u1")
+    assert [row["completed"] for row in db.tasks[:2]] == [False, True]
+    assert [row["chunk_id"] for row in db.tasks[2:]] == [chunk_ids[1]]
+
+# Run with: PYTHONPATH=. pytest tests/core/test_grading.py
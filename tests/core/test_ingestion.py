@@ -0,0 +1,127 @@
+import os
+import asyncio
+import pytest
+from backend.core.chunking import Chunker
+from backend.core.ingestion import IngestionExecutor, BatchPipeline, ByteBudget, content_hash
+
+TEST_PDF = os.path.join(os.path.dirname(__file__), "..", "files", "test.pdf")
+
+def _expected_chunks():
+    chunker = Chunker(max_chars=300, min_chars=50)
+    with open(TEST_PDF, "rb") as f:
+        text = chunker.extract_text(f)
+    return chunker.chunk_merged_paragraphs(text)
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_executor_chunks_pdf(mode):
+    """ Tests that chunking in the worker pool matches chunking inline. """
+    with open(TEST_PDF, "rb") as f:
+        pdf_bytes = f.read()
+    executor = IngestionExecutor(mode=mode, workers=2)
+    try:
+        chunks = asyncio.run(executor.chunk_pdf(pdf_bytes, {"max_chars": 300, "min_chars": 50}))
+    finally:
+        executor.shutdown()
+    assert chunks == _expected_chunks()
+
+def test_executor_embed_empty():
+    """ Tests that embedding no chunks skips the embedding pool. """
+    executor = IngestionExecutor(mode="thread")
+    assert len(asyncio.run(executor.embed_chunks([]))) == 0
+    assert executor._embed_pool is None
+
+def test_executor_rejects_unknown_mode():
+    """ Tests that an unknown executor mode is rejected. """
+    with pytest.raises(ValueError):
+        IngestionExecutor(mode="gpu")
+
+class FakeEmbedExecutor(IngestionExecutor):
+    """ Thread executor that returns one-dimensional fake embeddings instead of calling the API. """
+    async def embed_chunks(self, chunks, model=None):
+        await asyncio.sleep(0.01)
+        return [[float(len(c))] for c in chunks]
+
+class FakeUpload:
+    def __init__(self, filename, data):
+        self.filename = filename
+        self.size = len(data)
+        self._data = data
+
+    async def read(self):
+        return self._data
+
+def test_batch_pipeline_preserves_order_and_budget():
+    """ Tests that the batch pipeline returns chunk IDs in upload order and respects the byte budget. """
+    with open(TEST_PDF, "rb") as f:
+        pdf_bytes = f.read()
+    uploads = [FakeUpload(f"doc{i}.pdf", pdf_bytes) for i in range(4)]
+    stored_files = []
+    peak = {"bytes": 0}
+
+    async def run():
+        executor = FakeEmbedExecutor(mode="thread", workers=2)
+        pipeline = None
+
+        def store_file(document_id, data, file_name, digest):
+            peak["bytes"] = max(peak["bytes"], pipeline.budget.in_use)
+            stored_files.append(file_name)
+
+        def store_chunks(chunks, embeddings, document_id):
+            assert len(chunks) == len(embeddings)
+            return [f"{document_id}:{i}" for i in range(len(chunks))]
+
+        pipeline = BatchPipeline(store_file, store_chunks, executor=executor, max_bytes=2 * len(pdf_bytes))
+        try:
+            return await pipeline.run(uploads)
+        finally:
+            executor.shutdown()
+
+    results = [ids for ids, _ in asyncio.run(run())]
+    assert len(results) == 4
+    assert all(len(ids) > 0 for ids in results)
+    # Every upload is stored under its own document ID
+    assert len({ids[0].split(":")[0] for ids in results}) == 4
+    assert sorted(stored_files) == [f"doc{i}.pdf" for i in range(4)]
+    assert peak["bytes"] <= 2 * len(pdf_bytes)
+
+def test_batch_pipeline_reuses_identical_documents():
+    """ Tests that a PDF recognised by its content hash is not stored, chunked or embedded again. """
+    pdf_bytes = b"%PDF-already-uploaded"
+    known = {content_hash(pdf_bytes): (["stored chunk"], [[1.0]])}
+    stored_files = []
+    stored_chunks = []
+
+    class NoWorkExecutor(IngestionExecutor):
+        async def chunk_pdf(self, pdf_bytes, chunker_args=None):
+            raise AssertionError("reused document was chunked again")
+
+        async def embed_chunks(self, chunks, model=None):
+            raise AssertionError("reused document was embedded again")
+
+    def store_chunks(chunks, embeddings, document_id):
+        stored_chunks.append((chunks, embeddings))
+        return [document_id]
+
+    async def run():
+        pipeline = BatchPipeline(lambda *args: stored_files.append(args), store_chunks,
+                                 executor=NoWorkExecutor(mode="thread"),
+                                 reuse_document=lambda document_id, file_name, digest: known.get(digest))
+        return await pipeline.run([FakeUpload("same.pdf", pdf_bytes)])
+
+    results = asyncio.run(run())
+    assert len(results) == 1 and len(results[0][0]) == 1
+    assert results[0][1] == [[1.0]]
+    assert stored_chunks == [(["stored chunk"], [[1.0]])]
+    assert stored_files == []
+
+def test_byte_budget_admits_oversized_request():
+    """ Tests that a request larger than the budget is clamped instead of blocking forever. """
+    async def run():
+        budget = ByteBudget(10)
+        reserved = await budget.acquire(100)
+        assert budget.in_use == 10
+        await budget.release(reserved)
+        return budget.in_use
+    assert asyncio.run(run()) == 0
+
+# Run with: PYTHONPATH=. pytest tests/core/test_ingestion.py
@@ -0,0 +1,251 @@
+import asyncio
+import os
+from functools import partial
+from io import BytesIO
+
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from backend.core.jobs import JobQueue, get_job_queue, run_worker
+from backend.core.uploads import run_upload_batch, spool_uploads
+from backend.db.auth import verify_supabase_jwt
+from backend.db.memory import InMemoryDatabase
+from backend.main import app
+from tests.core.test_ingestion import TEST_PDF, FakeEmbedExecutor
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def _queue(tmp_path, **kwargs):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), spool_dir=str(tmp_path / "spool"), **kwargs)
+
+def _pdfs(count):
+    with open(TEST_PDF, "rb") as f:
+        pdf_bytes = f.read()
+    # Distinct bytes per file, so no upload is recognised as a repeat of another
+    return [pdf_bytes + f"\n% copy {i}\n".encode() for i in range(count)]
+
+def test_queue_claims_and_completes(tmp_path):
+    """ Tests that a job is claimed once, completed and reported with its decoded result. """
+    queue = _queue(tmp_path)
+    job_id = queue.enqueue("echo", {"value": 1}, user_id="u1")
+    job = queue.claim()
+    assert job["id"] == job_id
+    assert job["payload"] == {"value": 1}
+    assert job["attempts"] == 1
+    assert queue.claim() is None
+    queue.complete(job_id, {"value": 2})
+    assert queue.get(job_id)["status"] == "done"
+    assert queue.get(job_id)["result"] == {"value": 2}
+    assert queue.get("missing") is None
+
+def test_queue_retries_with_backoff_then_fails(tmp_path):
+    """ Tests that a failed job is retried after a growing delay and marked failed after its last attempt. """
+    clock = FakeClock()
+    queue = _queue(tmp_path, max_attempts=3, retry_delay=10, clock=clock)
+    job_id = queue.enqueue("echo", {})
+    os.makedirs(tmp_path / "spool" / job_id)
+    queue.claim()
+    queue.save_checkpoint(job_id, "stage", 1)
+    queue.fail(job_id, "first")
+    assert queue.get(job_id)["status"] == "queued"
+    assert os.path.exists(tmp_path / "spool" / job_id)
+    assert queue.checkpoints(job_id) == {"stage": 1}
+    assert queue.claim() is None
+    clock.now += 10
+    assert queue.claim()["attempts"] == 2
+    queue.fail(job_id, "second")
+    clock.now += 10
+    assert queue.claim() is None
+    clock.now += 10
+    assert queue.claim()["attempts"] == 3
+    queue.fail(job_id, "third")
+    assert queue.get(job_id)["status"] == "failed"
+    assert queue.get(job_id)["error"] == "third"
+    assert not os.path.exists(tmp_path / "spool" / job_id)
+    assert queue.checkpoints(job_id) == {}
+
+def test_queue_reclaims_expired_lease(tmp_path):
+    """ Tests that a job whose worker stopped renewing its lease is claimed again, and failed once out of attempts. """
+    clock = FakeClock()
+    queue = _queue(tmp_path, max_attempts=2, lease_seconds=60, clock=clock)
+    job_id = queue.enqueue("echo", {})
+    os.makedirs(tmp_path / "spool" / job_id)
+    queue.claim()
+    queue.save_checkpoint(job_id, "stage", 1)
+    clock.now += 30
+    queue.renew(job_id)
+    clock.now += 45
+    assert queue.claim() is None
+    clock.now += 30
+    assert queue.claim()["attempts"] == 2
+    clock.now += 61
+    assert queue.claim() is None
+    assert queue.get(job_id)["status"] == "failed"
+    assert not os.path.exists(tmp_path / "spool" / job_id)
+    assert queue.checkpoints(job_id) == {}
+
+def test_upload_job_keeps_spool_until_job_is_complete(tmp_path):
+    """ Tests that an upload job leaves its spooled files and checkpoints for a retry until the queue marks it done. """
+    queue = _queue(tmp_path)
+    db = InMemoryDatabase()
+
+    async def run():
+        uploads = [UploadFile(BytesIO(_pdfs(1)[0]), filename="doc.pdf")]
+        files = await spool_uploads(queue, "job-3", uploads)
+        queue.enqueue("upload_batch", {"class_id": "c1", "study_days": [0, 1, 2, 3, 4], "intensity": "light",
+                                       "files": files}, user_id="u1", job_id="job-3")
+        executor = FakeEmbedExecutor(mode="thread", workers=1)
+        try:
+            return await run_upload_batch(queue.claim(), queue, db, executor)
+        finally:
+            executor.shutdown()
+
+    result = asyncio.run(run())
+    # A worker stopping here would retry from the checkpoints, which point into the spool directory
+    assert os.path.exists(tmp_path / "spool" / "job-3" / "0.npy")
+    assert "pdf:0" in queue.checkpoints("job-3")
+    queue.complete("job-3", result)
+    assert not os.path.exists(tmp_path / "spool" / "job-3")
+    assert queue.checkpoints("job-3") == {}
+
+def test_queue_is_shared_between_connections(tmp_path):
+    """ Tests that a job enqueued through one connection is claimed through another exactly once. """
+    api = _queue(tmp_path)
+    workers = [_queue(tmp_path) for _ in range(3)]
+    job_id = api.enqueue("echo", {})
+    claims = [worker.claim() for worker in workers]
+    assert [job["id"] for job in claims if job is not None] == [job_id]
+
+def _run_upload_job(queue, db, job_id, files, attempts=2):
+    """ Spools two PDFs into files, enqueues an upload job for them and runs the worker once per attempt. """
+    async def run():
+        uploads = [UploadFile(BytesIO(data), filename=f"doc{i}.pdf") for i, data in enumerate(_pdfs(2))]
+        files.extend(await spool_uploads(queue, job_id, uploads))
+        queue.enqueue("upload_batch", {"class_id": "c1", "study_days": [0, 1, 2, 3, 4], "intensity": "light",
+                                       "files": files}, user_id="u1", job_id=job_id)
+        executor = FakeEmbedExecutor(mode="thread", workers=2)
+        try:
+            handlers = {"upload_batch": partial(run_upload_batch, queue=queue, db=db, executor=executor)}
+            for _ in range(attempts):
+                await run_worker(queue, handlers, max_jobs=1)
+        finally:
+            executor.shutdown()
+
+    asyncio.run(run())
+    return queue.get(job_id)
+
+def test_worker_retries_failed_job_from_checkpoint(tmp_path):
+    """ Tests that the worker retries a failed upload job and the retry skips the PDF it already stored. """
+    queue = _queue(tmp_path, retry_delay=0)
+    db = InMemoryDatabase()
+    stored_files = []
+    store_file = db.store_file
+    store_chunks = db.store_chunks
+    failures = []
+    files = []
+
+    async def recording_store_file(user_id, class_id, document_id, *args):
+        stored_files.append(document_id)
+        return await store_file(user_id, class_id, document_id, *args)
+
+    async def failing_store_chunks(chunks, embeddings, user_id, document_id, class_id=None):
+        if document_id == files[1]["document_id"] and not failures:
+            # Let the other PDF finish first, then fail this one
+            while "pdf:0" not in queue.checkpoints("job-1"):
+                await asyncio.sleep(0.01)
+            failures.append(document_id)
+            raise Exception("Connection reset")
+        return await store_chunks(chunks, embeddings, user_id, document_id, class_id)
+
+    db.store_file = recording_store_file
+    db.store_chunks = failing_store_chunks
+    job = _run_upload_job(queue, db, "job-1", files)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["progress"]["stage"] == "done"
+    assert len(failures) == 1
+    # The first PDF was stored once; the second once per attempt, under the same document ID
+    assert stored_files.count(files[0]["document_id"]) == 1
+    assert stored_files.count(files[1]["document_id"]) == 2
+    assert job["result"]["total_pdfs"] == 2
+    assert job["result"]["total_chunks"] == len(db.chunks)
+    assert len(db.tasks) == job["result"]["scheduled_chunks"]
+    assert not os.path.exists(tmp_path / "spool" / "job-1")
+
+def test_retry_after_unrecorded_chunk_insert_overwrites_chunks(tmp_path):
+    """ Tests that a retry after chunks were stored but not checkpointed overwrites them instead of adding a second set. """
+    queue = _queue(tmp_path, retry_delay=0)
+    db = InMemoryDatabase()
+    store_chunks = db.store_chunks
+    failures = []
+    files = []
+
+    async def store_chunks_then_fail(chunks, embeddings, user_id, document_id, class_id=None):
+        chunk_ids = await store_chunks(chunks, embeddings, user_id, document_id, class_id)
+        if not failures:
+            # The rows are written, but the worker stops before checkpointing the PDF
+            failures.append(document_id)
+            raise Exception("Worker stopped")
+        return chunk_ids
+
+    db.store_chunks = store_chunks_then_fail
+    job = _run_upload_job(queue, db, "job-2", files)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    per_document = [[row for row in db.chunks.values() if row["document_id"] == spooled["document_id"]]
+                    for spooled in files]
+    assert len(per_document[0]) == len(per_document[1]) > 0
+    assert job["result"]["total_chunks"] == len(db.chunks)
+    scheduled = [task["chunk_id"] for task in db.tasks]
+    assert len(scheduled) == len(set(scheduled)) == job["result"]["scheduled_chunks"]
+
+def test_upload_batch_enqueues_job_for_owner(tmp_path):
+    """ Tests that /upload-batch spools and enqueues a job that only its owner can look up. """
+    queue = _queue(tmp_path)
+    app.dependency_overrides[get_job_queue] = lambda: queue
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    try:
+        client = TestClient(app)
+        response = client.post("/upload-batch", data={"class_id": "c1", "study_days": "[0, 2]", "intensity": "light"},
+                               files=[("pdfs", (f"doc{i}.pdf", data, "application/pdf")) for i, data in enumerate(_pdfs(2))])
+        bad_days = client.post("/upload-batch", data={"class_id": "c1", "study_days": "mon", "intensity": "light"},
+                               files=[("pdfs", ("doc.pdf", _pdfs(1)[0], "application/pdf"))])
+        job_id = response.json()["job_id"]
+        status = client.get(f"/api/jobs/{job_id}")
+        app.dependency_overrides[verify_supabase_jwt] = lambda: "u2"
+        other_user = client.get(f"/api/jobs/{job_id}")
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 202
+    assert response.json()["total_pdfs"] == 2
+    assert bad_days.status_code == 400
+    assert status.json()["status"] == "queued"
+    assert other_user.status_code == 404
+    payload = queue.get(job_id)["payload"]
+    assert payload["study_days"] == [0, 2]
+    assert all(os.path.getsize(spooled["path"]) == spooled["size"] for spooled in payload["files"])
+
+def test_upload_batch_rejects_bad_settings_before_spooling(tmp_path):
+    """ Tests that /upload-batch answers 400 for unusable study days or intensity without spooling or enqueueing. """
+    queue = _queue(tmp_path)
+    app.dependency_overrides[get_job_queue] = lambda: queue
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    settings = [("[]", "light"), ("[0, 7]", "light"), ('["mon"]', "light"), ("[true]", "light"),
+                ('{"0": 1}', "light"), ("[0, 2]", "extreme")]
+    try:
+        client = TestClient(app)
+        responses = [client.post("/upload-batch", data={"class_id": "c1", "study_days": days, "intensity": intensity},
+                                 files=[("pdfs", ("doc.pdf", _pdfs(1)[0], "application/pdf"))])
+                     for days, intensity in settings]
+    finally:
+        app.dependency_overrides.clear()
+    assert [response.status_code for response in responses] == [400] * len(settings)
+    assert queue.claim() is None
+    assert not os.path.exists(tmp_path / "spool")
+
+# Run with: PYTHONPATH=. pytest tests/core/test_jobs.py
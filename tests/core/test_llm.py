@@ -0,0 +1,98 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.core.llm import LLMGateway
+
+class ScriptedClient:
+    """ Chat client whose nth call sleeps delays[n] seconds, then answers or raises errors[n]. """
+    def __init__(self, delays, errors=None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.calls = 0
+        self.started = []
+        self.in_flight = 0
+        self.peak = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        n = self.calls
+        self.calls += 1
+        self.started.append(time.perf_counter())
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays[min(n, len(self.delays) - 1)])
+            if n in self.errors:
+                raise self.errors[n]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" answer {n} "))])
+        finally:
+            self.in_flight -= 1
+
+def test_slow_attempt_is_hedged():
+    """ Tests that a second attempt starts after hedge_after and the first answer wins. """
+    client = ScriptedClient([1.0, 0.01])
+    llm = LLMGateway(client, hedge_after=0.05, timeout=2)
+    start = time.perf_counter()
+    assert asyncio.run(llm.complete([])) == "answer 1"
+    assert time.perf_counter() - start < 0.5
+    assert client.calls == 2 and llm.hedges == 1
+
+def test_deadline_bounds_the_call():
+    """ Tests that a call raises TimeoutError at its deadline even if every attempt hangs. """
+    llm = LLMGateway(ScriptedClient([5.0]), hedge_after=0.05, timeout=0.2)
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.complete([]))
+    assert time.perf_counter() - start < 1.0
+
+def test_retryable_errors_are_retried_and_others_raised():
+    """ Tests that a retryable failure gets another attempt while other errors surface at once. """
+    client = ScriptedClient([0.0], errors={0: ConnectionError("reset")})
+    llm = LLMGateway(client, retryable=(ConnectionError,))
+    assert asyncio.run(llm.complete([])) == "answer 1"
+
+    client = ScriptedClient([0.0], errors={0: ValueError("bad request")})
+    with pytest.raises(ValueError):
+        asyncio.run(LLMGateway(client, retryable=(ConnectionError,)).complete([]))
+    assert client.calls == 1
+
+class RateLimited(Exception):
+    """ Stand-in for openai.RateLimitError, with the response headers it carries. """
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.response = SimpleNamespace(headers=headers)
+
+def test_rate_limited_attempt_waits_before_retrying():
+    """ Tests that a retry after a rate limit waits for retry-after, or a jittered backoff without one. """
+    client = ScriptedClient([0.0], errors={0: RateLimited({"retry-after": "0.3"})})
+    llm = LLMGateway(client, retryable=(RateLimited,), backoff=(RateLimited,), backoff_delay=0.0, timeout=2)
+    assert asyncio.run(llm.complete([])) == "answer 1"
+    assert client.started[1] - client.started[0] >= 0.3
+
+    client = ScriptedClient([0.0], errors={0: RateLimited({})})
+    llm = LLMGateway(client, retryable=(RateLimited,), backoff=(RateLimited,), backoff_delay=0.2, timeout=2)
+    assert asyncio.run(llm.complete([])) == "answer 1"
+    assert 0.1 <= client.started[1] - client.started[0] < 0.5
+
+    # A rate limit the deadline cannot wait out ends the call instead of retrying into it
+    client = ScriptedClient([0.0], errors={0: RateLimited({"retry-after": "30"})})
+    llm = LLMGateway(client, retryable=(RateLimited,), backoff=(RateLimited,), timeout=0.2)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.complete([]))
+    assert client.calls == 1
+
+def test_concurrency_is_capped_without_hedging_past_it():
+    """ Tests that no more than max_concurrency completions run at once, hedges included. """
+    client = ScriptedClient([0.1])
+    llm = LLMGateway(client, max_concurrency=2, hedge_after=0.01, timeout=5)
+
+    async def main():
+        return await asyncio.gather(*(llm.complete([]) for _ in range(6)))
+
+    assert len(asyncio.run(main())) == 6
+    assert client.peak == 2
+
+# Run with: PYTHONPATH=. pytest tests/core/test_llm.py
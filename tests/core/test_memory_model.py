@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from backend.core.memory_model import FSRS_WEIGHTS, MemoryModel
+
+def test_first_answer_sets_initial_state():
+    """ Tests that a first correct answer is due after a few days and a wrong one the next day. """
+    model = MemoryModel()
+    due = model.review(["right", "wrong"], [1, 0], date(2024, 1, 1))
+    assert due.astype(str).tolist() == ["2024-01-05", "2024-01-02"]
+    assert model.stability.tolist() == pytest.approx([FSRS_WEIGHTS[2], FSRS_WEIGHTS[0]], rel=1e-6)
+    assert model.difficulty[1] > model.difficulty[0]
+
+def test_intervals_grow_with_correct_answers_and_shrink_after_lapses():
+    """ Tests that reviewing on the due date lengthens intervals until a wrong answer resets them. """
+    model = MemoryModel()
+    day = date(2024, 1, 1)
+    intervals = []
+    for score in [1, 1, 1, 0]:
+        due = model.review(["c1"], [score], day)[0].item()
+        intervals.append((due - day).days)
+        day = due
+    assert intervals[0] < intervals[1] < intervals[2]
+    assert intervals[3] < intervals[2]
+
+def test_batch_review_matches_one_at_a_time():
+    """ Tests that one vectorized update equals updating each chunk separately. """
+    rng = np.random.default_rng(0)
+    ids = [f"c{i}" for i in range(50)]
+    batch, single = MemoryModel(), MemoryModel()
+    for step in range(5):
+        day = date(2024, 1, 1) + timedelta(days=int(3 * step + rng.integers(0, 3)))
+        scores = rng.integers(0, 2, size=len(ids))
+        batch.review(ids, scores, day)
+        for chunk_id, score in zip(ids, scores):
+            single.review([chunk_id], [score], day)
+    assert np.allclose(batch.stability, single.stability)
+    assert np.array_equal(batch.due_dates(), single.due_dates(ids))
+
+def test_from_history_replays_in_order():
+    """ Tests that replaying an interleaved answer history reproduces the live model. """
+    history = [("a", 1, "2024-01-01"), ("b", 0, "2024-01-01"), ("a", 1, "2024-01-05"),
+               ("b", 1, "2024-01-02"), ("a", 0, "2024-01-20")]
+    live = MemoryModel()
+    for chunk_id, score, day in history:
+        live.review([chunk_id], [score], date.fromisoformat(day))
+    replayed = MemoryModel.from_history(*zip(*history))
+    assert replayed.chunk_ids == ["a", "b"]
+    assert np.allclose(replayed.stability, live.stability)
+    assert replayed.due_date("a") == live.due_date("a")
+    assert len(MemoryModel.from_history([], [], [])) == 0
+
+def test_review_rejects_repeated_chunks():
+    """ Tests that a chunk cannot be reviewed twice in one call. """
+    with pytest.raises(ValueError):
+        MemoryModel().review(["a", "a"], [1, 0], date(2024, 1, 1))
+
+# Run with: PYTHONPATH=. pytest tests/core/test_memory_model.py
@@ -0,0 +1,177 @@
+import asyncio
+import json
+from datetime import date, timedelta
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from backend.core.jobs import JobQueue, run_periodic, run_worker
+from backend.core.llm import LLMGateway, get_llm_gateway
+from backend.core.questions import (
+    QuestionPools, QuestionPregenerator, generate_questions, parse_json_object, run_question_scan
+)
+from backend.db.access import get_database
+from backend.db.auth import verify_supabase_jwt
+from backend.db.memory import InMemoryDatabase
+from backend.main import app
+
+class FakeOpenAI:
+    """ Answers each batched prompt with two questions per passage. """
+    def __init__(self, skip=(), content=None):
+        self.calls = 0
+        self.skip = set(skip)
+        self.content = content
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        passages = messages[-1]["content"].count("Passage ")
+        answer = {str(n): [f"Question {n}a?", f"Question {n}b?"] for n in range(1, passages + 1) if n not in self.skip}
+        content = self.content or json.dumps(answer)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FailingOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, *args, **kwargs):
+        raise AssertionError("No model call expected")
+
+def test_generate_questions_packs_chunks_into_batches():
+    """ Tests that chunks are sent batch_size at a time and each gets its own questions. """
+    client = FakeOpenAI()
+    chunks = {f"c{i}": f"text {i}" for i in range(7)}
+    questions = asyncio.run(generate_questions(LLMGateway(client), chunks, batch_size=3))
+    assert client.calls == 3
+    assert set(questions) == set(chunks)
+    assert questions["c3"] == ["Question 1a?", "Question 1b?"]
+
+def test_generate_questions_skips_missing_answers():
+    """ Tests that chunks the model left out are not given a question. """
+    llm = LLMGateway(FakeOpenAI(skip={2}))
+    questions = asyncio.run(generate_questions(llm, {"a": "x", "b": "y", "c": "z"}, batch_size=3))
+    assert questions == {"a": ["Question 1a?", "Question 1b?"], "c": ["Question 3a?", "Question 3b?"]}
+
+def test_generate_questions_caps_pool_size():
+    """ Tests that extra questions are dropped and a bare string answer becomes a one-question pool. """
+    assert asyncio.run(generate_questions(LLMGateway(FakeOpenAI()), {"a": "x"}, per_chunk=1)) == {"a": ["Question 1a?"]}
+    llm = LLMGateway(FakeOpenAI(content='{"1": "Only one?"}'))
+    assert asyncio.run(generate_questions(llm, {"a": "x"})) == {"a": ["Only one?"]}
+
+def test_parse_json_object_accepts_wrapped_output():
+    """ Tests that a JSON object is found inside surrounding text and that non-objects are rejected. """
+    assert parse_json_object('Sure! {"1": "Why?"} Hope this helps.') == {"1": "Why?"}
+    assert parse_json_object("[1, 2]") is None
+    assert parse_json_object("no json here") is None
+
+def test_pregenerator_stores_questions_for_tomorrows_tasks():
+    """ Tests that a scan stores a question pool for each of the day's open quiz and review tasks without one. """
+    db = InMemoryDatabase()
+    chunk_ids = asyncio.run(db.store_chunks(["alpha", "beta", "gamma"], np.zeros((3, 4)), "u1", "pregenerated-doc"))
+    db.chunks[chunk_ids[2]]["questions"] = ["Already there?"]
+    for chunk_id, task_type in zip(chunk_ids, ["quiz", "review", "quiz"]):
+        db.tasks.append({"id": chunk_id, "user_id": "u1", "chunk_id": chunk_id, "scheduled_date": "2024-01-02",
+                         "task_type": task_type, "completed": False})
+    client = FakeOpenAI()
+    pregenerator = QuestionPregenerator(LLMGateway(client), db.get_chunks_needing_questions, db.set_chunk_questions)
+    asyncio.run(pregenerator.run_once(date(2024, 1, 2)))
+    assert client.calls == 1
+    # Passages are numbered in chunk ID order, which is random here
+    pools = sorted([db.chunks[chunk_ids[0]]["questions"], db.chunks[chunk_ids[1]]["questions"]])
+    assert pools == [["Question 1a?", "Question 1b?"], ["Question 2a?", "Question 2b?"]]
+    assert db.chunks[chunk_ids[2]]["questions"] == ["Already there?"]
+
+def test_question_scan_runs_once_per_interval_across_workers(tmp_path):
+    """ Tests that several workers enqueue one scan job per interval, and that running it stores tomorrow's pools. """
+    queue = JobQueue(str(tmp_path / "jobs.sqlite3"), spool_dir=str(tmp_path / "spool"))
+    db = InMemoryDatabase()
+    chunk_ids = asyncio.run(db.store_chunks(["alpha", "beta"], np.zeros((2, 4)), "u1", "scanned-doc"))
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    for chunk_id in chunk_ids:
+        db.tasks.append({"id": chunk_id, "user_id": "u1", "chunk_id": chunk_id, "scheduled_date": tomorrow,
+                         "task_type": "quiz", "completed": False})
+    client = FakeOpenAI()
+    pregenerator = QuestionPregenerator(LLMGateway(client), db.get_chunks_needing_questions, db.set_chunk_questions,
+                                        interval=None)
+    handlers = {"pregenerate_questions": partial(run_question_scan, pregenerator=pregenerator)}
+
+    async def run():
+        stop = asyncio.Event()
+        workers = [asyncio.create_task(run_periodic(queue, "pregenerate_questions", 3600, stop=stop)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        stop.set()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await run_worker(queue, handlers, max_jobs=3)
+
+    asyncio.run(run())
+    (jobs,) = queue._execute("SELECT COUNT(*) FROM jobs WHERE kind = 'pregenerate_questions'").fetchone()
+    assert jobs == 1
+    assert client.calls == 1
+    assert all(db.chunks[chunk_id]["questions"] for chunk_id in chunk_ids)
+
+def test_question_pools_rotate_and_refill_when_low():
+    """ Tests that a cached pool rotates through every question and asks for a refill once mostly served. """
+    pools = QuestionPools(low=2)
+    loads = []
+
+    async def load(chunk_id, user_id):
+        loads.append(chunk_id)
+        return {"text": "alpha", "questions": ["q1", "q2", "q3"]} if user_id == "u1" else None
+
+    entry = asyncio.run(pools.get(load, "c1", "u1"))
+    assert asyncio.run(pools.get(load, "c1", "u1")) is entry
+    assert asyncio.run(pools.get(load, "c1", "u2")) is None
+    assert loads == ["c1", "c1"]
+
+    served = [pools.next_question(entry) for _ in range(3)]
+    assert sorted(served) == ["q1", "q2", "q3"]
+    assert pools.next_question(entry) == served[0]
+    assert pools.needs_refill(entry)
+    entry["refilling"] = True
+    assert not pools.needs_refill(entry)
+
+    pools.update({"c1": ["new1", "new2", "new3"]})
+    assert not entry["refilling"] and entry["served"] == 0
+    assert pools.next_question(entry).startswith("new")
+
+class RecordingPregenerator:
+    def __init__(self):
+        self.queued = []
+
+    def enqueue(self, chunk_id, chunk_text):
+        self.queued.append(chunk_id)
+
+def test_review_start_rotates_cached_pool_without_model_or_database(monkeypatch):
+    """ Tests that repeated quiz starts rotate a stored pool, read the chunk once and queue a single refill. """
+    db = InMemoryDatabase()
+    chunk_id = asyncio.run(db.store_chunks(["alpha"], np.zeros((1, 4)), "u1", "rotated-doc"))[0]
+    db.chunks[chunk_id]["questions"] = ["What is alpha?", "Why alpha?", "When alpha?"]
+    reads = []
+    get_chunk = db.get_chunk
+
+    async def counting_get_chunk(chunk_id, user_id):
+        reads.append(chunk_id)
+        return await get_chunk(chunk_id, user_id)
+
+    db.get_chunk = counting_get_chunk
+    pregenerator = RecordingPregenerator()
+    monkeypatch.setattr(app.state, "question_pregenerator", pregenerator, raising=False)
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    app.dependency_overrides[get_llm_gateway] = lambda: LLMGateway(FailingOpenAI())
+    try:
+        client = TestClient(app)
+        questions = [client.post("/api/reviews/start", json={"chunk_id": chunk_id, "type": "quiz"}).json()["quiz_question"]
+                     for _ in range(4)]
+    finally:
+        app.dependency_overrides.clear()
+    assert sorted(questions[:3]) == sorted(db.chunks[chunk_id]["questions"])
+    assert questions[3] == questions[0]
+    assert reads == [chunk_id]
+    assert pregenerator.queued == [chunk_id]
+
+# Run with: PYTHONPATH=. pytest tests/core/test_questions.py
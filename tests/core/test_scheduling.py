@@ -0,0 +1,349 @@
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+from backend.core import scheduling
+from backend.core.generations import Generations
+from backend.db.access import get_database
+from backend.db.auth import verify_supabase_jwt
+from backend.db.memory import InMemoryDatabase
+from backend.main import app
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from backend.core.scheduling import (
+    CapacityCalendar, Scheduler, UserPreferences, next_study_day, place_task, place_tasks
+)
+
+class FakeQuery:
+    """ Minimal stand-in for a Supabase table query over a list of row dicts. """
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.bounds = None
+        self.updates = None
+        self.single_row = False
+
+    def select(self, *args):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) > value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) >= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) < value)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_by = column
+        self.descending = desc
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end + 1)
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def update(self, values):
+        self.updates = values
+        return self
+
+    def upsert(self, rows):
+        self.upserts = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def insert(self, rows):
+        self.inserts = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        self.db.queries.append(self.table)
+        if getattr(self, "inserts", None) is not None:
+            self.db.tables.setdefault(self.table, []).extend(dict(row) for row in self.inserts)
+            return SimpleNamespace(data=self.inserts)
+        if getattr(self, "upserts", None) is not None:
+            table = self.db.tables.setdefault(self.table, [])
+            by_id = {row.get("id"): row for row in table}
+            for new_row in self.upserts:
+                if new_row.get("id") in by_id:
+                    by_id[new_row["id"]].clear()
+                    by_id[new_row["id"]].update(new_row)
+                else:
+                    table.append({"id": f"new-{len(table)}", **new_row})
+            return SimpleNamespace(data=self.upserts)
+        rows = [row for row in self.db.tables.setdefault(self.table, []) if all(f(row) for f in self.filters)]
+        if self.updates is not None:
+            for row in rows:
+                row.update(self.updates)
+        if getattr(self, "order_by", None):
+            rows.sort(key=lambda row: row[self.order_by], reverse=getattr(self, "descending", False))
+        if self.bounds:
+            rows = rows[self.bounds[0]:self.bounds[1]]
+        if self.single_row:
+            return SimpleNamespace(data=rows[0] if rows else None)
+        return SimpleNamespace(data=[dict(row) for row in rows])
+
+class FakeSupabase:
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+def _tasks(user_id, day, n):
+    return [{"id": f"{day}-{i}", "user_id": user_id, "scheduled_date": day.isoformat()} for i in range(n)]
+
+def test_capacity_calendar_records_writes():
+    """ Tests that recorded tasks change the counts without another query. """
+    monday = date(2024, 1, 1)
+    db = FakeSupabase({"tasks": _tasks("u1", monday, 1)})
+    calendar = CapacityCalendar("u1")
+    assert calendar.count(db, monday) == 1
+    calendar.record(monday, 2)
+    assert calendar.count(db, monday) == 3
+    calendar.move(monday, date(2024, 1, 3))
+    assert (calendar.count(db, monday), calendar.count(db, date(2024, 1, 3))) == (2, 1)
+    assert db.queries.count("tasks") == 1
+
+def test_capacity_calendar_is_dropped_when_another_process_invalidates_it(tmp_path, monkeypatch):
+    """ Tests that a calendar is reloaded after another process invalidates it through the shared counters. """
+    path = str(tmp_path / "generations.sqlite3")
+    monkeypatch.setattr(scheduling, "capacity_generations", Generations(path))
+    scheduling.invalidate_capacity("u1")
+    calendar = scheduling.get_capacity_calendar("u1")
+    assert scheduling.get_capacity_calendar("u1") is calendar
+    # What a worker storing a schedule does, through its own connection
+    Generations(path).bump("capacity:u1")
+    assert scheduling.get_capacity_calendar("u1") is not calendar
+
+def test_place_tasks_invalidates_other_processes_calendars(tmp_path, monkeypatch):
+    """ Tests that placing tasks moves the shared counter, keeping this process's calendar and dropping stale ones. """
+    path = str(tmp_path / "generations.sqlite3")
+    monkeypatch.setattr(scheduling, "capacity_generations", Generations(path))
+    monday = date(2024, 1, 1)
+    db = FakeSupabase({
+        "tasks": _tasks("u1", monday, 1),
+        "user_preferences": [{"user_id": "u1", "study_days": [0, 1, 2, 3, 4], "intensity": "light"}],
+    })
+    scheduling.invalidate_capacity("u1")
+    scheduling.invalidate_user_preferences("u1")
+    calendar = scheduling.get_capacity_calendar("u1")
+    # Another process's calendar, loaded at the same generation
+    other = CapacityCalendar("u1", calendar.generation)
+
+    place_task("u1", db, {"user_id": "u1", "chunk_id": "c9", "task_type": "review"}, monday)
+    assert scheduling.get_capacity_calendar("u1") is calendar
+    assert calendar.count(db, monday) == 2
+    assert Generations(path).get("capacity:u1") != other.generation
+
+    # A write by another process meanwhile means this calendar's counts can no longer be trusted
+    Generations(path).bump("capacity:u1")
+    place_task("u1", db, {"user_id": "u1", "chunk_id": "c10", "task_type": "review"}, date(2024, 1, 2))
+    assert scheduling.get_capacity_calendar("u1") is not calendar
+
+def test_capacity_calendar_extends_window():
+    """ Tests that lookups past the loaded window load only the next range. """
+    start = date(2024, 1, 1)
+    tasks = []
+    for offset in range(scheduling.CAPACITY_HORIZON_DAYS + 5):
+        tasks += _tasks("u1", start + timedelta(days=offset), 1)
+    db = FakeSupabase({"tasks": tasks})
+    calendar = CapacityCalendar("u1")
+    assert all(calendar.count(db, start + timedelta(days=offset)) == 1 for offset in range(10))
+    assert calendar.count(db, start + timedelta(days=scheduling.CAPACITY_HORIZON_DAYS + 4)) == 1
+    assert calendar.count(db, start + timedelta(days=scheduling.CAPACITY_HORIZON_DAYS + 5)) == 0
+    assert db.queries.count("tasks") == 2
+
+def test_next_study_day():
+    """ Tests stepping to the next study day, including across a weekend. """
+    assert next_study_day(date(2024, 1, 5), [0, 4]) == date(2024, 1, 8)
+    assert next_study_day(date(2024, 1, 1), [0]) == date(2024, 1, 8)
+
+def test_preferences_are_cached_and_written_through():
+    """ Tests that preferences are read once and updated in place when they are saved. """
+    db = FakeSupabase({"user_preferences": [{"user_id": "p1", "study_days": [0], "intensity": "hard"}]})
+    scheduling.invalidate_user_preferences("p1")
+    misses = scheduling.preferences_cache.stats()["misses"]
+    for _ in range(3):
+        prefs = scheduling.get_user_preferences_from_db("p1", db)
+        assert (prefs["study_days"], prefs["intensity"]) == ([0], "hard")
+    assert db.queries.count("user_preferences") == 1
+    assert scheduling.preferences_cache.stats()["misses"] == misses + 1
+
+    scheduling.get_user_preferences_from_db("p1", db)["intensity"] = "light"
+    scheduling.cache_user_preferences("p1", [1, 2], "medium")
+    assert scheduling.get_user_preferences_from_db("p1", db) == {"study_days": [1, 2], "intensity": "medium"}
+    assert db.queries.count("user_preferences") == 1
+
+def test_missing_preferences_use_defaults_once():
+    """ Tests that a user without saved preferences gets the defaults without re-querying. """
+    db = FakeSupabase({"user_preferences": []})
+    scheduling.invalidate_user_preferences("p2")
+    assert scheduling.load_user_preferences("p2", db) is None
+    assert scheduling.get_user_preferences_from_db("p2", db)["intensity"] == "medium"
+    assert db.queries.count("user_preferences") == 1
+
+def _reference_schedule(chunk_ids, study_days, capacity, start):
+    """ Day-by-day placement the closed-form scheduler must match. """
+    schedule, day, used = [], start, 0
+    for chunk_id in chunk_ids:
+        while day.weekday() not in study_days or used >= capacity:
+            day, used = day + timedelta(days=1), 0
+        schedule.append((chunk_id, day))
+        used += 1
+    return schedule
+
+@pytest.mark.parametrize("study_days,intensity", [([0, 2], "light"), ([0, 1, 2, 3, 4], "medium"), ([6], "hard")])
+def test_schedule_tasks_fills_days_to_capacity(study_days, intensity):
+    """ Tests that the closed-form schedule matches filling study days one task at a time. """
+    scheduler = Scheduler("u1", UserPreferences(study_days=study_days, intensity=intensity))
+    chunk_ids = [f"c{i}" for i in range(100)]
+    start = date(2024, 1, 2)  # Tuesday
+    schedule = scheduler.schedule_tasks(chunk_ids, start_date=start)
+    expected = _reference_schedule(chunk_ids, study_days, scheduler.daily_capacity(), start)
+    assert [(task["chunk_id"], task["date"]) for task in schedule] == expected
+    assert all(task["task_type"] == "learn" and task["estimated_minutes"] == 5 for task in schedule)
+
+def test_schedule_columns():
+    """ Tests the columnar schedule and the empty and no-study-day cases. """
+    scheduler = Scheduler("u1", UserPreferences(study_days=[0], intensity="light"))
+    dates, chunk_indices = scheduler.schedule_columns(5, date(2024, 1, 1))
+    assert dates.dtype == np.dtype("datetime64[D]")
+    assert dates.astype(str).tolist() == ["2024-01-01", "2024-01-01", "2024-01-08", "2024-01-08", "2024-01-15"]
+    assert chunk_indices.tolist() == [0, 1, 2, 3, 4]
+    assert scheduler.schedule_tasks([]) == []
+    with pytest.raises(ValueError):
+        Scheduler("u1", UserPreferences(study_days=[], intensity="light")).schedule_tasks(["c1"])
+
+def _learn_tasks(user_id, day, n):
+    return [{**task, "task_type": "learn", "completed": False} for task in _tasks(user_id, day, n)]
+
+def test_place_task_moves_one_learn_task_off_a_full_day():
+    """ Tests that a follow-up on a full day displaces a single learn task to the nearest free day. """
+    monday = date(2024, 1, 1)
+    tasks = []
+    for offset in range(5):
+        tasks += _learn_tasks("u1", monday + timedelta(days=offset), 2)  # light: Mon-Fri are full
+    db = FakeSupabase({
+        "tasks": tasks,
+        "user_preferences": [{"user_id": "u1", "study_days": [0, 1, 2, 3, 4], "intensity": "light"}],
+    })
+    scheduling.invalidate_capacity("u1")
+    scheduling.invalidate_user_preferences("u1")
+    before = {row["id"]: row["scheduled_date"] for row in tasks}
+
+    day = place_task("u1", db, {"user_id": "u1", "chunk_id": "c9", "task_type": "review", "completed": False}, monday)
+    assert day == monday
+    moved = {row["id"]: row["scheduled_date"] for row in db.tables["tasks"]
+             if row.get("id") in before and row["scheduled_date"] != before[row["id"]]}
+    # Only one row moved, and it skipped the full days up to the following Monday
+    assert moved == {"2024-01-01-1": "2024-01-08"}
+    assert [row["scheduled_date"] for row in db.tables["tasks"] if row.get("chunk_id") == "c9"] == ["2024-01-01"]
+    # The calendar was kept in step: the next follow-up also lands on Monday and moves the other learn task
+    place_task("u1", db, {"user_id": "u1", "chunk_id": "c10", "task_type": "review", "completed": False}, monday)
+    assert next(row for row in db.tables["tasks"] if row.get("id") == "2024-01-01-0")["scheduled_date"] == "2024-01-08"
+
+def test_place_task_skips_days_without_learn_tasks():
+    """ Tests that a full day with nothing that can move pushes the follow-up itself to the next study day. """
+    monday = date(2024, 1, 1)
+    tasks = [{**task, "task_type": "quiz", "completed": False} for task in _tasks("u1", monday, 2)]
+    db = FakeSupabase({
+        "tasks": tasks,
+        "user_preferences": [{"user_id": "u1", "study_days": [0, 2], "intensity": "light"}],
+    })
+    scheduling.invalidate_capacity("u1")
+    scheduling.invalidate_user_preferences("u1")
+    day = place_task("u1", db, {"user_id": "u1", "chunk_id": "c9", "task_type": "review"}, date(2023, 12, 31))
+    assert day == date(2024, 1, 3)
+    assert [row["scheduled_date"] for row in db.tables["tasks"][:2]] == ["2024-01-01", "2024-01-01"]
+
+def test_place_tasks_writes_a_batch_with_two_upserts():
+    """ Tests that a batch of follow-ups moves learn tasks in memory and writes them in two bulk upserts. """
+    monday = date(2024, 1, 1)
+    tasks = []
+    for offset in range(5):
+        tasks += _learn_tasks("u1", monday + timedelta(days=offset), 2)  # light: Mon-Fri are full
+    db = FakeSupabase({
+        "tasks": tasks,
+        "user_preferences": [{"user_id": "u1", "study_days": [0, 1, 2, 3, 4], "intensity": "light"}],
+    })
+    scheduling.invalidate_capacity("u1")
+    scheduling.invalidate_user_preferences("u1")
+    followups = [({"user_id": "u1", "chunk_id": f"c{i}", "task_type": "review", "completed": False}, monday)
+                 for i in range(3)]
+    days = place_tasks("u1", db, followups)
+    # Both learn tasks make way on Monday; the third follow-up has nothing to displace there
+    assert days == [monday, monday, date(2024, 1, 2)]
+    moved = [row for row in db.tables["tasks"] if row.get("task_type") == "learn" and row["scheduled_date"] >= "2024-01-08"]
+    assert sorted(row["id"] for row in moved) == ["2024-01-01-0", "2024-01-01-1", "2024-01-02-1"]
+    assert {row["scheduled_date"] for row in moved} == {"2024-01-08", "2024-01-09"}
+    # Calendar window, learn rows of Monday and Tuesday, then one upsert for moves and one for new tasks
+    assert db.queries.count("tasks") == 5
+
+def test_in_memory_database_places_like_place_tasks():
+    """ Tests that the in-memory database places a batch of follow-ups exactly as place_tasks does. """
+    monday = date(2024, 1, 1)
+    tasks = []
+    for offset in range(5):
+        tasks += _learn_tasks("u1", monday + timedelta(days=offset), 2)  # light: Mon-Fri are full
+    prefs = {"user_id": "u1", "study_days": [0, 1, 2, 3, 4], "intensity": "light"}
+    supabase = FakeSupabase({"tasks": [dict(row) for row in tasks], "user_preferences": [prefs]})
+    scheduling.invalidate_capacity("u1")
+    scheduling.invalidate_user_preferences("u1")
+    memory = InMemoryDatabase()
+    memory.tasks = [dict(row) for row in tasks]
+    memory.preferences["u1"] = {"study_days": prefs["study_days"], "intensity": prefs["intensity"]}
+
+    def followups():
+        return [({"user_id": "u1", "chunk_id": f"c{i}", "task_type": "review", "completed": False}, monday + timedelta(days=i % 2))
+                for i in range(4)]
+
+    days = place_tasks("u1", supabase, followups())
+    assert asyncio.run(memory.schedule_tasks(followups(), "u1")) == days
+
+    def dates(rows):
+        return sorted((row.get("chunk_id") or row["id"], row["scheduled_date"]) for row in rows)
+    assert dates(memory.tasks) == dates(supabase.tables["tasks"])
+
+def test_saving_preferences_moves_reviews_to_their_due_days():
+    """ Tests that new preferences re-place open reviews at their memory-model due dates, without new rows. """
+    today = date.today()
+    db = InMemoryDatabase()
+    asyncio.run(db.review_chunks("u1", ["c1", "c2"], [1, 0], today))
+    for chunk_id in ["c1", "c2"]:
+        db.tasks.append({"id": f"t-{chunk_id}", "user_id": "u1", "chunk_id": chunk_id, "task_type": "review",
+                         "scheduled_date": today.isoformat(), "completed": False})
+    study_days = [(today + timedelta(days=2)).weekday()]
+    app.dependency_overrides[get_database] = lambda: db
+    app.dependency_overrides[verify_supabase_jwt] = lambda: "u1"
+    try:
+        response = TestClient(app).post("/api/preferences", json={"study_days": study_days, "intensity": "hard"})
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    model = db._model("u1")
+    expected = []
+    for chunk_id in ["c1", "c2"]:
+        due = model.due_date(chunk_id)
+        expected.append((due if due.weekday() in study_days else next_study_day(due, study_days)).isoformat())
+    assert [row["scheduled_date"] for row in db.tasks] == expected
+    assert len(db.tasks) == 2
+
+# Run with: PYTHONPATH=. pytest tests/core/test_scheduling.py
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from backend.core.generations import Generations
+from backend.core.vector_index import VectorIndex, VectorIndexRegistry
+
+def _random_vectors(n, dim=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+def test_brute_force_search_finds_exact_match():
+    """ Tests that brute-force search ranks an identical vector first. """
+    vectors = _random_vectors(100)
+    index = VectorIndex()
+    index.add([f"c{i}" for i in range(100)], vectors)
+    results = index.search(vectors[42], k=5)
+    assert len(results) == 5
+    assert results[0][0] == "c42"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-5)
+    assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+def test_search_filters_by_class():
+    """ Tests that a class filter only returns that class's chunks. """
+    vectors = _random_vectors(10)
+    index = VectorIndex()
+    index.add([f"c{i}" for i in range(10)], vectors, ["math" if i % 2 else "bio" for i in range(10)])
+    results = index.search(vectors[3], k=10, class_id="bio")
+    assert len(results) == 5
+    assert all(int(chunk_id[1:]) % 2 == 0 for chunk_id, _ in results)
+    assert index.search(vectors[3], k=10, class_id="history") == []
+
+def test_incremental_add_and_replace():
+    """ Tests that adds grow the index and re-adding an ID replaces its vector. """
+    index = VectorIndex()
+    vectors = _random_vectors(3)
+    index.add(["a", "b"], vectors[:2])
+    index.add(["b", "c"], vectors[1:])
+    assert len(index) == 3
+    index.add(["a"], vectors[2:3])
+    assert index.search(vectors[2], k=2)[0][0] in ("a", "c")
+    with pytest.raises(ValueError):
+        index.add(["d"], _random_vectors(1, dim=8))
+
+def test_ivf_search_recall():
+    """ Tests that IVF search on a large index still finds near-duplicates of the query. """
+    base = _random_vectors(3000, dim=16, seed=1)
+    index = VectorIndex(ivf_min_rows=1000, nprobe=8)
+    index.add([str(i) for i in range(3000)], base)
+    assert index._centroids is not None
+    queries = base[:50] + 0.01 * _random_vectors(50, dim=16, seed=2)
+    found = sum(index.search(q, k=1)[0][0] == str(i) for i, q in enumerate(queries))
+    assert found >= 45
+
+def test_registry_loads_lazily_and_updates_loaded_indexes():
+    """ Tests that the registry loads an index once and applies adds only to loaded indexes. """
+    loads = []
+    vectors = _random_vectors(4)
+
+    def loader(user_id):
+        loads.append(user_id)
+        return ["a", "b"], vectors[:2], [None, None]
+
+    registry = VectorIndexRegistry(loader=loader)
+    registry.add("u1", ["x"], vectors[2:3])  # not loaded yet: ignored
+    assert len(registry.get("u1")) == 2
+    registry.add("u1", ["c"], vectors[3:4], "bio")
+    assert len(registry.get("u1")) == 3
+    assert loads == ["u1"]
+
+def test_generations_are_shared_between_connections(tmp_path):
+    """ Tests that a counter bumped through one connection is read through another. """
+    path = str(tmp_path / "generations.sqlite3")
+    api, worker = Generations(path), Generations(path)
+    assert api.get("chunks:u1") == 0
+    assert worker.bump("chunks:u1") == 1
+    assert worker.bump("chunks:u1") == 2
+    assert api.get("chunks:u1") == 2
+    assert api.get("chunks:u2") == 0
+
+def test_registry_reloads_index_changed_by_another_process(tmp_path):
+    """ Tests that an index is reloaded once another process stores chunks, but not after its own adds. """
+    path = str(tmp_path / "generations.sqlite3")
+    vectors = _random_vectors(4)
+    rows = {"ids": ["a"], "vectors": vectors[:1]}
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return rows["ids"], rows["vectors"], [None] * len(rows["ids"])
+
+    api = VectorIndexRegistry(loader=loader, generations=Generations(path))
+    worker = VectorIndexRegistry(loader=loader, generations=Generations(path))
+    assert len(api.get("u1")) == 1
+    api.add("u1", ["b"], vectors[1:2])
+    assert len(api.get("u1")) == 2
+    assert loads == ["u1"]
+    # The worker stores chunks for the same user; the API's copy reloads from the database
+    rows.update(ids=["a", "b", "c", "d"], vectors=vectors)
+    worker.add("u1", ["c", "d"], vectors[2:])
+    assert len(api.get("u1")) == 4
+    assert len(api.get("u1")) == 4
+    assert loads == ["u1", "u1"]
+
+# Run with: PYTHONPATH=. pytest tests/core/test_vector_index.py
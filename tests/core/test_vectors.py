@@ -0,0 +1,23 @@
+import numpy as np
+from backend.core.vectors import to_pgvector, parse_pgvector
+
+def test_pgvector_round_trip_float32():
+    """ Tests that float32 vectors survive encoding to a pgvector literal exactly. """
+    vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+    literal = to_pgvector(vector)
+    assert literal.startswith("[") and literal.endswith("]")
+    assert np.array_equal(parse_pgvector(literal), vector)
+
+def test_pgvector_float16_is_smaller():
+    """ Tests that float16 vectors are written with fewer digits. """
+    vector = np.random.default_rng(1).standard_normal(256).astype(np.float32)
+    half = to_pgvector(vector.astype(np.float16))
+    assert len(half) < len(to_pgvector(vector))
+    assert np.allclose(parse_pgvector(half), vector, atol=1e-2)
+
+def test_parse_pgvector_accepts_lists():
+    """ Tests that decoded JSON lists and missing vectors are handled. """
+    assert parse_pgvector([1, 2.5]).tolist() == [1.0, 2.5]
+    assert to_pgvector(None) is None
+
+# Run with: PYTHONPATH=. pytest tests/core/test_vectors.py